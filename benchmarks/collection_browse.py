@@ -0,0 +1,145 @@
+"""Browsing queries of a `CollectionStore`: full scans versus the secondary indexes.
+
+Builds a synthetic collection of N tracks (on releases of 10 tracks, recording movements of works by
+2000 composers, performed by 500 artists) and times each browsing query as a scan over all works, tracks
+or releases and via the store's index. With ``--sqlite``, the collection is also written to a
+`SqliteCollectionStore` in a temporary directory, whose indexed queries are timed as well.
+Run with ``python -m benchmarks.collection_browse``.
+"""
+import random
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import click
+
+from omg.brainz.model import RecordingId, TrackId, WorkId, ArtistId, ReleaseId
+from omg.collection.entities import Track, Work, ParentWork, Release, Artist
+from omg.collection.sqlite import SqliteCollectionStore
+from omg.collection.store import CollectionStore, CollectionStoreBase
+from omg.util.dates import PartialDate
+
+COMPOSERS = 2000
+PERFORMERS = 500
+MOVEMENTS = 4
+TRACKS_PER_RELEASE = 10
+
+
+def composer(i: int) -> ArtistId:
+    return ArtistId(f'composer-{i}')
+
+
+def performer(i: int) -> ArtistId:
+    return ArtistId(f'performer-{i}')
+
+
+def work(i: int, movement: int | None = None) -> WorkId:
+    return WorkId(f'work-{i}' if movement is None else f'work-{i}-{movement}')
+
+
+def add_collection(store: CollectionStoreBase, n: int):
+    works = max(1, n // MOVEMENTS // 5)  # every work is recorded 5 times on average
+    for i in range(COMPOSERS):
+        store.add_artist(Artist(composer(i), f'Composer {i}', f'Composer {i}', None))
+    for i in range(PERFORMERS):
+        store.add_artist(Artist(performer(i), f'Performer {i}', f'Performer {i}', None))
+    for i in range(works):
+        composers = (composer(i % COMPOSERS),)
+        store.add_work(Work(work(i), f'Work {i}', None, None, composers))
+        for movement in range(1, MOVEMENTS + 1):
+            store.add_work(Work(work(i, movement), f'Work {i}: Movement {movement}', None,
+                                ParentWork(work(i), movement), composers))
+    for r in range(0, n, TRACKS_PER_RELEASE):
+        artists = (performer(r // TRACKS_PER_RELEASE % PERFORMERS),)
+        tracks = []
+        for i in range(r, min(n, r + TRACKS_PER_RELEASE)):
+            track = Track(TrackId(f'track-{i}'), RecordingId(f'recording-{i}'), f'Movement {i % MOVEMENTS + 1}',
+                          medium_number=1, medium_format='CD', track_number=i - r + 1,
+                          works=(work(i // MOVEMENTS % works, i % MOVEMENTS + 1),), artists=artists)
+            store.add_track(track)
+            tracks.append(track.id)
+        store.add_release(Release(ReleaseId(f'release-{r}'), f'Release {r}', PartialDate(2000), artists,
+                                  tuple(tracks)))
+    store.commit()
+
+
+def scans(store: CollectionStore) -> dict[str, Callable]:
+    return {
+        'works by composer': lambda c: [w for w in store.works_by_id.values() if c in w.composers],
+        'child works': lambda w: sorted((child for child in store.works_by_id.values()
+                                         if child.parent is not None and child.parent.id == w),
+                                        key=lambda child: child.parent.own_position),
+        'tracks of work': lambda w: [t for t in store.tracks_by_id.values() if w in t.works],
+        'tracks by artist': lambda a: [t for t in store.tracks_by_id.values() if a in t.artists],
+        'releases by artist': lambda a: [r for r in store.releases_by_id.values() if a in r.artists],
+    }
+
+
+def indexed_queries(store: CollectionStoreBase) -> dict[str, Callable]:
+    return {
+        'works by composer': store.get_works_by_composer,
+        'child works': store.get_child_works,
+        'tracks of work': store.get_tracks_of_work,
+        'tracks by artist': store.get_tracks_by_artist,
+        'releases by artist': store.get_releases_by_artist,
+    }
+
+
+def query_arguments(n: int, count: int) -> dict[str, list]:
+    works = max(1, n // MOVEMENTS // 5)
+    return {
+        'works by composer': [composer(random.randrange(COMPOSERS)) for _ in range(count)],
+        'child works': [work(random.randrange(works)) for _ in range(count)],
+        'tracks of work': [work(random.randrange(works), random.randrange(MOVEMENTS) + 1) for _ in range(count)],
+        'tracks by artist': [performer(random.randrange(PERFORMERS)) for _ in range(count)],
+        'releases by artist': [performer(random.randrange(PERFORMERS)) for _ in range(count)],
+    }
+
+
+def time_query(query: Callable, arguments: list) -> tuple[float, int]:
+    """Return the mean time per query in seconds, and the mean number of results."""
+    results = 0
+    start = time.perf_counter()
+    for argument in arguments:
+        results += len(query(argument))
+    return (time.perf_counter() - start) / len(arguments), results // len(arguments)
+
+
+@click.command()
+@click.option('-n', '--tracks', 'n', default=1_000_000, show_default=True, help='number of tracks')
+@click.option('--queries', default=20, show_default=True, help='number of queries of each kind')
+@click.option('--scan-queries', default=3, show_default=True, help='number of scans of each kind (they are slow)')
+@click.option('--sqlite', is_flag=True, help='also time the queries of a SqliteCollectionStore')
+def main(n, queries, scan_queries, sqlite):
+    random.seed(0)
+    start = time.perf_counter()
+    store = CollectionStore()
+    add_collection(store, n)
+    click.echo(f'built collection of {n} tracks in {time.perf_counter() - start:.1f}s')
+    arguments = query_arguments(n, queries)
+    columns = {'scan': [], 'index': []}
+    for name, query in scans(store).items():
+        columns['scan'].append(time_query(query, arguments[name][:scan_queries]))
+    for name, query in indexed_queries(store).items():
+        columns['index'].append(time_query(query, arguments[name]))
+    if sqlite:
+        with tempfile.TemporaryDirectory() as directory:
+            sqlite_store = SqliteCollectionStore(Path(directory) / 'collection.sqlite', batch_size=100_000)
+            sqlite_store.init()
+            start = time.perf_counter()
+            add_collection(sqlite_store, n)
+            click.echo(f'wrote SQLite store in {time.perf_counter() - start:.1f}s')
+            columns['sqlite'] = [time_query(query, arguments[name])
+                                 for name, query in indexed_queries(sqlite_store).items()]
+            sqlite_store.close()
+
+    click.echo(f'{"query":<20} {"results":>8} ' + ' '.join(f'{column:>12}' for column in columns) + f' {"speedup":>9}')
+    for i, name in enumerate(scans(store)):
+        (scan, results), (index, _) = columns['scan'][i], columns['index'][i]
+        times = ' '.join(f'{columns[column][i][0] * 1000:>10.3f}ms' for column in columns)
+        click.echo(f'{name:<20} {results:>8} {times} {scan / index:>8.0f}x')
+
+
+if __name__ == '__main__':
+    main()
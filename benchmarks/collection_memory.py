@@ -0,0 +1,47 @@
+"""Memory per track of a collection held in a `CollectionStore`.
+
+Simulates building a collection of N tracks from parsed Musicbrainz data: every id is created from a new
+string object (as decoding each JSON document does), works and artists are referenced by many tracks.
+Reports the memory allocated per track. Run with ``python -m benchmarks.collection_memory``.
+"""
+import gc
+import tracemalloc
+import uuid
+
+import click
+
+from omg.brainz.model import RecordingId, TrackId, WorkId, ArtistId
+from omg.collection.entities import Track
+from omg.collection.store import CollectionStore
+
+
+def mbid(kind: int, i: int) -> str:
+    return str(uuid.UUID(int=kind << 64 | i))  # a new string object on every call
+
+
+def build_store(n: int) -> CollectionStore:
+    store = CollectionStore()
+    for i in range(n):
+        works = (WorkId(mbid(1, i // 4 % 20_000)),)
+        artists = (ArtistId(mbid(2, i % 500)), ArtistId(mbid(2, 500 + i // 40 % 2000)))
+        store.add_track(Track(id=TrackId(mbid(3, i)), recording_id=RecordingId(mbid(4, i)),
+                              title=f'Movement {i % 4 + 1}', medium_number=1, medium_format='CD',
+                              track_number=i % 10 + 1, works=works, artists=artists))
+    return store
+
+
+@click.command()
+@click.option('-n', '--tracks', 'n', default=200_000, show_default=True, help='number of tracks')
+def main(n):
+    gc.collect()
+    tracemalloc.start()
+    store = build_store(n)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    click.echo(f'{n} tracks: {current / 2 ** 20:.1f} MiB, {current / n:.0f} bytes per track')
+    del store
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Latency of keyword searches in a `CollectionSearchIndex`.
+
+Builds a synthetic collection of N tracks with pseudo-word names (composers with an alias, works with
+movements, performers and releases of 10 tracks), indexing it incrementally while adding the entities
+through a `SearchIndexingStore`. Then runs queries combining words of a random track's composer,
+work and performer (the latter as a prefix), and broad queries of one or two common words matching
+many thousands of tracks, and reports the latency distribution of either kind.
+Run with ``python -m benchmarks.collection_search``.
+"""
+import gc
+import random
+import statistics
+import time
+
+import click
+
+from omg.brainz.model import RecordingId, TrackId, WorkId, ArtistId, ReleaseId
+from omg.collection.entities import Track, Work, ParentWork, Release, Artist
+from omg.collection.search import SearchIndexingStore
+from omg.collection.store import CollectionStore
+from omg.util.dates import PartialDate
+
+SYLLABLES = ('ka', 'ro', 'mi', 'sen', 'tal', 'vor', 'bri', 'dun', 'el', 'lo', 'ma', 'zi', 'par', 'gho', 'nek',
+             'sta', 'fu', 're', 'ov', 'ski', 'ber', 'ti', 'ha', 'lin')
+FORMS = ('Symphony', 'Piano Concerto', 'Violin Sonata', 'String Quartet', 'Suite', 'Prelude', 'Étude', 'Serenade')
+KEYS = ('C major', 'C minor', 'D major', 'D minor', 'E-flat major', 'F major', 'G minor', 'A major', 'B-flat major')
+TEMPI = ('Allegro', 'Adagio', 'Andante', 'Presto', 'Largo', 'Scherzo', 'Menuetto', 'Finale')
+MOVEMENTS = 4
+BROAD_QUERIES = ('piano', 'symphony', 'major', 'allegro', 'op', 'sym', 'concerto major', 'symphony allegro',
+                 'piano minor', 'string quartet', 'major allegro', 'suite adag')
+TRACKS_PER_RELEASE = 10
+
+
+def word(rng: random.Random) -> str:
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def build_collection(n: int, rng: random.Random) -> tuple[SearchIndexingStore, list[Artist], list[Artist]]:
+    store = SearchIndexingStore(CollectionStore())
+    composers = [Artist(ArtistId(f'composer-{i}'), f'{first} {last}', f'{last}, {first}', None,
+                        aliases=(f'{first} {last}ff',))
+                 for i, (first, last) in enumerate((word(rng), word(rng)) for _ in range(max(1, n // 200)))]
+    performers = [Artist(ArtistId(f'performer-{i}'), f'{word(rng)} {word(rng)}', '', None)
+                  for i in range(max(1, n // 500))]
+    for artist in composers + performers:
+        store.add_artist(artist)
+    works = max(1, n // MOVEMENTS // 5)  # every work is recorded 5 times on average
+    for i in range(works):
+        composer = rng.choice(composers).id
+        name = f'{rng.choice(FORMS)} No. {rng.randint(1, 12)} in {rng.choice(KEYS)}, Op. {rng.randint(1, 120)}'
+        store.add_work(Work(WorkId(f'work-{i}'), name, None, None, (composer,)))
+        for movement in range(1, MOVEMENTS + 1):
+            store.add_work(Work(WorkId(f'work-{i}-{movement}'), f'{name}: {rng.choice(TEMPI)} {word(rng)}', None,
+                                ParentWork(WorkId(f'work-{i}'), movement), (composer,)))
+    for r in range(0, n, TRACKS_PER_RELEASE):
+        artists = (rng.choice(performers).id,)
+        tracks = []
+        for i in range(r, min(n, r + TRACKS_PER_RELEASE)):
+            work = WorkId(f'work-{i // MOVEMENTS % works}-{i % MOVEMENTS + 1}')
+            track = Track(TrackId(f'track-{i}'), RecordingId(f'recording-{i}'), store.get_work(work).name,
+                          medium_number=1, medium_format='CD', track_number=i - r + 1, works=(work,),
+                          artists=artists)
+            store.add_track(track)
+            tracks.append(track.id)
+        store.add_release(Release(ReleaseId(f'release-{r}'), f'{word(rng)} {word(rng)}', PartialDate(2000),
+                                  artists, tuple(tracks)))
+    return store, composers, performers
+
+
+def random_query(store: SearchIndexingStore, n: int, rng: random.Random) -> str:
+    track = store.get_track(TrackId(f'track-{rng.randrange(n)}'))
+    work = store.get_work(track.works[0])
+    composer = store.get_artist(work.composers[0])
+    performer = store.get_artist(track.artists[0])
+    return f'{composer.name.split()[-1]} {work.name.split()[0]} {performer.name.split()[-1][:4]}'
+
+
+@click.command()
+@click.option('-n', '--tracks', 'n', default=500_000, show_default=True, help='number of tracks')
+@click.option('--queries', default=500, show_default=True, help='number of queries')
+def main(n, queries):
+    rng = random.Random(0)
+    start = time.perf_counter()
+    store, _, _ = build_collection(n, rng)
+    click.echo(f'built and indexed collection of {n} tracks in {time.perf_counter() - start:.1f}s')
+    gc.freeze()  # keep collections of the millions of objects built from distorting the latencies
+
+    report('random', [random_query(store, n, rng) for _ in range(queries)], store)
+    report('broad', [rng.choice(BROAD_QUERIES) for _ in range(queries)], store)
+
+
+def report(kind: str, queries: list[str], store: SearchIndexingStore):
+    latencies = []
+    results = 0
+    for query in queries:
+        start = time.perf_counter()
+        results += len(store.index.search(query, limit=20))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    click.echo(f'{len(queries)} {kind} queries, {results / len(queries):.1f} results on average: '
+               f'mean {statistics.mean(latencies) * 1000:.2f}ms, median {latencies[len(latencies) // 2] * 1000:.2f}ms, '
+               f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f}ms, max {latencies[-1] * 1000:.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Throughput and peak memory of the files pipeline: walker, tag reading, database and updater.
+
+Builds a synthetic library of N tagged audio files (copies of the test fixture) and times a cold scan,
+no-op rescans, a rescan after modifying 1% of the files, and a rescan after deleting 1% of them. Every
+scenario runs in a fresh process, so that its peak RSS is measured separately.
+
+Results are appended to a JSON lines file together with the current git commit, and compared to the
+previous run with the same parameters. Run with ``python -m benchmarks.files_pipeline``.
+"""
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+import click
+
+from omg.files.db_updater import DatabaseUpdater
+from omg.files.filesystem import FilesystemTagProvider
+from omg.files.sqlite import SqliteAudioFileDatabase
+from omg.files.walker import IncrementalAudioFileWalker
+from omg.test_utils.library import create_library
+
+TEMPLATE = Path(__file__).resolve().parent.parent / 'testdata' / 'r2.mp3'
+
+
+def run_update(root: Path, db_path: Path, jobs: int, full: bool) -> tuple[float, float]:
+    """Update the database like ``omg files update`` does; return the elapsed time and peak RSS in MiB."""
+    start = time.perf_counter()
+    db = SqliteAudioFileDatabase(db_path)
+    db.init()
+    walker = IncrementalAudioFileWalker(root, db, force_full_scan=full)
+    DatabaseUpdater(db, FilesystemTagProvider(root), walker, jobs=jobs).update()
+    db.remove_unused_tag_values()
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux; for children, it is the maximum of all terminated worker processes
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return elapsed, peak / 1024
+
+
+def modify(paths: list[Path]):
+    for path in paths:
+        with path.open('r+b') as file:  # keep the audio file intact, just change size and modification time
+            file.seek(0, os.SEEK_END)
+            file.write(b'\0')
+
+
+def delete(paths: list[Path]):
+    for path in paths:
+        path.unlink()
+
+
+def git_commit() -> tuple[str | None, bool]:
+    """Return the current git commit and whether tracked files have been modified."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit.strip(), status != ''
+
+
+def previous_run(results: Path, n: int, jobs: int) -> dict | None:
+    if not results.exists():
+        return None
+    previous = None
+    with results.open() as file:
+        for line in file:
+            run = json.loads(line)
+            if run['files'] == n and run['jobs'] == jobs:
+                previous = run
+    return previous
+
+
+@click.command()
+@click.option('-n', '--files', 'n', type=click.IntRange(min=100), default=2000, show_default=True,
+              help='number of files in the synthetic library')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=1, show_default=True,
+              help='number of parallel workers reading tags')
+@click.option('--results', type=click.Path(dir_okay=False, path_type=Path),
+              default=Path('.benchmarks') / 'files_pipeline.jsonl', show_default=True,
+              help='JSON lines file to which the results are appended')
+def main(n, jobs, results):
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / 'library'
+        db_path = Path(tmp) / 'omg.sqlite'
+        start = time.perf_counter()
+        paths = list(create_library(root, TEMPLATE, n))
+        click.echo(f'created {n} files in {time.perf_counter() - start:.1f} s')
+
+        scenarios: list[tuple[str, Callable[[], None] | None, bool]] = [
+            ('cold scan', None, True),
+            ('no-op rescan', None, True),
+            ('no-op incremental rescan', None, False),
+            ('1% modified rescan', lambda: modify(paths[::100]), True),
+            ('1% deleted rescan', lambda: delete(paths[50::100]), False),
+        ]
+        measurements = {}
+        for name, prepare, full in scenarios:
+            if prepare is not None:
+                prepare()
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                elapsed, peak = executor.submit(run_update, root, db_path, jobs, full).result()
+            measurements[name] = {'seconds': elapsed, 'files_per_second': n / elapsed, 'peak_rss_mib': peak}
+
+    commit, dirty = git_commit()
+    previous = previous_run(results, n, jobs)
+    click.echo(f'{"scenario":<26} {"files/s":>10} {"peak RSS":>12}')
+    for name, measurement in measurements.items():
+        line = f'{name:<26} {measurement["files_per_second"]:>10.0f} {measurement["peak_rss_mib"]:>8.1f} MiB'
+        if previous is not None and name in previous['results']:
+            before = previous['results'][name]['files_per_second']
+            line += f'   {(measurement["files_per_second"] / before - 1) * 100:>+6.1f}%'
+        click.echo(line)
+    if previous is not None:
+        click.echo(f'(change relative to commit {previous["commit"]} from {previous["time"]})')
+
+    results.parent.mkdir(parents=True, exist_ok=True)
+    with results.open('a') as file:
+        run = {'commit': commit, 'dirty': dirty, 'time': datetime.now().isoformat(timespec='seconds'),
+               'python': platform.python_version(), 'platform': sys.platform, 'files': n, 'jobs': jobs,
+               'results': measurements}
+        file.write(json.dumps(run) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Decoding and parsing time and memory of large release documents.
+
+Creates a synthetic release response shaped like ``/release/<mbid>?inc=media+recordings+artists`` from the
+web service (with full recording objects and artist credits for every track) and measures, for each
+available JSON backend, the time per release for decoding and for building the `ReleaseData`, as well as
+the peak memory allocated meanwhile. Run with ``python -m benchmarks.release_parsing``.
+"""
+import json
+import time
+import tracemalloc
+import uuid
+from collections.abc import Callable
+
+import click
+
+from omg.brainz.model import ReleaseId
+from omg.brainz.parse import parse_release_data
+
+
+def _artist_credit(i: int) -> list[dict]:
+    return [{'name': f'Artist {i}', 'joinphrase': '', 'artist': {
+        'id': str(uuid.UUID(int=i)), 'name': f'Artist {i}', 'sort-name': f'Artist {i}', 'disambiguation': '',
+        'type': 'Person', 'type-id': str(uuid.UUID(int=1)), 'genres': [], 'tags': []}}]
+
+
+def synthetic_release(media: int, tracks_per_medium: int) -> bytes:
+    release = {
+        'id': str(uuid.uuid4()), 'title': 'The Complete Recordings', 'status': 'Official', 'date': '1995-03-01',
+        'country': 'XE', 'barcode': '0123456789012', 'packaging': 'Box', 'quality': 'normal',
+        'text-representation': {'language': 'eng', 'script': 'Latn'},
+        'cover-art-archive': {'artwork': True, 'count': 2, 'front': True, 'back': True, 'darkened': False},
+        'artist-credit': _artist_credit(0),
+        'media': [{
+            'position': m + 1, 'format': 'CD', 'format-id': str(uuid.UUID(int=2)), 'title': '',
+            'track-count': tracks_per_medium, 'track-offset': 0,
+            'tracks': [{
+                'id': str(uuid.uuid4()), 'position': t + 1, 'number': str(t + 1), 'title': f'Movement {t + 1}',
+                'length': 600000, 'artist-credit': _artist_credit(t % 5 + 1),
+                'recording': {'id': str(uuid.uuid4()), 'title': f'Movement {t + 1}', 'length': 600000,
+                              'disambiguation': '', 'video': False, 'first-release-date': '1995-03-01',
+                              'artist-credit': _artist_credit(t % 5 + 1)}}
+                for t in range(tracks_per_medium)]}
+            for m in range(media)],
+    }
+    return json.dumps(release).encode()
+
+
+def measure(name: str, loads: Callable[[bytes], dict], document: bytes, repeat: int):
+    release = ReleaseId(str(uuid.uuid4()))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        loads(document)
+    decode = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse_release_data(release, loads(document))
+    total = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    parse_release_data(release, loads(document))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    click.echo(f'{name:<8} decode {decode * 1e3:>7.2f} ms   decode+parse {total * 1e3:>7.2f} ms   '
+               f'peak {peak / 2 ** 20:>6.2f} MiB')
+
+
+@click.command()
+@click.option('--media', default=10, show_default=True, help='number of media of the synthetic release')
+@click.option('--tracks', default=40, show_default=True, help='number of tracks per medium')
+@click.option('--repeat', default=20, show_default=True, help='number of repetitions for time measurements')
+def main(media, tracks, repeat):
+    document = synthetic_release(media, tracks)
+    click.echo(f'release with {media * tracks} tracks, {len(document) / 2 ** 10:.0f} KiB of JSON')
+    measure('json', json.loads, document, repeat)
+    try:
+        import orjson
+    except ImportError:
+        click.echo('orjson is not installed')
+    else:
+        measure('orjson', orjson.loads, document, repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Compare per-file and bulk write throughput of SqliteAudioFileDatabase.
+
+Run with ``python -m benchmarks.sqlite_writes``.
+"""
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import click
+
+from omg.files import FileInfo
+from omg.files.sqlite import SqliteAudioFileDatabase
+from omg.files.tags import Tags
+
+
+def synthetic_files(n: int) -> list[tuple[FileInfo, Tags]]:
+    start = datetime(2023, 1, 1)
+    return [(FileInfo(Path(f'/music/artist{i // 100}/album{i // 10}/track{i}.flac'), start + timedelta(seconds=i)),
+             {'ARTIST': [f'artist {i // 100}'], 'ALBUM': [f'album {i // 10}'], 'TITLE': [f'track {i}'],
+              'TRACKNUMBER': [str(i % 10 + 1)], 'GENRE': ['Classical'],
+              'MUSICBRAINZ_TRACKID': [f'00000000-0000-0000-0000-{i:012d}']})
+            for i in range(n)]
+
+
+def per_file(db: SqliteAudioFileDatabase, files: list[tuple[FileInfo, Tags]]):
+    for info, tags in files:
+        db.add_or_update(info, tags)
+
+
+def bulk(db: SqliteAudioFileDatabase, files: list[tuple[FileInfo, Tags]]):
+    db.add_or_update_many(files)
+
+
+def measure(name: str, write: Callable, files: list[tuple[FileInfo, Tags]], **db_options):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SqliteAudioFileDatabase(Path(tmp) / 'bench.sqlite', **db_options)
+        db.init()
+        start = time.perf_counter()
+        write(db, files)
+        elapsed = time.perf_counter() - start
+    click.echo(f'{name:<24} {len(files) / elapsed:>10.0f} files/s')
+
+
+@click.command()
+@click.option('-n', '--files', 'n', default=2000, show_default=True, help='number of synthetic files')
+def main(n):
+    files = synthetic_files(n)
+    measure('add_or_update', per_file, files)
+    measure('add_or_update_many', bulk, files)
+    measure('add_or_update_many, WAL', bulk, files, wal=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Compare reading the tags of all files one by one with the bulk methods of SqliteAudioFileDatabase.
+
+Run with ``python -m benchmarks.tag_retrieval``.
+"""
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import click
+
+from benchmarks.sqlite_writes import synthetic_files
+from omg.files.sqlite import SqliteAudioFileDatabase
+
+
+def get_tags_loop(db: SqliteAudioFileDatabase, paths: list[Path]) -> int:
+    return sum(len(db.get_tags(path)) for path in paths)
+
+
+def get_tags_many(db: SqliteAudioFileDatabase, paths: list[Path]) -> int:
+    return sum(len(tags) for _, tags in db.get_tags_many(paths))
+
+
+def iter_all_tags(db: SqliteAudioFileDatabase, paths: list[Path]) -> int:
+    return sum(len(tags) for _, tags in db.iter_all_tags())
+
+
+def measure(name: str, read: Callable, db: SqliteAudioFileDatabase, paths: list[Path]):
+    start = time.perf_counter()
+    read(db, paths)
+    elapsed = time.perf_counter() - start
+    click.echo(f'{name:<16} {len(paths) / elapsed:>10.0f} files/s')
+
+
+@click.command()
+@click.option('-n', '--files', 'n', default=50_000, show_default=True, help='number of synthetic files')
+def main(n):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SqliteAudioFileDatabase(Path(tmp) / 'bench.sqlite')
+        db.init()
+        files = synthetic_files(n)
+        db.add_or_update_many(files)
+        paths = [info.path for info, _ in files]
+        measure('get_tags loop', get_tags_loop, db, paths)
+        measure('get_tags_many', get_tags_many, db, paths)
+        measure('iter_all_tags', iter_all_tags, db, paths)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Peak memory of comparing database and file system contents in DatabaseUpdater.
+
+Compares the previous approach (dictionaries and sets of all paths) with the streaming merge-join of
+`diff_files` for a no-op update of N synthetic files. Run with ``python -m benchmarks.updater_memory``.
+"""
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable, Iterable, Iterator
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import click
+
+from omg.files import FileInfo
+from omg.files.db_updater import diff_files, FileChange
+from omg.files.sqlite import SqliteAudioFileDatabase
+
+
+def synthetic_files(n: int) -> Iterator[FileInfo]:
+    start = datetime(2023, 1, 1)
+    for i in range(n):
+        yield FileInfo(Path(f'/music/artist{i // 1000:05d}/album{i // 10:07d}/track{i:09d}.flac'),
+                       start + timedelta(seconds=i))
+
+
+def dict_diff(db_files: Iterable[FileInfo], fs_files: Iterable[FileInfo]) -> int:
+    """The comparison as done before streaming diffs were introduced."""
+    db_map = {file.path: file for file in db_files}
+    fs_map = {file.path: file for file in fs_files}
+    db_paths = set(db_map.keys())
+    fs_paths = set(fs_map.keys())
+    changes = len(db_paths - fs_paths) + len(fs_paths - db_paths)
+    changes += sum(1 for path in db_paths & fs_paths if fs_map[path].mtime > db_map[path].mtime)
+    return changes
+
+
+def streaming_diff(db_files: Iterable[FileInfo], fs_files: Iterable[FileInfo]) -> int:
+    return sum(1 for change, _ in diff_files(db_files, fs_files) if change != FileChange.UNCHANGED)
+
+
+def measure(name: str, diff: Callable, db: SqliteAudioFileDatabase, n: int):
+    tracemalloc.start()
+    start = time.perf_counter()
+    changes = diff(db.get_files(), synthetic_files(n))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert changes == 0
+    click.echo(f'{name:<16} peak {peak / 2 ** 20:>8.1f} MiB   {elapsed:>6.1f} s')
+
+
+@click.command()
+@click.option('-n', '--files', 'n', default=1_000_000, show_default=True, help='number of synthetic files')
+def main(n):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SqliteAudioFileDatabase(Path(tmp) / 'bench.sqlite', wal=True)
+        db.init()
+        db.add_or_update_many((file, {}) for file in synthetic_files(n))
+        measure('dict/set diff', dict_diff, db, n)
+        measure('streaming diff', streaming_diff, db, n)
+
+
+if __name__ == '__main__':
+    main()
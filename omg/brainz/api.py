@@ -1,16 +1,26 @@
 from __future__ import annotations
 
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from datetime import timedelta
-from typing import Sequence
+from typing import Sequence, TypeVar
 
 import requests
 
-from omg.brainz.aliases import get_alias, Alias
+from omg.brainz.decode import loads
 from omg.brainz.model import RecordingId, WorkId, WorkRecording, ParentWork, ArtistId, ArtistData, WorkData, \
-    RecordingData, RecordingArtistRelation, RecordingArtistRelationType, ReleaseId, ReleaseData, MediumData, TrackData
+    RecordingData, RecordingArtistRelation, ReleaseId, ReleaseData
+from omg.brainz.parse import parse_recorded_works, parse_parent_works, parse_composers, parse_work_data, \
+    parse_artist_data, parse_recording_data, parse_recording_artists, parse_release_data
+from omg.brainz.ratelimit import RateLimiter, RateLimitedAdapter, THROTTLING_STATUS_CODES, retry_after
 from omg.brainz.source import MusicbrainzDataSourceBase
-from omg.util.dates import PartialDate
+from omg.brainz.stats import RequestStats
 
 
 @dataclass
@@ -18,116 +28,196 @@ class MusicbrainzConfiguration:
     hostname: str = 'musicbrainz.org'
     use_https: bool = True
     rate_limit: bool = True
+    requests_per_second: float = 1.0
+    """Average number of requests per second if `rate_limit` is set (musicbrainz.org allows 1)."""
+    burst: int = 1
+    """Number of requests that may be sent at once after a pause."""
+    max_workers: int = 4
+    """Number of requests running in parallel (see `MusicbrainzApiDataSource.submit`)."""
+    max_retries: int = 5
+    """Number of times a request is retried after a throttling or server error, or a connection failure."""
+    backoff: float = 1.0
+    """Base delay in seconds before a retry; doubled for each further attempt (with random jitter)."""
+    max_backoff: float = 60.0
 
     @property
     def url(self):
         return f'http{"s" if self.use_https else ""}://{self.hostname}/ws/2'
 
 
+T = TypeVar('T')
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = THROTTLING_STATUS_CODES | {500, 502, 504}
+
+ENTITY_INCLUDES = {
+    'recording': ('work-rels', 'artist-rels'),
+    'work': ('aliases', 'artist-rels', 'work-rels'),
+    'artist': ('aliases',),
+}
+"""Includes requested for each entity type, covering what all accessor methods need."""
+
+
 class MusicbrainzApiDataSource(MusicbrainzDataSourceBase):
+    """Data source using the Musicbrainz web service.
+
+    Requests to the web service are rate-limited according to the configuration. Several requests can run
+    in parallel (on a shared connection pool) via `submit` or `call_many`; they still respect the limit.
+
+    Recordings, works and artists are fetched once with all includes any of the accessor methods needs
+    (see `ENTITY_INCLUDES`), and the responses of the last `entity_cache_size` lookups are kept, so that e.g.
+    `get_recording_data`, `get_recorded_work` and `get_recording_artists` for the same recording only cause
+    a single request. Releases are not cached, as they are usually looked up only once.
+
+    `prefetch_release` loads all recordings of a release via the paged browse endpoint, with
+    `browse_limit` recordings per request, into the same cache.
+
+    Requests are counted and timed per endpoint and include in `stats`.
+
+    Throttled (429, 503) and other failed requests (5xx, connection errors) are retried up to
+    `max_retries` times, after the delay requested by the server's `Retry-After` header or an exponential
+    backoff with full jitter. Additionally, throttling reduces the request rate until requests succeed
+    again (see `RateLimitedAdapter`).
+    """
+
+    browse_limit = 100
 
     def __init__(self, config: MusicbrainzConfiguration, preferred_locales: Sequence[str] = ('en',),
-                 session: requests.Session = None):
+                 session: requests.Session = None, entity_cache_size: int = 1000):
         self.preferred_locales = preferred_locales
         self.config = config
         self.session = session or requests.Session()
         self.session.headers.update({'User-Agent': 'pyomg/0.0.1 ( https://github.com/supermihi/pyomg )',
                                      'Accept': 'application/json'})
+        self.rate_limiter = RateLimiter(config.requests_per_second, config.burst) if config.rate_limit else None
+        self.session.mount(config.url, RateLimitedAdapter(self.rate_limiter, pool_size=config.max_workers))
+        self._executor: ThreadPoolExecutor | None = None
+        self.entity_cache_size = entity_cache_size
+        self._entities: OrderedDict[tuple[str, str], dict] = OrderedDict()
+        self._entities_lock = threading.Lock()
+        self.stats = RequestStats()
+
+    def submit(self, function: Callable[..., T], *args) -> Future[T]:
+        """Run `function` (e.g. one of the `get_*` methods) in the worker pool."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.config.max_workers,
+                                                thread_name_prefix='musicbrainz')
+        return self._executor.submit(function, *args)
+
+    def call_many(self, calls: Iterable[tuple[str, str, str | Sequence[str] | None]]) -> list[dict]:
+        """Perform several (entity, mbid, include) calls in parallel and return their results in order."""
+        futures = [self.submit(self._call, entity, mbid, include) for entity, mbid, include in calls]
+        return [future.result() for future in futures]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.session.close()
 
     def _call(self, entity: str, mbid: str, include: str | Sequence[str] | None = None):
         full_url = f'{self.config.url}/{entity}/{mbid}'
+        return self._get(entity, full_url, self._include_query(include))
+
+    def _browse(self, entity: str, linked_entity: str, mbid: str,
+                include: str | Sequence[str] | None = None) -> Iterator[dict]:
+        """Yield all entities linked to the given one, e.g. all recordings of a release, one page at a time."""
+        offset = 0
+        while True:
+            page = self._get(f'{entity}?{linked_entity}', f'{self.config.url}/{entity}',
+                             {linked_entity: mbid, **self._include_query(include), 'limit': self.browse_limit,
+                              'offset': offset})
+            results = page[f'{entity}s']
+            yield from results
+            offset += len(results)
+            if len(results) == 0 or offset >= page[f'{entity}-count']:
+                return
+
+    @staticmethod
+    def _include_query(include: str | Sequence[str] | None) -> dict[str, str]:
         if isinstance(include, str):
             include = [include]
-        query = {'inc': '+'.join(include)} if include else {}
-        response = self.session.get(full_url, params=query)
-        response.raise_for_status()
-        return response.json()
+        return {'inc': '+'.join(include)} if include else {}
+
+    def _get(self, endpoint: str, url: str, query: dict) -> dict:
+        include = query.get('inc', '')
+        for attempt in itertools.count():
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=query)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.stats.record_request(endpoint, include, time.perf_counter() - start, 0, error=True)
+                if attempt >= self.config.max_retries:
+                    raise
+                delay, reason = self._backoff(attempt), e
+            else:
+                if getattr(response, 'from_cache', False):  # from a requests_cache session
+                    self.stats.record_cache_hit(endpoint, include)
+                else:
+                    waited = getattr(response, 'rate_limit_wait', 0)
+                    self.stats.record_request(endpoint, include, time.perf_counter() - start - waited,
+                                              len(response.content), error=not response.ok,
+                                              throttled_seconds=waited)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.config.max_retries:
+                    response.raise_for_status()
+                    return loads(response.content)
+                delay = retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                reason = f'status {response.status_code}'
+            logger.info(f'retrying {endpoint} request in {delay:.1f}s ({reason})')
+            self.stats.record_retry(endpoint, include)
+            time.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.config.max_backoff, self.config.backoff * 2 ** attempt))
+
+    def _get_entity(self, entity: str, mbid: str) -> dict:
+        """Look up a recording, work or artist with the includes from `ENTITY_INCLUDES`, using the cache."""
+        key = (entity, mbid)
+        with self._entities_lock:
+            result = self._entities.get(key)
+            if result is not None:
+                self._entities.move_to_end(key)
+        if result is not None:
+            self.stats.record_cache_hit(entity, '+'.join(ENTITY_INCLUDES[entity]))
+            return result
+        result = self._call(entity, mbid, ENTITY_INCLUDES[entity])
+        self._store_entity(entity, mbid, result)  # by the requested MBID, which may redirect to another
+        return result
+
+    def _store_entity(self, entity: str, mbid: str, result: dict):
+        with self._entities_lock:
+            self._entities[entity, mbid] = result
+            self._entities.move_to_end((entity, mbid))
+            while len(self._entities) > self.entity_cache_size:
+                self._entities.popitem(last=False)
+
+    def prefetch_release(self, release: ReleaseId):
+        for recording in self._browse('recording', 'release', release.mbid, ENTITY_INCLUDES['recording']):
+            self._store_entity('recording', recording['id'], recording)
 
     def get_recorded_work(self, recording: RecordingId) -> Sequence[WorkRecording]:
-        result = self._call('recording', recording.mbid, 'work-rels')
-        work_relations = result['relations']
-        performances = [wr for wr in work_relations if is_performance(wr)]
-        return [WorkRecording.from_work_relation(recording, p) for p in performances]
+        return parse_recorded_works(recording, self._get_entity('recording', recording.mbid))
 
     def get_parent_works(self, work: WorkId) -> Sequence[ParentWork]:
-        result = self._call('work', work.mbid, 'work-rels')
-        work_relations = result['relations']
-        part_ofs = [wr for wr in work_relations if is_part_of(wr)]
-        return [ParentWork.from_work_relation(work, p) for p in part_ofs]
+        return parse_parent_works(work, self._get_entity('work', work.mbid))
 
     def get_composers(self, work: WorkId) -> Sequence[ArtistId]:
-        result = self._call('work', work.mbid, 'artist-rels')
-        artist_rels = result['relations']
-        composers = [ar for ar in artist_rels if is_composer(ar)]
-        return [ArtistId(c['artist']['id']) for c in composers]
+        return parse_composers(self._get_entity('work', work.mbid))
 
     def get_work_data(self, work: WorkId) -> WorkData:
-        result = self._call('work', work.mbid, 'aliases')
-        alias = get_alias(result['aliases'], self.preferred_locales)
-        if alias is None:
-            alias = Alias(result['title'], result.get('sort-name'))
-        return WorkData(id=work, name=alias.name, disambiguation=result.get('disambiguation') or None)
+        return parse_work_data(work, self._get_entity('work', work.mbid), self.preferred_locales)
 
     def get_artist_data(self, artist: ArtistId) -> ArtistData:
-        result = self._call('artist', artist.mbid, 'aliases')
-        alias = get_alias(result['aliases'], self.preferred_locales)
-        if alias is None:
-            alias = Alias(result['name'], result.get('sort-name'))
-        return ArtistData(id=artist, name=alias.name, sort=alias.sort_name,
-                          disambiguation=result.get('disambiguation') or None)
+        return parse_artist_data(artist, self._get_entity('artist', artist.mbid), self.preferred_locales)
 
     def get_recording_data(self, recording: RecordingId) -> RecordingData:
-        result = self._call('recording', recording.mbid)
-        return RecordingData(id=recording, title=result['title'], disambiguation=result.get('disambiguation') or None,
-                             length=timedelta(milliseconds=float(result['length'])))
+        return parse_recording_data(recording, self._get_entity('recording', recording.mbid))
 
     def get_recording_artists(self, recording: RecordingId) -> Sequence[RecordingArtistRelation]:
-        result = self._call('recording', recording.mbid, 'artist-rels')
-        relations = []
-        for relation in result['relations']:
-            if relation.get('direction') != 'backward':
-                continue
-            relation_type = RecordingArtistRelationType(relation['type'], tuple(relation.get('attributes', [])))
-            artist = ArtistId(mbid=relation['artist']['id'])
-            relations.append(RecordingArtistRelation(recording, artist, type=relation_type,
-                                                     end_date=PartialDate.parse(relation.get('end'))))
-        return relations
+        return parse_recording_artists(recording, self._get_entity('recording', recording.mbid))
 
     def get_release_data(self, release: ReleaseId) -> ReleaseData:
-        result = self._call('release', release.mbid, ('media', 'recordings', 'artists'))
-        artists = parse_release_artists(result)
-        media = tuple(parse_medium(m) for m in result['media'])
-        return ReleaseData(id=release, title=result['title'],
-                           date=PartialDate.parse(result['date']),
-                           media=media,
-                           credited_artists=artists)
-
-
-def parse_medium(medium: dict) -> MediumData:
-    return MediumData(position=medium['position'], format=medium['format'],
-                      tracks=tuple(parse_track(t) for t in medium['tracks']))
-
-
-def parse_track(track: dict) -> TrackData:
-    return TrackData(position=track['position'], recording_id=RecordingId(track['recording']['id']),
-                     track_id=track['id'])
-
-
-def parse_release_artists(release: dict) -> Sequence[ArtistId]:
-    result = []
-    for artist_credit in release['artist-credit']:
-        if isinstance(artist_credit, dict) and 'artist' in artist_credit:
-            result.append(ArtistId(artist_credit['artist']['id']))
-    return tuple(result)
-
-
-def is_performance(work_relation: dict) -> bool:
-    return work_relation.get('type') == 'performance' and work_relation.get('direction') == 'forward'
-
-
-def is_part_of(work_relation: dict) -> bool:
-    return work_relation.get('type') == 'parts' and work_relation.get('direction') == 'backward'
-
-
-def is_composer(artist_relation: dict) -> bool:
-    return artist_relation.get('type') == 'composer' and artist_relation.get('direction') == 'backward'
+        return parse_release_data(release, self._call('release', release.mbid, ('media', 'recordings', 'artists')))
@@ -0,0 +1,157 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Mapping, Sequence
+from datetime import timedelta
+from typing import TypeVar
+
+from omg.brainz.model import RecordingId, WorkId, WorkRecording, ParentWork, ArtistId, ArtistData, ReleaseId, \
+    ReleaseData, RecordingData, RecordingArtistRelation, WorkData
+from omg.brainz.source import MusicbrainzDataSourceBase
+
+T = TypeVar('T')
+
+DEFAULT_TTL: Mapping[str, timedelta | None] = {
+    'release': timedelta(days=30),
+    'recording': timedelta(days=30),
+    'work': timedelta(days=90),
+    'artist': timedelta(days=90),
+}
+
+# increase when the pickled model classes change incompatibly; the cache is cleared on version mismatch
+_CACHE_VERSION = 3
+
+
+class NotCachedError(LookupError):
+    """Raised by an offline `CachingDataSource` if the requested data is not in the cache."""
+
+
+class CachingDataSource(MusicbrainzDataSourceBase):
+    """Data source decorator that stores the results of another source in an SQLite file.
+
+    Results are stored (pickled) per method and MBID. They expire after the time configured in `ttl` for the
+    type of entity they belong to ('release', 'recording', 'work' or 'artist'; `None` means never). If the
+    values in the cache grow larger than `max_size` bytes, the least recently used entries are evicted.
+
+    In `offline` mode, the wrapped source is never called: expired entries are used anyway, and a
+    `NotCachedError` is raised for anything that is not in the cache.
+    """
+
+    def __init__(self, source: MusicbrainzDataSourceBase | None, db_path: os.PathLike | str,
+                 ttl: Mapping[str, timedelta | None] = DEFAULT_TTL, max_size: int | None = 256 * 2 ** 20,
+                 offline: bool = False, clock: Callable[[], float] = time.time):
+        if source is None and not offline:
+            raise ValueError('a source is required unless in offline mode')
+        self.source = source
+        self.ttl = {**DEFAULT_TTL, **ttl}
+        self.max_size = max_size
+        self.offline = offline
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._init()
+        self._size, = self._connection.execute('SELECT IFNULL(SUM(length(value)), 0) FROM entries').fetchone()
+
+    def _init(self):
+        conn = self._connection
+        version, = conn.execute('PRAGMA user_version').fetchone()
+        if version != _CACHE_VERSION:
+            conn.execute('DROP TABLE IF EXISTS entries')
+            conn.execute(f'PRAGMA user_version = {_CACHE_VERSION}')
+        conn.execute('''CREATE TABLE IF NOT EXISTS entries(
+            method TEXT NOT NULL,
+            mbid TEXT NOT NULL,
+            value BLOB NOT NULL,
+            created REAL NOT NULL,
+            accessed REAL NOT NULL,
+            PRIMARY KEY (method, mbid)
+            ) WITHOUT ROWID''')
+        conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+
+    def close(self):
+        self._connection.close()
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute('DELETE FROM entries')
+            self._size = 0
+
+    def _get(self, method: str, entity: str, mbid: str, fetch: Callable[[], T]) -> T:
+        now = self._clock()
+        with self._lock:
+            row = self._connection.execute('SELECT value, created FROM entries WHERE method = ? AND mbid = ?',
+                                           (method, mbid)).fetchone()
+            ttl = self.ttl[entity]
+            if row is not None and (self.offline or ttl is None or now - row[1] < ttl.total_seconds()):
+                self._connection.execute('UPDATE entries SET accessed = ? WHERE method = ? AND mbid = ?',
+                                         (now, method, mbid))
+                return pickle.loads(row[0])
+        if self.offline:
+            raise NotCachedError(f'{method}({mbid}) is not cached')
+        result = fetch()
+        value = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            old_size, = self._connection.execute(
+                'SELECT IFNULL(SUM(length(value)), 0) FROM entries WHERE method = ? AND mbid = ?',
+                (method, mbid)).fetchone()
+            self._connection.execute('INSERT OR REPLACE INTO entries(method, mbid, value, created, accessed) '
+                                     'VALUES (?, ?, ?, ?, ?)', (method, mbid, value, now, now))
+            self._size += len(value) - old_size
+            self._evict()
+        return result
+
+    def _evict(self):
+        """Remove the least recently used entries until the cache is smaller than `max_size`."""
+        if self.max_size is None or self._size <= self.max_size:
+            return
+        conn = self._connection
+        conn.execute('BEGIN')
+        evicted = []
+        for method, mbid, size in conn.execute('SELECT method, mbid, length(value) FROM entries ORDER BY accessed'):
+            if self._size <= self.max_size:
+                break
+            evicted.append((method, mbid))
+            self._size -= size
+        conn.executemany('DELETE FROM entries WHERE method = ? AND mbid = ?', evicted)
+        conn.execute('COMMIT')
+
+    def prefetch_release(self, release_id: ReleaseId):
+        """Forward the hint, unless offline or the release (and hence probably its recordings) is cached."""
+        if self.offline:
+            return
+        with self._lock:
+            row = self._connection.execute('SELECT created FROM entries WHERE method = ? AND mbid = ?',
+                                           ('get_release_data', release_id.mbid)).fetchone()
+        ttl = self.ttl['release']
+        if row is None or (ttl is not None and self._clock() - row[0] >= ttl.total_seconds()):
+            self.source.prefetch_release(release_id)
+
+    def get_recorded_work(self, recording_id: RecordingId) -> Sequence[WorkRecording]:
+        return self._get('get_recorded_work', 'recording', recording_id.mbid,
+                         lambda: self.source.get_recorded_work(recording_id))
+
+    def get_parent_works(self, work: WorkId) -> Sequence[ParentWork]:
+        return self._get('get_parent_works', 'work', work.mbid, lambda: self.source.get_parent_works(work))
+
+    def get_composers(self, work: WorkId) -> Sequence[ArtistId]:
+        return self._get('get_composers', 'work', work.mbid, lambda: self.source.get_composers(work))
+
+    def get_work_data(self, work_id: WorkId) -> WorkData:
+        return self._get('get_work_data', 'work', work_id.mbid, lambda: self.source.get_work_data(work_id))
+
+    def get_artist_data(self, artist_id: ArtistId) -> ArtistData:
+        return self._get('get_artist_data', 'artist', artist_id.mbid, lambda: self.source.get_artist_data(artist_id))
+
+    def get_recording_data(self, recording_id: RecordingId) -> RecordingData:
+        return self._get('get_recording_data', 'recording', recording_id.mbid,
+                         lambda: self.source.get_recording_data(recording_id))
+
+    def get_recording_artists(self, recording_id: RecordingId) -> Sequence[RecordingArtistRelation]:
+        return self._get('get_recording_artists', 'recording', recording_id.mbid,
+                         lambda: self.source.get_recording_artists(recording_id))
+
+    def get_release_data(self, release_id: ReleaseId) -> ReleaseData:
+        return self._get('get_release_data', 'release', release_id.mbid,
+                         lambda: self.source.get_release_data(release_id))
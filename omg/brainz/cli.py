@@ -0,0 +1,25 @@
+from pathlib import Path
+
+import click
+
+from omg.brainz.dump import DumpIndex, ENTITY_TYPES
+from omg.cli import cli
+
+
+@cli.group('brainz')
+def brainz():
+    pass
+
+
+@brainz.command('index-dump')
+@click.option('--index', 'index_path', type=click.Path(dir_okay=False, path_type=Path), default='mbdump.sqlite',
+              show_default=True, help='index database to create or extend')
+@click.argument('entity', type=click.Choice(ENTITY_TYPES))
+@click.argument('dump_files', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False, path_type=Path))
+def index_dump(index_path, entity, dump_files):
+    """Index extracted Musicbrainz JSON dump files (e.g. mbdump/release) containing ENTITY documents."""
+    index = DumpIndex(index_path)
+    for dump_file in dump_files:
+        count = index.add_dump(entity, dump_file)
+        click.echo(f'{dump_file}: {count} {entity} entities')
+    index.close()
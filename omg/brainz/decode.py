@@ -0,0 +1,15 @@
+"""Decoding of JSON documents from the web service or the dumps.
+
+Uses orjson if it is installed, which decodes large documents (such as releases with all recordings)
+several times faster than the standard library; otherwise falls back to `json`.
+"""
+try:
+    from orjson import loads, JSONDecodeError
+
+    BACKEND = 'orjson'
+except ImportError:  # pragma: no cover
+    from json import loads, JSONDecodeError
+
+    BACKEND = 'json'
+
+__all__ = ['loads', 'JSONDecodeError', 'BACKEND']
@@ -0,0 +1,141 @@
+"""Offline data source reading the Musicbrainz JSON dumps.
+
+The JSON dumps (https://metabrainz.org/datasets) contain one file per entity type (``mbdump/release``,
+``mbdump/recording``, ...) with one JSON document per line, including all relations and aliases. After
+extracting them, a `DumpIndex` records the byte range of every entity in an SQLite file; lookups then
+read the document directly from the memory-mapped dump file.
+"""
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+from collections.abc import Sequence, Iterator
+from pathlib import Path
+
+from omg.brainz.decode import loads
+from omg.brainz.model import RecordingId, WorkId, WorkRecording, ParentWork, ArtistId, ArtistData, ReleaseId, \
+    ReleaseData, RecordingData, RecordingArtistRelation, WorkData
+from omg.brainz.parse import parse_recorded_works, parse_parent_works, parse_composers, parse_work_data, \
+    parse_artist_data, parse_recording_data, parse_recording_artists, parse_release_data
+from omg.brainz.source import MusicbrainzDataSourceBase
+
+logger = logging.getLogger(__name__)
+
+ENTITY_TYPES = ('release', 'recording', 'work', 'artist')
+
+
+class NotInDumpError(LookupError):
+    pass
+
+
+def _scan_dump(dump_file: Path) -> Iterator[tuple[str, int, int]]:
+    """Yield the MBID, offset and length of each entity in a JSON lines dump file."""
+    offset = 0
+    with dump_file.open('rb') as file:
+        for line in file:
+            length = len(line)
+            if not line.isspace():
+                yield loads(line)['id'], offset, length
+            offset += length
+
+
+class DumpIndex:
+    """SQLite index mapping (entity type, MBID) to a byte range in one of the indexed dump files."""
+
+    def __init__(self, index_path: os.PathLike | str):
+        self._connection = sqlite3.connect(index_path, check_same_thread=False)
+        self._connection.execute('''CREATE TABLE IF NOT EXISTS dump_files(
+            id INTEGER PRIMARY KEY,
+            path TEXT UNIQUE NOT NULL
+            )''')
+        self._connection.execute('''CREATE TABLE IF NOT EXISTS entities(
+            entity TEXT NOT NULL,
+            mbid TEXT NOT NULL,
+            file INTEGER NOT NULL REFERENCES dump_files (id),
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            PRIMARY KEY (entity, mbid)
+            ) WITHOUT ROWID''')
+        self._lock = threading.Lock()
+
+    def add_dump(self, entity: str, dump_file: Path) -> int:
+        """Index all entities of the given type in `dump_file`, replacing previous entries; return their number."""
+        if entity not in ENTITY_TYPES:
+            raise ValueError(f'unsupported entity type {entity}; expected one of {", ".join(ENTITY_TYPES)}')
+        path = str(dump_file.resolve())
+        with self._lock, self._connection as c:
+            file_id, = c.execute('INSERT INTO dump_files(path) VALUES (?) ON CONFLICT (path) DO UPDATE SET path=path '
+                                 'RETURNING id', (path,)).fetchone()
+            c.execute('DELETE FROM entities WHERE file = ?', (file_id,))
+            cursor = c.executemany('INSERT OR REPLACE INTO entities(entity, mbid, file, offset, length) '
+                                   'VALUES (?, ?, ?, ?, ?)',
+                                   ((entity, mbid, file_id, offset, length)
+                                    for mbid, offset, length in _scan_dump(dump_file)))
+        logger.info(f'indexed {cursor.rowcount} {entity} entities in {dump_file}')
+        return cursor.rowcount
+
+    def find(self, entity: str, mbid: str) -> tuple[str, int, int] | None:
+        """Return the dump file path, offset and length of the given entity, if indexed."""
+        with self._lock:
+            return self._connection.execute(
+                '''SELECT dump_files.path, offset, length FROM entities JOIN dump_files ON dump_files.id = file
+                   WHERE entity = ? AND mbid = ?''', (entity, mbid)).fetchone()
+
+    def close(self):
+        self._connection.close()
+
+
+class MusicbrainzDumpDataSource(MusicbrainzDataSourceBase):
+    """Data source serving entities from JSON dump files indexed in a `DumpIndex`."""
+
+    def __init__(self, index: DumpIndex, preferred_locales: Sequence[str] = ('en',)):
+        self.index = index
+        self.preferred_locales = preferred_locales
+        self._maps: dict[str, mmap.mmap] = {}
+        self._maps_lock = threading.Lock()
+
+    def _map(self, path: str) -> mmap.mmap:
+        with self._maps_lock:
+            mapped = self._maps.get(path)
+            if mapped is None:
+                with open(path, 'rb') as file:
+                    mapped = self._maps[path] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            return mapped
+
+    def _get_entity(self, entity: str, mbid: str) -> dict:
+        location = self.index.find(entity, mbid)
+        if location is None:
+            raise NotInDumpError(f'{entity} {mbid} not found in the indexed dumps')
+        path, offset, length = location
+        return loads(self._map(path)[offset:offset + length])
+
+    def close(self):
+        with self._maps_lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+
+    def get_recorded_work(self, recording_id: RecordingId) -> Sequence[WorkRecording]:
+        return parse_recorded_works(recording_id, self._get_entity('recording', recording_id.mbid))
+
+    def get_parent_works(self, work: WorkId) -> Sequence[ParentWork]:
+        return parse_parent_works(work, self._get_entity('work', work.mbid))
+
+    def get_composers(self, work: WorkId) -> Sequence[ArtistId]:
+        return parse_composers(self._get_entity('work', work.mbid))
+
+    def get_work_data(self, work_id: WorkId) -> WorkData:
+        return parse_work_data(work_id, self._get_entity('work', work_id.mbid), self.preferred_locales)
+
+    def get_artist_data(self, artist_id: ArtistId) -> ArtistData:
+        return parse_artist_data(artist_id, self._get_entity('artist', artist_id.mbid), self.preferred_locales)
+
+    def get_recording_data(self, recording_id: RecordingId) -> RecordingData:
+        return parse_recording_data(recording_id, self._get_entity('recording', recording_id.mbid))
+
+    def get_recording_artists(self, recording_id: RecordingId) -> Sequence[RecordingArtistRelation]:
+        return parse_recording_artists(recording_id, self._get_entity('recording', recording_id.mbid))
+
+    def get_release_data(self, release_id: ReleaseId) -> ReleaseData:
+        return parse_release_data(release_id, self._get_entity('release', release_id.mbid))
@@ -0,0 +1,114 @@
+import threading
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable, Hashable, Sequence
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import TypeVar
+
+from omg.brainz.model import RecordingId, WorkId, WorkRecording, ParentWork, ArtistId, ArtistData, ReleaseId, \
+    ReleaseData, RecordingData, RecordingArtistRelation, WorkData
+from omg.brainz.source import MusicbrainzDataSourceBase
+
+T = TypeVar('T')
+
+
+@dataclass
+class MemoStatistics:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def __add__(self, other: 'MemoStatistics') -> 'MemoStatistics':
+        return MemoStatistics(self.hits + other.hits, self.misses + other.misses, self.evictions + other.evictions)
+
+    def __str__(self):
+        return f'{self.hits} hits, {self.misses} misses, {self.evictions} evictions'
+
+
+class MemoizingDataSource(MusicbrainzDataSourceBase):
+    """Data source decorator that remembers the results of another source in memory.
+
+    Each method has its own LRU cache of at most `max_entries` results. If a result is requested while it
+    is already being fetched by another thread, that thread waits for the pending request instead of
+    starting a second one. Hence, each entity is requested from the wrapped source at most once (unless
+    evicted or failed; exceptions are not remembered).
+
+    Hits (including waiting for a pending request), misses and evictions are counted per method in
+    `statistics`.
+    """
+
+    def __init__(self, source: MusicbrainzDataSourceBase, max_entries: int = 10_000):
+        self.source = source
+        self.max_entries = max_entries
+        self.statistics: dict[str, MemoStatistics] = defaultdict(MemoStatistics)
+        self._results: dict[str, OrderedDict[Hashable, object]] = defaultdict(OrderedDict)
+        self._pending: dict[tuple[str, Hashable], Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def total_statistics(self) -> MemoStatistics:
+        with self._lock:
+            return sum(self.statistics.values(), MemoStatistics())
+
+    def _get(self, method: str, key: Hashable, fetch: Callable[[], T]) -> T:
+        with self._lock:
+            results = self._results[method]
+            statistics = self.statistics[method]
+            if key in results:
+                statistics.hits += 1
+                results.move_to_end(key)
+                return results[key]
+            pending = self._pending.get((method, key))
+            if pending is None:
+                statistics.misses += 1
+                future = self._pending[method, key] = Future()
+            else:
+                statistics.hits += 1
+        if pending is not None:
+            return pending.result()
+        try:
+            result = fetch()
+        except BaseException as e:
+            with self._lock:
+                del self._pending[method, key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            results[key] = result
+            while len(results) > self.max_entries:
+                results.popitem(last=False)
+                statistics.evictions += 1
+            del self._pending[method, key]
+        future.set_result(result)
+        return result
+
+    def prefetch_release(self, release_id: ReleaseId):
+        with self._lock:
+            if release_id in self._results['get_release_data']:
+                return
+        self.source.prefetch_release(release_id)
+
+    def get_recorded_work(self, recording_id: RecordingId) -> Sequence[WorkRecording]:
+        return self._get('get_recorded_work', recording_id, lambda: self.source.get_recorded_work(recording_id))
+
+    def get_parent_works(self, work: WorkId) -> Sequence[ParentWork]:
+        return self._get('get_parent_works', work, lambda: self.source.get_parent_works(work))
+
+    def get_composers(self, work: WorkId) -> Sequence[ArtistId]:
+        return self._get('get_composers', work, lambda: self.source.get_composers(work))
+
+    def get_work_data(self, work_id: WorkId) -> WorkData:
+        return self._get('get_work_data', work_id, lambda: self.source.get_work_data(work_id))
+
+    def get_artist_data(self, artist_id: ArtistId) -> ArtistData:
+        return self._get('get_artist_data', artist_id, lambda: self.source.get_artist_data(artist_id))
+
+    def get_recording_data(self, recording_id: RecordingId) -> RecordingData:
+        return self._get('get_recording_data', recording_id, lambda: self.source.get_recording_data(recording_id))
+
+    def get_recording_artists(self, recording_id: RecordingId) -> Sequence[RecordingArtistRelation]:
+        return self._get('get_recording_artists', recording_id,
+                         lambda: self.source.get_recording_artists(recording_id))
+
+    def get_release_data(self, release_id: ReleaseId) -> ReleaseData:
+        return self._get('get_release_data', release_id, lambda: self.source.get_release_data(release_id))
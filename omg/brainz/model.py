@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import sys
 from collections.abc import Sequence
 from dataclasses import dataclass
 from datetime import timedelta
@@ -7,31 +8,48 @@ from datetime import timedelta
 from omg.util.dates import PartialDate
 
 
-@dataclass(frozen=True)
-class RecordingId:
-    mbid: str
+@dataclass(frozen=True, slots=True)
+class MbId:
+    """Base class of the typed Musicbrainz ids.
 
-@dataclass(frozen=True)
-class TrackId:
+    The MBID strings are interned, since large collections reference the same ids many times.
+    """
     mbid: str
 
-@dataclass(frozen=True)
-class WorkId:
-    mbid: str
+    def __post_init__(self):
+        object.__setattr__(self, 'mbid', sys.intern(self.mbid))
 
+    def __reduce__(self):
+        # unpickle through __init__, such that the string is interned
+        return type(self), (self.mbid,)
 
-@dataclass(frozen=True)
-class ArtistId:
-    mbid: str
+
+@dataclass(frozen=True, slots=True)
+class RecordingId(MbId):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class TrackId(MbId):
+    pass
 
 
-@dataclass(frozen=True)
-class ReleaseId:
+@dataclass(frozen=True, slots=True)
+class WorkId(MbId):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class ArtistId(MbId):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class ReleaseId(MbId):
     """Musicbraniz release id."""
-    mbid: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class WorkRecording:
     """Work-recording relation."""
     recording: RecordingId
@@ -43,7 +61,7 @@ class WorkRecording:
         return WorkRecording(work=WorkId(work_relation['work']['id']), recording=recording)
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ParentWork:
     parent_work: WorkId
     part: WorkId
@@ -58,22 +76,24 @@ class ParentWork:
         )
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ArtistData:
     id: ArtistId
     name: str
     sort: str | None
     disambiguation: str | None
+    aliases: tuple[str, ...] = ()
+    """Other names of the artist (e.g. in other languages or scripts) than `name`."""
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class WorkData:
     id: WorkId
     name: str
     disambiguation: str | None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class RecordingData:
     id: RecordingId
     title: str
@@ -81,36 +101,36 @@ class RecordingData:
     disambiguation: str | None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TrackData:
     position: int
     recording_id: RecordingId
     track_id: TrackId
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class MediumData:
     position: int
-    format: str
+    format: str | None
     tracks: Sequence[TrackData]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ReleaseData:
     id: ReleaseId
     title: str
     credited_artists: Sequence[ArtistId]
-    date: PartialDate
+    date: PartialDate | None
     media: Sequence[MediumData]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class RecordingArtistRelationType:
     type: str
     attributes: Sequence[str] = tuple()
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class RecordingArtistRelation:
     recording: RecordingId
     artist: ArtistId
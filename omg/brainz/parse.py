@@ -0,0 +1,102 @@
+"""Conversion of Musicbrainz JSON entities (as returned by the web service, or found in the JSON dumps) to
+model objects."""
+from collections.abc import Sequence
+from datetime import timedelta
+
+from omg.brainz.aliases import get_alias, Alias
+from omg.brainz.model import RecordingId, WorkId, WorkRecording, ParentWork, ArtistId, ArtistData, WorkData, \
+    RecordingData, RecordingArtistRelation, RecordingArtistRelationType, ReleaseId, ReleaseData, MediumData, \
+    TrackData, TrackId
+from omg.util.dates import PartialDate
+
+
+def parse_recorded_works(recording: RecordingId, result: dict) -> Sequence[WorkRecording]:
+    performances = [wr for wr in relations(result, 'work') if is_performance(wr)]
+    return [WorkRecording.from_work_relation(recording, p) for p in performances]
+
+
+def parse_parent_works(work: WorkId, result: dict) -> Sequence[ParentWork]:
+    part_ofs = [wr for wr in relations(result, 'work') if is_part_of(wr)]
+    return [ParentWork.from_work_relation(work, p) for p in part_ofs]
+
+
+def parse_composers(result: dict) -> Sequence[ArtistId]:
+    composers = [ar for ar in relations(result, 'artist') if is_composer(ar)]
+    return [ArtistId(c['artist']['id']) for c in composers]
+
+
+def parse_work_data(work: WorkId, result: dict, preferred_locales: Sequence[str]) -> WorkData:
+    alias = get_alias(result['aliases'], preferred_locales)
+    if alias is None:
+        alias = Alias(result['title'], result.get('sort-name'))
+    return WorkData(id=work, name=alias.name, disambiguation=result.get('disambiguation') or None)
+
+
+def parse_artist_data(artist: ArtistId, result: dict, preferred_locales: Sequence[str]) -> ArtistData:
+    alias = get_alias(result['aliases'], preferred_locales)
+    if alias is None:
+        alias = Alias(result['name'], result.get('sort-name'))
+    other_names = dict.fromkeys([result['name'], *(a['name'] for a in result['aliases'])])
+    other_names.pop(alias.name, None)
+    return ArtistData(id=artist, name=alias.name, sort=alias.sort_name,
+                      disambiguation=result.get('disambiguation') or None, aliases=tuple(other_names))
+
+
+def parse_recording_data(recording: RecordingId, result: dict) -> RecordingData:
+    return RecordingData(id=recording, title=result['title'], disambiguation=result.get('disambiguation') or None,
+                         length=timedelta(milliseconds=float(result['length'])))
+
+
+def parse_recording_artists(recording: RecordingId, result: dict) -> Sequence[RecordingArtistRelation]:
+    artist_relations = []
+    for relation in relations(result, 'artist'):
+        if relation.get('direction') != 'backward':
+            continue
+        relation_type = RecordingArtistRelationType(relation['type'], tuple(relation.get('attributes', [])))
+        artist = ArtistId(mbid=relation['artist']['id'])
+        end = relation.get('end')
+        artist_relations.append(RecordingArtistRelation(recording, artist, type=relation_type,
+                                                        end_date=PartialDate.parse(end) if end else None))
+    return artist_relations
+
+
+def parse_release_data(release: ReleaseId, result: dict) -> ReleaseData:
+    date = result.get('date')
+    return ReleaseData(id=release, title=result['title'],
+                       date=PartialDate.parse(date) if date else None,
+                       media=tuple(parse_medium(m) for m in result['media']),
+                       credited_artists=parse_release_artists(result))
+
+
+def parse_medium(medium: dict) -> MediumData:
+    # releases can have hundreds of tracks, so avoid a function call per track (see benchmarks/release_parsing.py)
+    return MediumData(position=medium['position'], format=medium.get('format'),
+                      tracks=tuple(TrackData(position=track['position'],
+                                             recording_id=RecordingId(track['recording']['id']),
+                                             track_id=TrackId(track['id']))
+                                   for track in medium.get('tracks', ())))
+
+
+def parse_release_artists(release: dict) -> Sequence[ArtistId]:
+    result = []
+    for artist_credit in release['artist-credit']:
+        if isinstance(artist_credit, dict) and 'artist' in artist_credit:
+            result.append(ArtistId(artist_credit['artist']['id']))
+    return tuple(result)
+
+
+def relations(result: dict, target_type: str) -> list[dict]:
+    """Get the relations of an entity to entities of the given type (e.g. 'work' or 'artist')."""
+    return [relation for relation in result.get('relations', ()) if relation.get('target-type') == target_type]
+
+
+def is_performance(work_relation: dict) -> bool:
+    return work_relation.get('type') == 'performance' and work_relation.get('direction') == 'forward'
+
+
+def is_part_of(work_relation: dict) -> bool:
+    return work_relation.get('type') == 'parts' and work_relation.get('direction') == 'backward'
+
+
+def is_composer(artist_relation: dict) -> bool:
+    return artist_relation.get('type') == 'composer' and artist_relation.get('direction') == 'backward'
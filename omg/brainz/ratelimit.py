@@ -0,0 +1,152 @@
+import threading
+import time
+from collections.abc import Callable, Mapping
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from requests.adapters import HTTPAdapter
+
+
+THROTTLING_STATUS_CODES = frozenset({429, 503})
+"""HTTP status codes with which a server asks to slow down."""
+
+
+def retry_after(response) -> float | None:
+    """The delay in seconds requested by the `Retry-After` header of `response`, if any."""
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` acquisitions per second on average, and up to `burst` at once.
+
+    The rate adapts to the server: `slow_down` reduces it multiplicatively (but not below `min_rate`),
+    and each `recover` increases it by `recovery` times the initial rate, up to the initial rate again.
+    `pause` blocks all acquisitions for a while.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep, min_rate: float | None = None,
+                 recovery: float = 0.05):
+        if rate <= 0:
+            raise ValueError(f'rate must be positive, got {rate}')
+        if burst < 1:
+            raise ValueError(f'burst must be at least 1, got {burst}')
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = rate / 16 if min_rate is None else min_rate
+        self.recovery = recovery
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(burst)
+        self._last_refill = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _take(self) -> float:
+        """Take a token if available and return 0, otherwise return the time until the next token."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> float:
+        """Block until a token is available and take it; return the time waited."""
+        waited = 0
+        while (wait := self._take()) > 0:
+            self._sleep(wait)
+            waited += wait
+        return waited
+
+    def slow_down(self, factor: float = 0.5):
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * factor)
+
+    def recover(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill()
+                self.rate = min(self.max_rate, self.rate + self.recovery * self.max_rate)
+
+    def pause(self, seconds: float):
+        """Make sure that the next token is not available before `seconds` from now."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+
+class RateLimiter:
+    """A token bucket per host, with default `rate` and `burst` unless configured otherwise in `host_limits`.
+
+    `host_limits` maps host names to (rate, burst) pairs.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, host_limits: Mapping[str, tuple[float, int]] | None = None):
+        self.rate = rate
+        self.burst = burst
+        self.host_limits = dict(host_limits or {})
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate, burst = self.host_limits.get(host, (self.rate, self.burst))
+                bucket = self._buckets[host] = TokenBucket(rate, burst)
+            return bucket
+
+    def acquire(self, host: str) -> float:
+        return self.bucket(host).acquire()
+
+    def update(self, host: str, response):
+        """Adapt the rate for `host` to a response: slow down if throttled, otherwise recover."""
+        bucket = self.bucket(host)
+        if response.status_code in THROTTLING_STATUS_CODES:
+            bucket.slow_down()
+            delay = retry_after(response)
+            if delay is not None:
+                bucket.pause(delay)
+        else:
+            bucket.recover()
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """HTTP adapter that waits for the rate limiter before sending a request.
+
+    Since the limit is applied in the transport adapter, responses served by a caching session (which
+    never reach the adapter) do not count against it. The time spent waiting is stored in the
+    `rate_limit_wait` attribute of the response. Each response is passed to `RateLimiter.update`, so the
+    rate adapts to throttling by the server.
+    """
+
+    def __init__(self, limiter: RateLimiter | None, pool_size: int = 10, **kwargs):
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, **kwargs)
+        self.limiter = limiter
+
+    def send(self, request, *args, **kwargs):
+        if self.limiter is None:
+            return super().send(request, *args, **kwargs)
+        host = urlsplit(request.url).netloc
+        waited = self.limiter.acquire(host)
+        response = super().send(request, *args, **kwargs)
+        self.limiter.update(host, response)
+        response.rate_limit_wait = waited
+        return response
@@ -8,6 +8,13 @@ from omg.brainz.model import RecordingId, WorkId, WorkRecording, ParentWork, Art
 
 class MusicbrainzDataSourceBase(ABC):
 
+    def prefetch_release(self, release_id: ReleaseId):
+        """Hint that the recordings of the given release are about to be requested.
+
+        Sources may use this to load them in bulk. The default implementation does nothing.
+        """
+        pass
+
     @abstractmethod
     def get_recorded_work(self, recording_id: RecordingId) -> Sequence[WorkRecording]:
         """Get all 'WorkRecording' objects that point to this recording."""
@@ -0,0 +1,115 @@
+import bisect
+import math
+import threading
+from dataclasses import dataclass, field
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+"""Upper bounds (in seconds) of the latency histogram buckets."""
+
+
+@dataclass
+class EndpointStats:
+    """Statistics of the requests to one endpoint (entity type and includes)."""
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    bytes_received: int = 0
+    cache_hits: int = 0
+    total_seconds: float = 0
+    """Total latency of the requests, excluding the time spent waiting for the rate limiter."""
+    throttled_seconds: float = 0
+    latency_histogram: list[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+
+    @property
+    def mean_latency(self) -> float | None:
+        return self.total_seconds / self.requests if self.requests > 0 else None
+
+    @property
+    def cache_hit_ratio(self) -> float | None:
+        """Fraction of lookups answered from a cache instead of by a request."""
+        lookups = self.cache_hits + self.requests
+        return self.cache_hits / lookups if lookups > 0 else None
+
+    def latency_quantile(self, q: float) -> float | None:
+        """Upper bound of the histogram bucket containing the `q`-quantile of the request latencies."""
+        if self.requests == 0:
+            return None
+        rank = q * self.requests
+        count = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS, self.latency_histogram):
+            count += bucket_count
+            if count >= rank:
+                return bound
+        return math.inf
+
+
+class RequestStats:
+    """Thread-safe collection of `EndpointStats`, keyed by (endpoint, include) pairs.
+
+    The endpoint is the entity type, or e.g. 'recording?release' for browse requests.
+    """
+
+    def __init__(self):
+        self.endpoints: dict[tuple[str, str], EndpointStats] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, endpoint: str, include: str) -> EndpointStats:
+        stats = self.endpoints.get((endpoint, include))
+        if stats is None:
+            stats = self.endpoints[endpoint, include] = EndpointStats()
+        return stats
+
+    def record_request(self, endpoint: str, include: str, seconds: float, bytes_received: int,
+                       error: bool = False, throttled_seconds: float = 0):
+        with self._lock:
+            stats = self._get(endpoint, include)
+            stats.requests += 1
+            stats.errors += error
+            stats.bytes_received += bytes_received
+            stats.total_seconds += seconds
+            stats.throttled_seconds += throttled_seconds
+            stats.latency_histogram[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def record_retry(self, endpoint: str, include: str):
+        with self._lock:
+            self._get(endpoint, include).retries += 1
+
+    def record_cache_hit(self, endpoint: str, include: str):
+        with self._lock:
+            self._get(endpoint, include).cache_hits += 1
+
+    @property
+    def total(self) -> EndpointStats:
+        total = EndpointStats()
+        with self._lock:
+            for stats in self.endpoints.values():
+                total.requests += stats.requests
+                total.errors += stats.errors
+                total.retries += stats.retries
+                total.bytes_received += stats.bytes_received
+                total.cache_hits += stats.cache_hits
+                total.total_seconds += stats.total_seconds
+                total.throttled_seconds += stats.throttled_seconds
+                total.latency_histogram = [a + b for a, b in zip(total.latency_histogram, stats.latency_histogram)]
+        return total
+
+    def summary(self) -> str:
+        """A table of all endpoints, sorted by total request time (the most expensive first)."""
+
+        def format_seconds(seconds: float | None) -> str:
+            return '-' if seconds is None else '>10s' if seconds == math.inf else f'{seconds * 1000:.0f}ms'
+
+        def format_ratio(ratio: float | None) -> str:
+            return '-' if ratio is None else f'{ratio:.0%}'
+
+        with self._lock:
+            rows = sorted(self.endpoints.items(), key=lambda item: item[1].total_seconds, reverse=True)
+        lines = [f'{"endpoint":<20} {"include":<32} {"requests":>8} {"errors":>6} {"retries":>7} {"mean":>7} '
+                 f'{"p95":>7} {"total":>8} {"throttled":>9} {"KiB":>8} {"cache hits":>10}']
+        for (endpoint, include), stats in rows + [(('total', ''), self.total)]:
+            lines.append(f'{endpoint:<20} {include:<32} {stats.requests:>8} {stats.errors:>6} {stats.retries:>7} '
+                         f'{format_seconds(stats.mean_latency):>7} {format_seconds(stats.latency_quantile(0.95)):>7} '
+                         f'{stats.total_seconds:>7.1f}s {stats.throttled_seconds:>8.1f}s '
+                         f'{stats.bytes_received / 1024:>8.0f} '
+                         f'{format_ratio(stats.cache_hit_ratio):>10}')
+        return '\n'.join(lines)
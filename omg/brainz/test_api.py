@@ -1,10 +1,13 @@
+import dataclasses
 from datetime import timedelta
 
 import pytest
 
+from omg.brainz.api import MusicbrainzApiDataSource
 from omg.brainz.model import WorkId, WorkRecording, ParentWork, ArtistId, ArtistData, WorkData, \
-    RecordingData, RecordingArtistRelation, RecordingArtistRelationType
+    RecordingData, RecordingArtistRelation, RecordingArtistRelationType, RecordingId, ReleaseId
 from omg.test_utils.mbids import rach3_mvmt1, rach3_mvmt2, argerich_rach3_mvmt1, rach3, rach, argerich_rach3_tchaik1
+from omg.test_utils.stub_server import StubMusicbrainzServer
 from omg.util.dates import PartialDate
 
 
@@ -43,7 +46,10 @@ def test_get_artist_data(musicbrainz_source):
     expected = ArtistData(id=rach, name='Sergei Rachmaninow',
                           sort='Rachmaninow, Sergei', disambiguation='Russian composer')
 
-    assert result == expected
+    assert dataclasses.replace(result, aliases=()) == expected
+    # the aliases in Musicbrainz change over time, but the artist's (English) name comes first, not the German one
+    assert result.aliases[0] == 'Sergei Rachmaninoff'
+    assert 'Sergei Rachmaninow' not in result.aliases
 
 
 def test_get_work_data(musicbrainz_source):
@@ -105,3 +111,112 @@ def test_get_release(musicbrainz_source):
     assert medium.tracks[0].recording_id == argerich_rach3_mvmt1
 
     assert len(release.credited_artists) == 5
+
+
+def stub_entity(entity: str, mbid: str, query: dict[str, list[str]]):
+    match entity:
+        case 'recording':
+            body = {'id': mbid, 'title': 'Intermezzo', 'length': 600000, 'relations': [
+                {'target-type': 'work', 'type': 'performance', 'direction': 'forward', 'work': {'id': 'w1'}},
+                {'target-type': 'artist', 'type': 'conductor', 'direction': 'backward', 'artist': {'id': 'a1'},
+                 'end': '1982-12'},
+            ]}
+        case 'work':
+            body = {'id': mbid, 'title': 'Intermezzo', 'aliases': [], 'relations': [
+                {'target-type': 'work', 'type': 'parts', 'direction': 'backward', 'work': {'id': 'w0'},
+                 'ordering-key': 2},
+                {'target-type': 'artist', 'type': 'composer', 'direction': 'backward', 'artist': {'id': 'a0'}},
+            ]}
+        case _:
+            body = {'id': mbid, 'name': 'Sergei Rachmaninoff', 'aliases': [
+                {'name': 'Sergei Rachmaninoff', 'locale': 'en', 'primary': True},
+                {'name': 'Сергей Васильевич Рахманинов', 'locale': 'ru', 'primary': True}]}
+    return 200, body, {}
+
+
+@pytest.fixture
+def stub_source():
+    with StubMusicbrainzServer(stub_entity) as server:
+        source = MusicbrainzApiDataSource(dataclasses.replace(server.config, rate_limit=False))
+        yield source, server
+        source.close()
+
+
+def test_recording_accessors_share_one_request(stub_source):
+    source, server = stub_source
+    recording = RecordingId('r1')
+
+    assert source.get_recording_data(recording).title == 'Intermezzo'
+    assert source.get_recorded_work(recording) == [WorkRecording(recording, WorkId('w1'))]
+    assert [relation.artist for relation in source.get_recording_artists(recording)] == [ArtistId('a1')]
+
+    assert [path for _, path in server.requests] == ['/ws/2/recording/r1?inc=work-rels%2Bartist-rels']
+
+
+def test_work_accessors_share_one_request(stub_source):
+    source, server = stub_source
+    work = WorkId('w1')
+
+    assert source.get_work_data(work).name == 'Intermezzo'
+    assert source.get_composers(work) == [ArtistId('a0')]
+    assert source.get_parent_works(work) == [ParentWork(parent_work=WorkId('w0'), part=work, number=2)]
+
+    assert len(server.requests) == 1
+
+
+def test_artist_aliases(stub_source):
+    source, _ = stub_source
+    source.preferred_locales = ['ru']
+
+    artist = source.get_artist_data(ArtistId('a1'))
+
+    assert artist.name == 'Сергей Васильевич Рахманинов'
+    assert artist.aliases == ('Sergei Rachmaninoff',)
+
+
+def test_entity_cache_is_bounded(stub_source):
+    source, server = stub_source
+    source.entity_cache_size = 2
+
+    for mbid in ('a1', 'a2', 'a1', 'a3', 'a2'):
+        source.get_artist_data(ArtistId(mbid))
+
+    assert [path.split('?')[0] for _, path in server.requests] == ['/ws/2/artist/a1', '/ws/2/artist/a2',
+                                                                  '/ws/2/artist/a3', '/ws/2/artist/a2']
+
+
+def test_entity_cache_keeps_merged_entities_by_requested_mbid():
+    def merged_artist(entity: str, mbid: str, query: dict[str, list[str]]):
+        return 200, {'id': 'a1', 'name': 'Sergei Rachmaninoff', 'aliases': []}, {}
+
+    with StubMusicbrainzServer(merged_artist) as server:
+        source = MusicbrainzApiDataSource(dataclasses.replace(server.config, rate_limit=False))
+        for _ in range(3):
+            assert source.get_artist_data(ArtistId('merged')).name == 'Sergei Rachmaninoff'
+        source.close()
+
+    assert len(server.requests) == 1
+
+
+def stub_browse(entity: str, mbid: str, query: dict[str, list[str]]):
+    assert entity == 'recording' and mbid == '' and query['release'] == ['rel']
+    offset, limit = int(query['offset'][0]), int(query['limit'][0])
+    recordings = [stub_entity('recording', f'r{i}', {})[1] for i in range(5)]
+    return 200, {'recordings': recordings[offset:offset + limit], 'recording-count': len(recordings)}, {}
+
+
+def test_prefetch_release_browses_recordings():
+    with StubMusicbrainzServer(stub_browse) as server:
+        source = MusicbrainzApiDataSource(dataclasses.replace(server.config, rate_limit=False))
+        source.browse_limit = 2
+
+        source.prefetch_release(ReleaseId('rel'))
+        for i in range(5):
+            recording = RecordingId(f'r{i}')
+            source.get_recording_data(recording)
+            source.get_recorded_work(recording)
+            source.get_recording_artists(recording)
+        source.close()
+
+    assert len(server.requests) == 3
+    assert all('inc=work-rels%2Bartist-rels' in path for _, path in server.requests)
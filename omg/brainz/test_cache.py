@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+import pytest
+
+from omg.brainz.cache import CachingDataSource, NotCachedError
+from omg.brainz.model import ArtistId, WorkId, ReleaseId
+from omg.collection.builder import CollectionBuilder
+from omg.collection.store import CollectionStore
+from omg.test_utils.fake_source import FakeDataSource
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def build_all(source):
+    builder = CollectionBuilder(CollectionStore(), source)
+    for release in FakeDataSource().releases:
+        builder.get_or_add_release(release)
+    return builder.store
+
+
+def test_repeated_build_makes_no_calls(tmp_path):
+    first = FakeDataSource()
+    with_cache = CachingDataSource(first, tmp_path / 'cache.sqlite')
+    expected = build_all(with_cache)
+    with_cache.close()
+    assert first.total_calls > 0
+
+    second = FakeDataSource()
+    store = build_all(CachingDataSource(second, tmp_path / 'cache.sqlite'))
+
+    assert second.total_calls == 0
+    assert store.releases_by_id == expected.releases_by_id
+    assert store.tracks_by_id == expected.tracks_by_id
+
+
+def test_entries_expire(tmp_path):
+    clock = FakeClock()
+    source = FakeDataSource()
+    cache = CachingDataSource(source, tmp_path / 'cache.sqlite', clock=clock,
+                              ttl={'artist': timedelta(days=1), 'work': None})
+    artist = ArtistId('composer-0')
+    work = WorkId('work-0')
+
+    cache.get_artist_data(artist)
+    cache.get_work_data(work)
+    clock.now += timedelta(hours=23).total_seconds()
+    cache.get_artist_data(artist)
+    assert source.calls['get_artist_data'] == 1
+    clock.now += timedelta(hours=2).total_seconds()
+    cache.get_artist_data(artist)
+    cache.get_work_data(work)
+
+    assert source.calls['get_artist_data'] == 2
+    assert source.calls['get_work_data'] == 1
+
+
+def test_offline_mode(tmp_path):
+    clock = FakeClock()
+    online = CachingDataSource(FakeDataSource(), tmp_path / 'cache.sqlite', clock=clock)
+    artist = online.get_artist_data(ArtistId('composer-0'))
+    online.close()
+    clock.now += timedelta(days=1000).total_seconds()
+
+    offline = CachingDataSource(None, tmp_path / 'cache.sqlite', offline=True, clock=clock)
+
+    assert offline.get_artist_data(ArtistId('composer-0')) == artist
+    with pytest.raises(NotCachedError):
+        offline.get_release_data(ReleaseId('release-0'))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    clock = FakeClock()
+    source = FakeDataSource()
+    cache = CachingDataSource(source, tmp_path / 'cache.sqlite', clock=clock)
+    artists = [ArtistId(f'composer-{i}') for i in range(3)]
+    for artist in artists:
+        cache.get_artist_data(artist)
+        clock.now += 1
+    cache.get_artist_data(artists[0])
+    cache.max_size = cache._size - 1
+
+    cache.get_artist_data(artists[0])  # no eviction on hits
+    cache.get_work_data(WorkId('work-0'))
+
+    cache.get_artist_data(artists[0])
+    cache.get_artist_data(artists[2])
+    assert source.calls['get_artist_data'] == 3
+    cache.get_artist_data(artists[1])
+    assert source.calls['get_artist_data'] == 4
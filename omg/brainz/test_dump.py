@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from omg.brainz.dump import DumpIndex, MusicbrainzDumpDataSource, NotInDumpError
+from omg.brainz.model import ReleaseId, WorkId, ArtistId, RecordingId, ParentWork, TrackId
+from omg.collection.builder import CollectionBuilder
+from omg.collection.entities import TrackGroupId
+from omg.collection.store import CollectionStore
+from omg.util.dates import PartialDate
+
+
+def artist_relation(mbid: str, relation_type: str, **kwargs):
+    return {'target-type': 'artist', 'type': relation_type, 'direction': 'backward', 'artist': {'id': mbid}, **kwargs}
+
+
+def work_relation(mbid: str, relation_type: str, direction: str, **kwargs):
+    return {'target-type': 'work', 'type': relation_type, 'direction': direction, 'work': {'id': mbid}, **kwargs}
+
+
+DUMP = {
+    'release': [{'id': 'rel', 'title': 'Piano Concertos', 'date': '1995-03', 'artist-credit': [
+        {'name': 'Pianist', 'artist': {'id': 'pianist'}}],
+                 'media': [{'position': 1, 'format': 'CD', 'tracks': [
+                     {'id': f'track{i}', 'position': i + 1, 'recording': {'id': f'rec{i}'}} for i in range(2)]}]}],
+    'recording': [{'id': f'rec{i}', 'title': f'Movement {i + 1}', 'length': 60000,
+                   'relations': [work_relation(f'mvmt{i}', 'performance', 'forward'),
+                                 artist_relation('pianist', 'instrument', attributes=['piano'], end='1982-12')]}
+                  for i in range(2)],
+    'work': [{'id': f'mvmt{i}', 'title': f'Concerto: Movement {i + 1}', 'aliases': [],
+              'relations': [work_relation('concerto', 'parts', 'backward', **{'ordering-key': i + 1}),
+                            artist_relation('composer', 'composer')]}
+             for i in range(2)] + [{'id': 'concerto', 'title': 'Piano Concerto No. 3', 'aliases': [],
+                                    'relations': [artist_relation('composer', 'composer')]}],
+    'artist': [{'id': 'pianist', 'name': 'Pianist', 'sort-name': 'Pianist', 'aliases': []},
+               {'id': 'composer', 'name': 'Sergei Rachmaninoff', 'aliases': [
+                   {'name': 'Sergei Rachmaninow', 'sort-name': 'Rachmaninow, Sergei', 'locale': 'de',
+                    'primary': True},
+                   {'name': 'Сергей Васильевич Рахманинов', 'locale': 'ru', 'primary': True}]}],
+}
+
+
+@pytest.fixture
+def dump_source(tmp_path):
+    index = DumpIndex(tmp_path / 'index.sqlite')
+    for entity, documents in DUMP.items():
+        dump_file = tmp_path / entity
+        dump_file.write_text(''.join(json.dumps(document, ensure_ascii=False) + '\n' for document in documents))
+        assert index.add_dump(entity, dump_file) == len(documents)
+    source = MusicbrainzDumpDataSource(index, preferred_locales=('de',))
+    yield source
+    source.close()
+    index.close()
+
+
+def test_lookups(dump_source):
+    composer = dump_source.get_artist_data(ArtistId('composer'))
+    assert composer.name == 'Sergei Rachmaninow'
+    assert composer.aliases == ('Sergei Rachmaninoff', 'Сергей Васильевич Рахманинов')
+    assert dump_source.get_parent_works(WorkId('mvmt1')) == [ParentWork(WorkId('concerto'), WorkId('mvmt1'), 2)]
+    assert dump_source.get_composers(WorkId('mvmt0')) == [ArtistId('composer')]
+    relation, = dump_source.get_recording_artists(RecordingId('rec0'))
+    assert relation.end_date == PartialDate(1982, 12)
+    release = dump_source.get_release_data(ReleaseId('rel'))
+    assert release.date == PartialDate(1995, 3)
+    assert release.media[0].tracks[1].track_id == TrackId('track1')
+    with pytest.raises(NotInDumpError):
+        dump_source.get_work_data(WorkId('symphony'))
+
+
+def test_lookups_map_each_dump_once(dump_source):
+    for _ in range(3):
+        dump_source.get_recording_data(RecordingId('rec1'))
+        dump_source.get_recording_data(RecordingId('rec0'))
+    dump_source.get_artist_data(ArtistId('composer'))
+
+    assert len(dump_source._maps) == 2
+
+
+def test_build_collection_from_dump(dump_source):
+    store = CollectionStore()
+
+    release = CollectionBuilder(store, dump_source).get_or_add_release(ReleaseId('rel'))
+
+    assert release.contents == (TrackGroupId(TrackId('track0'), 2),)
+    assert store.get_artist(ArtistId('pianist')).name == 'Pianist'
+    assert store.get_work(WorkId('concerto')).name == 'Piano Concerto No. 3'
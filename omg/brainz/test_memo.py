@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from omg.brainz.memo import MemoizingDataSource, MemoStatistics
+from omg.brainz.model import ArtistId, WorkId, ReleaseId
+from omg.collection.builder import CollectionBuilder
+from omg.collection.store import CollectionStore
+from omg.test_utils.fake_source import FakeDataSource
+
+
+def test_build_looks_up_each_entity_once():
+    source = FakeDataSource(releases=3)
+    memo = MemoizingDataSource(source)
+    builder = CollectionBuilder(CollectionStore(), memo)
+
+    for release in source.releases:
+        builder.get_or_add_release(release)
+
+    assert max(source.lookups.values()) == 1
+    assert memo.statistics['get_release_data'] == MemoStatistics(hits=0, misses=3)
+
+
+def test_lru_eviction():
+    source = FakeDataSource()
+    memo = MemoizingDataSource(source, max_entries=2)
+
+    for mbid in ('composer-0', 'composer-1', 'composer-0', 'composer-2', 'composer-1'):
+        memo.get_artist_data(ArtistId(mbid))
+
+    assert source.calls['get_artist_data'] == 4
+    assert memo.statistics['get_artist_data'] == MemoStatistics(hits=1, misses=4, evictions=2)
+
+
+def test_concurrent_requests_are_deduplicated():
+    source = FakeDataSource(latency=0.1)
+    memo = MemoizingDataSource(source)
+    results = []
+
+    threads = [threading.Thread(target=lambda: results.append(memo.get_work_data(WorkId('work-0'))))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert source.calls['get_work_data'] == 1
+    assert results == [source.works[WorkId('work-0')]] * 8
+    assert memo.total_statistics == MemoStatistics(hits=7, misses=1)
+
+
+def test_failures_are_not_remembered():
+    source = FakeDataSource()
+    memo = MemoizingDataSource(source)
+    release = ReleaseId('release-9')
+
+    with pytest.raises(KeyError):
+        memo.get_release_data(release)
+    with pytest.raises(KeyError):
+        memo.get_release_data(release)
+
+    assert source.calls['get_release_data'] == 2
+
+
+class PrefetchCountingSource(FakeDataSource):
+    def __init__(self):
+        super().__init__()
+        self.prefetched = []
+
+    def prefetch_release(self, release_id):
+        self.prefetched.append(release_id)
+
+
+def test_prefetch_is_forwarded_once():
+    source = PrefetchCountingSource()
+    builder = CollectionBuilder(CollectionStore(), MemoizingDataSource(source))
+
+    builder.get_or_add_release(ReleaseId('release-0'))
+    builder.get_or_add_release(ReleaseId('release-0'))
+    builder.brainz_source.prefetch_release(ReleaseId('release-0'))
+
+    assert source.prefetched == [ReleaseId('release-0')]
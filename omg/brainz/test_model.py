@@ -0,0 +1,27 @@
+import pickle
+
+import pytest
+
+from omg.brainz.model import RecordingId, WorkId, TrackData, TrackId
+
+
+def new_string(value: str) -> str:
+    return ''.join(list(value))
+
+
+def test_ids_compare_by_type_and_mbid():
+    assert RecordingId('abc') == RecordingId(new_string('abc'))
+    assert hash(RecordingId('abc')) == hash(RecordingId(new_string('abc')))
+    assert RecordingId('abc') != WorkId('abc')
+    assert repr(WorkId('abc')) == "WorkId(mbid='abc')"
+
+
+def test_mbids_are_interned():
+    assert RecordingId(new_string('abc')).mbid is RecordingId(new_string('abc')).mbid
+    restored = pickle.loads(pickle.dumps(TrackData(1, RecordingId(new_string('abc')), TrackId('t'))))
+    assert restored.recording_id.mbid is RecordingId('abc').mbid
+
+
+def test_model_objects_are_compact():
+    with pytest.raises(AttributeError):
+        RecordingId('abc').__dict__
@@ -0,0 +1,25 @@
+from omg.brainz.model import ReleaseId, ArtistId, RecordingId, TrackId
+from omg.brainz.parse import parse_release_data
+from omg.util.dates import PartialDate
+
+
+def release_document(**kwargs) -> dict:
+    return {'id': 'rel', 'title': 'Encores', 'artist-credit': [{'name': 'Pianist', 'artist': {'id': 'pianist'}}],
+            'media': [{'position': 1, 'tracks': [{'id': 't1', 'position': 1, 'recording': {'id': 'r1'}}]}],
+            **kwargs}
+
+
+def test_parse_release_data():
+    release = parse_release_data(ReleaseId('rel'), release_document(date='1995-03'))
+
+    assert release.date == PartialDate(1995, 3)
+    assert release.credited_artists == (ArtistId('pianist'),)
+    medium, = release.media
+    assert medium.format is None
+    assert medium.tracks[0].recording_id == RecordingId('r1')
+    assert medium.tracks[0].track_id == TrackId('t1')
+
+
+def test_parse_release_without_date():
+    assert parse_release_data(ReleaseId('rel'), release_document()).date is None
+    assert parse_release_data(ReleaseId('rel'), release_document(date='')).date is None
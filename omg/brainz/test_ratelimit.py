@@ -0,0 +1,148 @@
+import dataclasses
+import time
+
+import pytest
+import requests
+
+from omg.brainz.api import MusicbrainzApiDataSource
+from omg.brainz.ratelimit import TokenBucket, RateLimiter, retry_after
+from omg.test_utils.stub_server import StubMusicbrainzServer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+def test_token_bucket_allows_burst_then_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.now == 0
+    bucket.acquire()
+    assert clock.now == pytest.approx(0.5)
+    clock.now += 10  # tokens do not accumulate beyond the burst size
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now == pytest.approx(11)
+
+
+def test_token_bucket_invalid_parameters():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+    with pytest.raises(ValueError):
+        TokenBucket(rate=1, burst=0)
+
+
+def test_token_bucket_adapts_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=8, clock=clock, sleep=clock.sleep, min_rate=1, recovery=0.25)
+
+    for _ in range(4):
+        bucket.slow_down()
+    assert bucket.rate == 1  # not below min_rate
+    bucket.recover()
+    assert bucket.rate == 3
+    for _ in range(5):
+        bucket.recover()
+    assert bucket.rate == 8
+
+
+def test_token_bucket_pause():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=5, clock=clock, sleep=clock.sleep)
+
+    bucket.pause(2)
+    assert bucket.acquire() == pytest.approx(2)
+    assert bucket.acquire() == pytest.approx(0.1)
+
+
+def test_retry_after():
+    class Response:
+        def __init__(self, **headers):
+            self.headers = headers
+
+    assert retry_after(Response()) is None
+    assert retry_after(Response(**{'Retry-After': '3'})) == 3
+    assert retry_after(Response(**{'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})) == 0  # in the past
+    assert retry_after(Response(**{'Retry-After': 'soon'})) is None
+
+
+def test_rate_limiter_per_host():
+    limiter = RateLimiter(1, host_limits={'mirror:5000': (100, 10)})
+
+    assert limiter.bucket('musicbrainz.org').rate == 1
+    assert limiter.bucket('mirror:5000').burst == 10
+    assert limiter.bucket('musicbrainz.org') is limiter.bucket('musicbrainz.org')
+
+
+def create_source(server: StubMusicbrainzServer, **config) -> MusicbrainzApiDataSource:
+    return MusicbrainzApiDataSource(dataclasses.replace(server.config, **config))
+
+
+def test_call_many_respects_rate_limit():
+    with StubMusicbrainzServer() as server:
+        source = create_source(server, requests_per_second=50, burst=5, max_workers=8)
+        start = time.monotonic()
+
+        results = source.call_many(('artist', str(i), None) for i in range(30))
+
+        elapsed = time.monotonic() - start
+        source.close()
+    assert [result['id'] for result in results] == [str(i) for i in range(30)]
+    # the first 5 requests are free (burst), the remaining 25 need at least 0.5s at 50 requests/s
+    assert elapsed >= 0.45
+    times = sorted(t for t, _ in server.requests)
+    assert len(times) == 30
+    assert 25 / (times[-1] - times[0]) <= 55
+
+
+def test_call_many_runs_in_parallel():
+    with StubMusicbrainzServer(latency=0.1) as server:
+        source = create_source(server, rate_limit=False, max_workers=8)
+
+        source.call_many(('work', str(i), 'aliases') for i in range(16))
+
+        source.close()
+    assert server.max_concurrent_requests > 1
+    assert server.requests[0][1].endswith('?inc=aliases')
+
+
+def test_throttled_requests_are_retried_and_slow_down():
+    attempts = {}
+
+    def handler(entity, mbid, query):
+        attempts[mbid] = attempts.get(mbid, 0) + 1
+        if attempts[mbid] == 1 and int(mbid) % 3 == 0:
+            return 503, {}, {'Retry-After': '0'} if mbid == '0' else {}
+        return 200, {'id': mbid}, {}
+
+    with StubMusicbrainzServer(handler) as server:
+        source = create_source(server, requests_per_second=200, burst=1, max_workers=4, backoff=0.01)
+
+        results = source.call_many(('artist', str(i), None) for i in range(12))
+
+        source.close()
+    assert [result['id'] for result in results] == [str(i) for i in range(12)]
+    assert len(server.requests) == 16
+    assert source.stats.total.retries == 4
+    assert source.rate_limiter.bucket(server.config.hostname).rate < 200
+
+
+def test_give_up_after_max_retries():
+    with StubMusicbrainzServer(lambda entity, mbid, query: (503, {}, {})) as server:
+        source = create_source(server, rate_limit=False, max_retries=2, backoff=0.01)
+
+        with pytest.raises(requests.HTTPError):
+            source.call_many([('artist', '1', None)])
+
+        source.close()
+    assert len(server.requests) == 3
@@ -0,0 +1,42 @@
+import dataclasses
+
+import pytest
+import requests
+
+from omg.brainz.api import MusicbrainzApiDataSource
+from omg.brainz.model import ArtistId
+from omg.brainz.stats import RequestStats, EndpointStats
+from omg.test_utils.stub_server import StubMusicbrainzServer
+
+
+def test_latency_histogram_and_quantiles():
+    stats = RequestStats()
+    for seconds in (0.02, 0.02, 0.04, 0.3, 3.0):
+        stats.record_request('work', 'aliases', seconds, 100)
+    stats.record_cache_hit('work', 'aliases')
+
+    work = stats.endpoints['work', 'aliases']
+    assert work.requests == 5
+    assert work.latency_quantile(0.5) == 0.05
+    assert work.latency_quantile(0.95) == 5.0
+    assert work.cache_hit_ratio == 1 / 6
+    assert stats.total.bytes_received == 500
+    assert EndpointStats().mean_latency is None
+
+
+def test_api_source_records_requests():
+    def handler(entity, mbid, query):
+        return (404, {}, {}) if mbid == 'missing' else (200, {'id': mbid, 'name': 'Name', 'aliases': []}, {})
+
+    with StubMusicbrainzServer(handler) as server:
+        source = MusicbrainzApiDataSource(dataclasses.replace(server.config, requests_per_second=1000))
+        source.get_artist_data(ArtistId('a1'))
+        source.get_artist_data(ArtistId('a1'))
+        with pytest.raises(requests.HTTPError):
+            source.get_artist_data(ArtistId('missing'))
+        source.close()
+
+    artist = source.stats.endpoints['artist', 'aliases']
+    assert (artist.requests, artist.errors, artist.cache_hits) == (2, 1, 1)
+    assert artist.bytes_received > 0
+    assert 'artist' in source.stats.summary()
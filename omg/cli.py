@@ -19,5 +19,7 @@ def cli(ctx, verbose):
 
 
 def run():
+    import omg.brainz.cli
+    import omg.collection.cli
     import omg.files.cli
     cli()
@@ -1,17 +1,30 @@
 import itertools
 import logging
+from collections.abc import Iterable, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
-from omg.brainz.model import ReleaseId, MediumData, TrackData, TrackId, ArtistId, WorkId
+from omg.brainz.memo import MemoizingDataSource
+from omg.brainz.model import ReleaseId, MediumData, TrackData, ArtistId, WorkId, RecordingId, MbId
 from omg.brainz.source import MusicbrainzDataSourceBase
 from omg.collection.entities import Release, Track, TrackGroupId, ParentWork, TrackGroup, Artist, Work
-from omg.collection.store import CollectionStore
+from omg.collection.store import CollectionStoreBase
 
 logger = logging.getLogger(__name__)
 
 
 class CollectionBuilder:
+    """Adds releases, with their tracks, works and artists, from a Musicbrainz data source to a store.
 
-    def __init__(self, store: CollectionStore, brainz_source: MusicbrainzDataSourceBase):
+    Besides the recorded works, their composers and the credited artists of a release, the parent works
+    (recursively) and the artists of the recordings are added, so that every work and artist referred to
+    by a stored entity is in the store as well.
+
+    A release is added in an `atomic` context of the store, so if a lookup fails or the builder is
+    interrupted, nothing of the release (including the works and artists added for it) remains in the
+    store, and the release can simply be added again later.
+    """
+
+    def __init__(self, store: CollectionStoreBase, brainz_source: MusicbrainzDataSourceBase):
         self.brainz_source = brainz_source
         self.store = store
 
@@ -19,7 +32,11 @@ class CollectionBuilder:
         existing = self.store.get_release(release_id)
         if existing is not None:
             return existing
+        with self.store.atomic():
+            return self._add_release(release_id)
 
+    def _add_release(self, release_id: ReleaseId) -> Release:
+        self.brainz_source.prefetch_release(release_id)
         release_data = self.brainz_source.get_release_data(release_id)
         artists = tuple(release_data.credited_artists)
         for artist in artists:
@@ -29,8 +46,13 @@ class CollectionBuilder:
 
         contents = self.group_tracks(tracks)
 
+        for track in tracks:
+            self.store.add_track(track)
+        for content in contents:
+            if isinstance(content, TrackGroup):
+                self.store.add_track_group(content)
         release = Release(release_id, title=release_data.title, date=release_data.date,
-                          artists=artists, contents=contents)
+                          artists=artists, contents=tuple(content.id for content in contents))
         self.store.add_release(release)
         return release
 
@@ -41,17 +63,18 @@ class CollectionBuilder:
         for work in works:
             self.get_or_add_work(work.work)
         artists = self.brainz_source.get_recording_artists(recording_data.id)
+        for relation in artists:
+            self.get_or_add_artist(relation.artist)
         track = Track(id=track_data.track_id, recording_id=track_data.recording_id,
                       title=recording_data.title,
                       medium_number=medium_data.position,
                       medium_format=medium_data.format,
                       track_number=track_data.position,
-                      works=[w.work for w in works],
-                      artists=[relation.artist for relation in artists])
-        self.store.add_track(track)
+                      works=tuple(w.work for w in works),
+                      artists=tuple(relation.artist for relation in artists))
         return track
 
-    def group_tracks(self, tracks: list[Track]) -> tuple[TrackId | TrackGroupId, ...]:
+    def group_tracks(self, tracks: list[Track]) -> tuple[Track | TrackGroup, ...]:
         def group_key(t: Track):
             if len(t.works) == 0:
                 return t.id
@@ -60,19 +83,17 @@ class CollectionBuilder:
                 return t.id
             return work.parent.id
 
-        result: list[TrackId | TrackGroupId] = []
+        result: list[Track | TrackGroup] = []
 
         tracks_by_parent_work = itertools.groupby(tracks, key=group_key)
         for key, group in tracks_by_parent_work:
             tracks = list(group)
             if isinstance(key, WorkId):
                 track_group_id = TrackGroupId(tracks[0].id, len(tracks))
-                track_group = TrackGroup(track_group_id, key, [t.id for t in tracks])
-                self.store.add_track_group(track_group)
-                result.append(track_group.id)
+                result.append(TrackGroup(track_group_id, key, tuple(t.id for t in tracks)))
             else:
                 assert len(tracks) == 1
-                result.append(tracks[0].id)
+                result.append(tracks[0])
         return tuple(result)
 
     def get_or_add_artist(self, artist_id: ArtistId) -> Artist:
@@ -81,8 +102,7 @@ class CollectionBuilder:
             return existing
 
         artist_data = self.brainz_source.get_artist_data(artist_id)
-        artist = Artist(id=artist_id, name=artist_data.name, sort_name=artist_data.sort or artist_data.name,
-                        disambiguation=artist_data.disambiguation)
+        artist = Artist.from_musicbrainz(artist_data)
         self.store.add_artist(artist)
         return artist
 
@@ -102,4 +122,81 @@ class CollectionBuilder:
         parent = ParentWork(parents[0].parent_work, parents[0].number) if len(parents) > 0 else None
         work = Work(id=work_id, name=work_data.name, disambiguation=work_data.disambiguation,
                     composers=tuple(composers), parent=parent)
+        self.store.add_work(work)
+        if parent is not None:  # after the work itself, so that cyclic part-of relations end
+            self.get_or_add_work(parent.id)
         return work
+
+
+class ConcurrentCollectionBuilder(CollectionBuilder):
+    """Collection builder that fetches the data of a release in parallel before adding it.
+
+    All recordings, works (with their composers) and artists of a release are looked up by `max_workers`
+    threads; the release is then added by the serial algorithm of `CollectionBuilder`, which finds
+    everything in memory. Hence, the store ends up exactly as with the serial builder.
+
+    The source is wrapped in a `MemoizingDataSource` (unless it is one already), which makes sure that
+    concurrent lookups of the same entity share a single request.
+    """
+
+    def __init__(self, store: CollectionStoreBase, brainz_source: MusicbrainzDataSourceBase, max_workers: int = 8):
+        if not isinstance(brainz_source, MemoizingDataSource):
+            brainz_source = MemoizingDataSource(brainz_source)
+        super().__init__(store, brainz_source)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='builder')
+
+    def close(self):
+        self._executor.shutdown()
+
+    def get_or_add_release(self, release_id: ReleaseId) -> Release:
+        if self.store.get_release(release_id) is None:
+            self.fetch_release(release_id)
+        return super().get_or_add_release(release_id)
+
+    def fetch_release(self, release_id: ReleaseId):
+        """Look up everything needed to add the given release, without modifying the store.
+
+        This is thread-safe, so several releases can be fetched at the same time.
+        """
+        self.brainz_source.prefetch_release(release_id)
+        release_data = self.brainz_source.get_release_data(release_id)
+        fetch_functions = {RecordingId: self._fetch_recording, WorkId: self._fetch_work,
+                           ArtistId: self._fetch_artist}
+        submitted: set[MbId] = set()
+        pending: set[Future[Sequence[MbId]]] = set()
+
+        def submit(mbids: Iterable[MbId]):
+            for mbid in mbids:
+                if mbid not in submitted:
+                    submitted.add(mbid)
+                    pending.add(self._executor.submit(fetch_functions[type(mbid)], mbid))
+
+        submit(release_data.credited_artists)
+        submit(track.recording_id for medium in release_data.media for track in medium.tracks)
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                    submit(future.result())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _fetch_recording(self, recording_id: RecordingId) -> Sequence[MbId]:
+        self.brainz_source.get_recording_data(recording_id)
+        artists = self.brainz_source.get_recording_artists(recording_id)
+        return ([work.work for work in self.brainz_source.get_recorded_work(recording_id)]
+                + [relation.artist for relation in artists])
+
+    def _fetch_work(self, work_id: WorkId) -> Sequence[MbId]:
+        if self.store.get_work(work_id) is not None:
+            return ()
+        self.brainz_source.get_work_data(work_id)
+        parents = self.brainz_source.get_parent_works(work_id)
+        return [*self.brainz_source.get_composers(work_id), *(parent.parent_work for parent in parents[:1])]
+
+    def _fetch_artist(self, artist_id: ArtistId) -> Sequence[MbId]:
+        if self.store.get_artist(artist_id) is None:
+            self.brainz_source.get_artist_data(artist_id)
+        return ()
@@ -0,0 +1,160 @@
+from pathlib import Path
+
+import click
+
+from omg.brainz.api import MusicbrainzApiDataSource, MusicbrainzConfiguration
+from omg.brainz.cache import CachingDataSource
+from omg.brainz.dump import DumpIndex, MusicbrainzDumpDataSource
+from omg.brainz.memo import MemoizingDataSource
+from omg.brainz.model import ReleaseId
+from omg.brainz.source import MusicbrainzDataSourceBase
+from omg.cli import cli
+from omg.collection.builder import CollectionBuilder, ConcurrentCollectionBuilder
+from omg.collection.importer import ReleaseImporter
+from omg.collection.search import CollectionSearchIndex
+from omg.collection.sqlite import SqliteCollectionStore
+from omg.collection.store import CollectionStore
+from omg.files.sqlite import SqliteAudioFileDatabase
+
+
+@cli.group('collection')
+@click.option('--locale', 'locales', multiple=True, default=['en'], show_default=True,
+              help='preferred locale for names of artists and works (can be given several times)')
+@click.option('--cache', type=click.Path(dir_okay=False, path_type=Path),
+              help='SQLite file in which Musicbrainz data is cached between runs')
+@click.option('--offline', is_flag=True, help='only use data from the cache (requires --cache)')
+@click.option('--dump-index', type=click.Path(exists=True, dir_okay=False, path_type=Path),
+              help='use Musicbrainz JSON dumps indexed with "omg brainz index-dump" instead of the web service')
+@click.option('--stats', is_flag=True, help='print request and cache statistics at the end')
+@click.pass_context
+def collection(ctx, locales, cache, offline, dump_index, stats):
+    if offline and cache is None:
+        raise click.UsageError('--offline requires --cache')
+    ctx.obj.update(locales=locales, cache=cache, offline=offline, dump_index=dump_index, stats=stats)
+
+
+def create_source(ctx: click.Context) -> MusicbrainzDataSourceBase:
+    """Create the data source configured by the options of the `collection` group.
+
+    The source is closed, and statistics are printed if requested, when the command finishes.
+    """
+    options = ctx.obj
+    source: MusicbrainzDataSourceBase | None = None
+    if options['dump_index'] is not None:
+        index = DumpIndex(options['dump_index'])
+        source = MusicbrainzDumpDataSource(index, preferred_locales=options['locales'])
+        ctx.call_on_close(index.close)
+        ctx.call_on_close(source.close)
+    elif not options['offline']:
+        source = api_source = MusicbrainzApiDataSource(MusicbrainzConfiguration(),
+                                                       preferred_locales=options['locales'])
+        ctx.call_on_close(api_source.close)
+        if options['stats']:
+            ctx.call_on_close(lambda: click.echo(api_source.stats.summary(), err=True))
+    if options['cache'] is not None:
+        source = caching = CachingDataSource(source, options['cache'], offline=options['offline'])
+        ctx.call_on_close(caching.close)
+    memo = MemoizingDataSource(source)
+    if options['stats']:
+        ctx.call_on_close(lambda: click.echo(f'in-memory lookups: {memo.total_statistics}', err=True))
+    return memo
+
+
+@collection.command('build')
+@click.argument('release_ids', nargs=-1, required=True)
+@click.option('-j', '--jobs', default=8, show_default=True, help='number of parallel lookups (1 to build serially)')
+@click.pass_context
+def build(ctx, release_ids, jobs):
+    """Build a collection of the given releases (Musicbrainz release ids) and list its contents."""
+    store = CollectionStore()
+    if jobs > 1:
+        builder = ConcurrentCollectionBuilder(store, create_source(ctx), max_workers=jobs)
+        ctx.call_on_close(builder.close)
+    else:
+        builder = CollectionBuilder(store, create_source(ctx))
+    for release_id in release_ids:
+        release = builder.get_or_add_release(ReleaseId(release_id))
+        click.echo(f'{release}: {len(release.contents)} items')
+    click.echo(f'{len(store.releases_by_id)} releases, {len(store.tracks_by_id)} tracks, '
+               f'{len(store.works_by_id)} works, {len(store.artists_by_id)} artists')
+
+
+@collection.command('import')
+@click.argument('store_path', metavar='STORE', type=click.Path(dir_okay=False, path_type=Path))
+@click.option('--from-file', 'ids_file', type=click.File(),
+              help='file with one Musicbrainz release id per line ("-" for stdin)')
+@click.option('--from-db', 'tag_db', type=click.Path(exists=True, dir_okay=False),
+              help='tag database (see "omg files") from whose MUSICBRAINZ_ALBUMID tags to import')
+@click.option('-j', '--jobs', default=8, show_default=True, help='number of parallel lookups')
+@click.option('--parallel-releases', default=4, show_default=True,
+              help='number of releases fetched while the previous one is added')
+@click.option('--checkpoint-interval', default=50, show_default=True,
+              help='commit the imported releases to STORE every N releases')
+@click.pass_context
+def import_releases(ctx, store_path, ids_file, tag_db, jobs, parallel_releases, checkpoint_interval):
+    """Add many releases to the collection in the SQLite file STORE (created if it does not exist).
+
+    Imported releases are committed regularly; if the import is interrupted, running it again continues
+    where it stopped.
+    """
+    if (ids_file is None) == (tag_db is None):
+        raise click.UsageError('exactly one of --from-file and --from-db is required')
+    if ids_file is not None:
+        release_ids = (line.strip() for line in ids_file if line.strip() and not line.startswith('#'))
+    else:
+        db = SqliteAudioFileDatabase(tag_db)
+        db.init()
+        release_ids = db.get_tag_values('MUSICBRAINZ_ALBUMID')
+    store = SqliteCollectionStore(store_path)
+    store.init()
+    ctx.call_on_close(store.close)
+    builder = ConcurrentCollectionBuilder(store, create_source(ctx), max_workers=jobs)
+    ctx.call_on_close(builder.close)
+    importer = ReleaseImporter(builder, checkpoint=store.commit,
+                               parallel_releases=parallel_releases, checkpoint_interval=checkpoint_interval,
+                               on_progress=lambda progress: click.echo(progress, err=True))
+    progress = importer.run(ReleaseId(release_id) for release_id in release_ids)
+    for release_id in progress.failed:
+        click.echo(f'failed: {release_id.mbid}')
+
+
+@collection.command('search')
+@click.argument('store_path', metavar='STORE', type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.argument('query')
+@click.option('-n', '--limit', type=click.IntRange(min=1), default=20, show_default=True,
+              help='maximum number of tracks listed')
+@click.pass_context
+def search(ctx, store_path, query, limit):
+    """List the tracks of the collection in the SQLite file STORE that match all words of QUERY.
+
+    Words are matched in the titles of the tracks and releases, the names of the works and their parents,
+    and of the composers and artists (including their aliases). The index is built in memory first, which
+    takes a while for large collections.
+    """
+    store = SqliteCollectionStore(store_path)
+    store.init()
+    ctx.call_on_close(store.close)
+    index = CollectionSearchIndex(store)
+    index.add_store(store)
+    for result in index.search(query, limit=limit):
+        click.echo(f'{result.score:4.1f}  {result.track.title} ({result.track.id.mbid})')
+
+
+@collection.command('update-aliases')
+@click.argument('store_path', metavar='STORE', type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.pass_context
+def update_aliases(ctx, store_path):
+    """Look up the aliases of all artists in the collection in the SQLite file STORE again.
+
+    Artists imported before aliases were stored have none, so they are not found by them.
+    """
+    store = SqliteCollectionStore(store_path)
+    store.init()
+    ctx.call_on_close(store.close)
+    source = create_source(ctx)
+    artist_ids = store.get_artist_ids()
+    for artist_id in artist_ids:
+        artist = store.get_artist(artist_id)
+        aliases = source.get_artist_data(artist_id).aliases
+        store.set_artist_aliases(artist_id, tuple(alias for alias in aliases if alias != artist.name))
+    click.echo(f'updated the aliases of {len(artist_ids)} artists')
@@ -5,26 +5,27 @@ from omg.brainz.model import ArtistId, ArtistData, WorkId, TrackId, RecordingId,
 from omg.util.dates import PartialDate
 
 
-@dataclass
+@dataclass(slots=True)
 class Artist:
     id: ArtistId
     name: str
     sort_name: str
     disambiguation: str | None
+    aliases: Sequence[str] = ()
 
     @staticmethod
     def from_musicbrainz(artist: ArtistData):
         return Artist(id=artist.id, name=artist.name, sort_name=artist.sort or artist.name,
-                      disambiguation=artist.disambiguation)
+                      disambiguation=artist.disambiguation, aliases=artist.aliases)
 
 
-@dataclass
+@dataclass(slots=True)
 class ParentWork:
     id: WorkId
     own_position: int
 
 
-@dataclass
+@dataclass(slots=True)
 class Work:
     id: WorkId
     name: str
@@ -34,27 +35,27 @@ class Work:
     composers: Sequence[ArtistId]
 
 
-@dataclass
+@dataclass(slots=True)
 class Track:
     id: TrackId
     recording_id: RecordingId
     title: str
 
     medium_number: int
-    medium_format: str
+    medium_format: str | None
     track_number: int
 
     works: Sequence[WorkId]
     artists: Sequence[ArtistId]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TrackGroupId:
     first_track: TrackId
     number_of_tracks: int
 
 
-@dataclass
+@dataclass(slots=True)
 class TrackGroup:
     id: TrackGroupId
     work: WorkId
@@ -64,11 +65,11 @@ class TrackGroup:
         return f'Recording of {self.work} ({len(self.tracks)} tracks)'
 
 
-@dataclass
+@dataclass(slots=True)
 class Release:
     id: ReleaseId
     title: str
-    date: PartialDate
+    date: PartialDate | None
     artists: Sequence[ArtistId]
 
     contents: Sequence[TrackId | TrackGroupId]
@@ -0,0 +1,104 @@
+import logging
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from omg.brainz.model import ReleaseId
+from omg.collection.builder import ConcurrentCollectionBuilder
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ImportProgress:
+    imported: int = 0
+    skipped: int = 0
+    """Releases that were already in the store."""
+    failed: list[ReleaseId] = field(default_factory=list)
+    seconds: float = 0
+
+    @property
+    def releases_per_minute(self) -> float:
+        return self.imported / self.seconds * 60 if self.seconds > 0 else 0
+
+    def __str__(self):
+        return (f'{self.imported} releases imported ({self.releases_per_minute:.1f}/min), {self.skipped} skipped, '
+                f'{len(self.failed)} failed')
+
+
+class ReleaseImporter:
+    """Adds many releases to a collection in a pipeline.
+
+    While the releases are added to the store one by one (in input order), the data of the next
+    `parallel_releases` releases is already being fetched. After every `checkpoint_interval` added releases,
+    and at the end (also if interrupted), `checkpoint` is called to persist the store, and `on_progress`
+    gets the current `ImportProgress`.
+
+    Releases already in the store are skipped without any lookup, so an interrupted import can be resumed
+    by running it again on the checkpointed store. Releases whose lookups fail (after the retries of the
+    data source) are logged and skipped. As the builder adds each release in an `atomic` context of the
+    store, a release that fails or is interrupted halfway is removed before the next checkpoint.
+    """
+
+    def __init__(self, builder: ConcurrentCollectionBuilder, checkpoint: Callable[[], None] = lambda: None,
+                 parallel_releases: int = 4, checkpoint_interval: int = 50,
+                 on_progress: Callable[[ImportProgress], None] = lambda progress: None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.builder = builder
+        self.checkpoint = checkpoint
+        self.parallel_releases = parallel_releases
+        self.checkpoint_interval = checkpoint_interval
+        self.on_progress = on_progress
+        self._clock = clock
+
+    def run(self, release_ids: Iterable[ReleaseId]) -> ImportProgress:
+        progress = ImportProgress()
+        start = self._clock()
+        release_ids = _unique(release_ids)
+        with ThreadPoolExecutor(max_workers=self.parallel_releases, thread_name_prefix='importer') as executor:
+            fetching: deque[tuple[ReleaseId, Future]] = deque()
+
+            def fetch_next():
+                for release_id in release_ids:
+                    if self.builder.store.get_release(release_id) is not None:
+                        progress.skipped += 1
+                        continue
+                    fetching.append((release_id, executor.submit(self.builder.fetch_release, release_id)))
+                    if len(fetching) >= self.parallel_releases:
+                        return
+
+            try:
+                fetch_next()
+                while fetching:
+                    release_id, future = fetching.popleft()
+                    fetch_next()
+                    try:
+                        future.result()
+                        self.builder.get_or_add_release(release_id)
+                    except Exception as e:
+                        logger.warning(f'could not import release {release_id.mbid}: {e}')
+                        progress.failed.append(release_id)
+                        continue
+                    progress.imported += 1
+                    if progress.imported % self.checkpoint_interval == 0:
+                        self._checkpoint(progress, start)
+            finally:
+                for _, future in fetching:
+                    future.cancel()
+                self._checkpoint(progress, start)
+        return progress
+
+    def _checkpoint(self, progress: ImportProgress, start: float):
+        self.checkpoint()
+        progress.seconds = self._clock() - start
+        self.on_progress(progress)
+
+
+def _unique(release_ids: Iterable[ReleaseId]) -> Iterator[ReleaseId]:
+    seen = set()
+    for release_id in release_ids:
+        if release_id not in seen:
+            seen.add(release_id)
+            yield release_id
@@ -0,0 +1,375 @@
+"""Keyword search for tracks by any combination of their title, works, composers, artists and release."""
+import array
+import bisect
+import functools
+import heapq
+import itertools
+import re
+import sys
+import unicodedata
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TypeVar
+
+from omg.brainz.model import ReleaseId, ArtistId, TrackId, WorkId, MbId
+from omg.collection.entities import Release, TrackGroup, Work, Track, Artist, TrackGroupId
+from omg.collection.store import CollectionStoreBase
+
+T = TypeVar('T')
+
+FIELD_WEIGHTS = {'work': 3.0, 'composer': 3.0, 'title': 2.0, 'artist': 2.0, 'release': 1.0}
+"""Score of a query word matching a word in the respective field of a track."""
+
+PREFIX_FACTOR = 0.5
+"""Factor applied to the score of a query word that is only a prefix of the matched word."""
+
+_WORD = re.compile(r'\w+')
+_PROBE_COST = 32
+"""Estimated cost of looking up a track in a postings array by bisection, relative to adding a posting to a dict."""
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into words that are case and diacritics insensitive (e.g. 'Dvořák' gives 'dvorak')."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _WORD.findall(stripped.casefold())
+
+
+@dataclass(slots=True)
+class SearchResult:
+    track: Track
+    score: float
+
+
+_Levels = list[tuple[float, list[array.array]]]
+"""Postings matched by a query word, grouped by the score of the word for their tracks, best score first."""
+
+
+class CollectionSearchIndex:
+    """Inverted index of the tracks of a collection by the words of their fields.
+
+    `search` finds tracks matching all words of a query in any of their fields: the track title, the names of
+    the recorded works and their parent works, of their composers (including aliases), of the track and release
+    artists, and the release title. Query words of at least `min_prefix_length` characters also match words
+    they are a prefix of. Results are ranked by the sum of the best `FIELD_WEIGHTS` of each query word.
+
+    Entities are added with `add_*`; use a `SearchIndexingStore` to do so while building the collection, or
+    `add_store` to index a collection built before (``omg collection search`` does so). Like the
+    `CollectionBuilder` does, artists must be added before the works and tracks referring to them, and works
+    before their tracks; parent works and releases may be added after the tracks they contain.
+
+    The postings of a word are the (ordinal numbers of) tracks with the word in a field, sorted and by the weight
+    of the field, so that tracks are ranked without loading them. A query is evaluated on the tracks of its most
+    selective word, best scores and lowest ordinals first, looking up the other words by bisecting their postings
+    (or in a dict, once that is cheaper). A heap keeps the best `limit` results, and evaluation stops as soon as
+    no remaining track can get into them; only the tracks returned are loaded from the store. The words of
+    artists and works are kept (keyed by MBID strings, whose hashes are cached, unlike those of `MbId` objects)
+    to post them to the tracks added later.
+    """
+
+    def __init__(self, store: CollectionStoreBase, min_prefix_length: int = 3):
+        self.store = store
+        self.min_prefix_length = min_prefix_length
+        self._tracks: list[TrackId] = []
+        self._ordinals: dict[str, int] = {}
+        self._postings: dict[str, dict[float, array.array]] = {}  # by field weight
+        self._vocabulary: list[str] = []  # sorted, for prefix lookups
+        self._words: dict[type[MbId], dict[str, tuple[str, ...]]] = {ArtistId: {}, WorkId: {}}
+        self._work_relations: dict[str, tuple[str | None, tuple[str, ...]]] = {}  # parent and composers
+
+    def _add_words(self, entity_id: ArtistId | WorkId, texts: Iterable[str]) -> tuple[str, ...]:
+        words = self._words[type(entity_id)][entity_id.mbid] = _words(texts)
+        return words
+
+    def _post(self, track_id: TrackId, weights: dict[str, float]):
+        ordinal = self._ordinals.get(track_id.mbid)
+        if ordinal is None:
+            return
+        for word, weight in weights.items():
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = {}
+                bisect.insort(self._vocabulary, word)
+            tracks = postings.get(weight)
+            if tracks is None:
+                tracks = postings[weight] = array.array('I')
+            if len(tracks) == 0 or tracks[-1] < ordinal:
+                tracks.append(ordinal)
+            else:  # a parent work or release of tracks added before
+                index = bisect.bisect_left(tracks, ordinal)
+                if index == len(tracks) or tracks[index] != ordinal:
+                    tracks.insert(index, ordinal)
+
+    def _artist_words(self, artists: Iterable[str]) -> Iterator[str]:
+        artist_words = self._words[ArtistId]
+        for artist in artists:
+            yield from artist_words.get(artist, ())
+
+    def _weigh_work(self, weights: dict[str, float], work: str):
+        work_words = self._words[WorkId]
+        _weigh(weights, work_words.get(work, ()), FIELD_WEIGHTS['work'])
+        parent, composers = self._work_relations.get(work, (None, ()))
+        if parent is not None:
+            _weigh(weights, work_words.get(parent, ()), FIELD_WEIGHTS['work'])
+        _weigh(weights, self._artist_words(composers), FIELD_WEIGHTS['composer'])
+
+    def add_artist(self, artist: Artist):
+        self._add_words(artist.id, [artist.name, artist.sort_name, *artist.aliases])
+
+    def add_work(self, work: Work):
+        words = self._add_words(work.id, [work.name])
+        self._work_relations[work.id.mbid] = (None if work.parent is None else work.parent.id.mbid,
+                                              tuple(composer.mbid for composer in work.composers))
+        if len(self._tracks) == 0:
+            return
+        # tracks of parts added before this parent work
+        weights = dict.fromkeys(words, FIELD_WEIGHTS['work'])
+        for child in self.store.get_child_works(work.id):
+            for track in self.store.get_tracks_of_work(child.id):
+                self._post(track.id, weights)
+
+    def add_track(self, track: Track):
+        self._ordinals[track.id.mbid] = len(self._tracks)
+        self._tracks.append(track.id)
+        weights = {}
+        _weigh(weights, _words([track.title]), FIELD_WEIGHTS['title'])
+        _weigh(weights, self._artist_words(artist.mbid for artist in track.artists), FIELD_WEIGHTS['artist'])
+        for work in track.works:
+            self._weigh_work(weights, work.mbid)
+        self._post(track.id, weights)
+
+    def add_release(self, release: Release):
+        weights = {}
+        _weigh(weights, _words([release.title]), FIELD_WEIGHTS['release'])
+        _weigh(weights, self._artist_words(artist.mbid for artist in release.artists), FIELD_WEIGHTS['artist'])
+        for track in self._release_tracks(release):
+            self._post(track, weights)
+
+    def add_store(self, store: CollectionStoreBase):
+        """Add all entities of a store (usually `store`, e.g. to index a collection built before)."""
+        for artist in store.iter_artists():
+            self.add_artist(artist)
+        for work in store.iter_works():
+            self.add_work(work)
+        for track in store.iter_tracks():
+            self.add_track(track)
+        for release in store.iter_releases():
+            self.add_release(release)
+
+    def _release_tracks(self, release: Release) -> Iterator[TrackId]:
+        for content in release.contents:
+            if isinstance(content, TrackGroupId):
+                yield from self.store.get_track_group(content).tracks
+            else:
+                yield content
+
+    def _matching_words(self, word: str) -> list[str]:
+        """The indexed words matched by a query word: itself and, if long enough, the words it is a prefix of."""
+        if len(word) < self.min_prefix_length:
+            return [word] if word in self._postings else []
+        result = []
+        for index in range(bisect.bisect_left(self._vocabulary, word), len(self._vocabulary)):
+            other = self._vocabulary[index]
+            if not other.startswith(word):
+                break
+            result.append(other)
+        return result
+
+    def _levels(self, word: str) -> _Levels:
+        levels: dict[float, list[array.array]] = {}
+        for match in self._matching_words(word):
+            factor = 1.0 if match == word else PREFIX_FACTOR
+            for weight, tracks in self._postings[match].items():
+                levels.setdefault(weight * factor, []).append(tracks)
+        return sorted(levels.items(), key=lambda level: level[0], reverse=True)
+
+    def search(self, query: str, limit: int | None = 20) -> list[SearchResult]:
+        """Find the tracks matching all words of `query`, best matches first (in the order they were added among
+        equally good ones)."""
+        terms = sorted((self._levels(word) for word in dict.fromkeys(tokenize(query))), key=_size)
+        if limit is None:
+            limit = len(self._tracks)
+        if len(terms) == 0 or len(terms[0]) == 0 or limit == 0:
+            return []
+        first, others = terms[0], [_WordScores(term) for term in terms[1:]]
+        # upper bounds of the score of the other words from each one on
+        bounds = list(itertools.accumulate(reversed([word.bound for word in others]), initial=0))[::-1]
+        best: list[tuple[float, int]] = []  # heap of (score, -ordinal), the worst result at the top
+        seen = set()  # tracks of better levels
+        for score, postings in first:
+            bound = score + bounds[0]
+            if len(best) == limit and (bound, 0) <= best[0]:
+                break  # neither this nor any later level gets into the results
+            ordinals = postings[0] if len(postings) == 1 else sorted(set().union(*postings))
+            # in chunks of growing size, to stop early but filter by the words collected in dicts in bulk
+            start, step = 0, limit
+            while start < len(ordinals) and not (len(best) == limit and (bound, -ordinals[start]) <= best[0]):
+                chunk = ordinals[start:start + step]
+                start, step = start + step, 2 * step
+                candidates = itertools.filterfalse(seen.__contains__, chunk)
+                for word in others:
+                    if word.scores is not None:
+                        candidates = filter(word.scores.__contains__, candidates)
+                candidates = list(candidates)
+                if len(first) > 1:
+                    seen.update(chunk)
+                for ordinal in candidates:
+                    if len(best) == limit and (bound, -ordinal) <= best[0]:
+                        break  # nor does any later track of this level
+                    total = score
+                    for word, rest in zip(others, bounds[1:]):
+                        word_score = word.score(ordinal)
+                        if word_score is None:
+                            break
+                        total += word_score
+                        if len(best) == limit and (total + rest, -ordinal) <= best[0]:
+                            break
+                    else:
+                        if len(best) < limit:
+                            heapq.heappush(best, (total, -ordinal))
+                        else:
+                            heapq.heapreplace(best, (total, -ordinal))
+        return [SearchResult(self.store.get_track(self._tracks[-negative_ordinal]), score)
+                for score, negative_ordinal in sorted(best, reverse=True)]
+
+
+def _words(texts: Iterable[str]) -> tuple[str, ...]:
+    return tuple(dict.fromkeys(sys.intern(word) for text in texts for word in tokenize(text)))
+
+
+def _weigh(weights: dict[str, float], words: Iterable[str], weight: float):
+    """Update the weights of the words in `weights` to at least `weight`."""
+    for word in words:
+        if weights.get(word, 0) < weight:
+            weights[word] = weight
+
+
+def _size(levels: _Levels) -> int:
+    return sum(len(tracks) for _, postings in levels for tracks in postings)
+
+
+class _WordScores:
+    """Scores of a query word for tracks, looked up in its postings by bisection, until doing so has become as
+    expensive as collecting them in a dict, which is done then."""
+
+    def __init__(self, levels: _Levels):
+        self.levels = levels
+        self.bound = levels[0][0] if len(levels) > 0 else 0
+        self._lookups = _size(levels) // (_PROBE_COST * sum(len(postings) for _, postings in levels) or 1)
+        self.scores: dict[int, float] | None = None
+
+    def score(self, ordinal: int) -> float | None:
+        """The score of the word for a track, or None if it does not match it."""
+        if self.scores is not None:
+            return self.scores.get(ordinal)
+        if self._lookups == 0:
+            self.scores = {}
+            for score, postings in reversed(self.levels):  # better scores overwrite worse ones
+                self.scores.update(dict.fromkeys(itertools.chain.from_iterable(postings), score))
+            return self.scores.get(ordinal)
+        self._lookups -= 1
+        for score, postings in self.levels:
+            for tracks in postings:
+                index = bisect.bisect_left(tracks, ordinal)
+                if index < len(tracks) and tracks[index] == ordinal:
+                    return score
+        return None
+
+
+class SearchIndexingStore(CollectionStoreBase):
+    """Store decorator that adds all entities added to the wrapped store to a `CollectionSearchIndex`.
+
+    Entities added in an `atomic` context are indexed only when it is left successfully.
+    """
+
+    def __init__(self, store: CollectionStoreBase, index: CollectionSearchIndex | None = None):
+        self.store = store
+        self.index = index or CollectionSearchIndex(store)
+        self._pending: list[Callable[[], None]] | None = None  # indexing deferred in an atomic context
+
+    def _index(self, add: Callable[[T], None], entity: T):
+        if self._pending is None:
+            add(entity)
+        else:
+            self._pending.append(functools.partial(add, entity))
+
+    @contextmanager
+    def atomic(self) -> Iterator[None]:
+        if self._pending is not None:
+            raise RuntimeError('atomic contexts cannot be nested')
+        with self.store.atomic():
+            self._pending = []
+            try:
+                yield
+            finally:
+                pending, self._pending = self._pending, None
+        for add in pending:
+            add()
+
+    def get_release(self, release_id: ReleaseId) -> Release | None:
+        return self.store.get_release(release_id)
+
+    def add_release(self, release: Release):
+        self.store.add_release(release)
+        self._index(self.index.add_release, release)
+
+    def get_artist(self, artist_id: ArtistId) -> Artist | None:
+        return self.store.get_artist(artist_id)
+
+    def add_artist(self, artist: Artist):
+        self.store.add_artist(artist)
+        self._index(self.index.add_artist, artist)
+
+    def get_track(self, track_id: TrackId) -> Track | None:
+        return self.store.get_track(track_id)
+
+    def add_track(self, track: Track):
+        self.store.add_track(track)
+        self._index(self.index.add_track, track)
+
+    def get_work(self, work_id: WorkId) -> Work | None:
+        return self.store.get_work(work_id)
+
+    def add_work(self, work: Work):
+        self.store.add_work(work)
+        self._index(self.index.add_work, work)
+
+    def get_track_group(self, track_group_id: TrackGroupId) -> TrackGroup | None:
+        return self.store.get_track_group(track_group_id)
+
+    def add_track_group(self, track_group: TrackGroup):
+        self.store.add_track_group(track_group)
+
+    def get_works_by_composer(self, composer: ArtistId) -> Sequence[Work]:
+        return self.store.get_works_by_composer(composer)
+
+    def get_child_works(self, work_id: WorkId) -> Sequence[Work]:
+        return self.store.get_child_works(work_id)
+
+    def get_tracks_of_work(self, work_id: WorkId) -> Sequence[Track]:
+        return self.store.get_tracks_of_work(work_id)
+
+    def get_track_groups_of_work(self, work_id: WorkId) -> Sequence[TrackGroup]:
+        return self.store.get_track_groups_of_work(work_id)
+
+    def get_tracks_by_artist(self, artist_id: ArtistId) -> Sequence[Track]:
+        return self.store.get_tracks_by_artist(artist_id)
+
+    def get_releases_by_artist(self, artist_id: ArtistId) -> Sequence[Release]:
+        return self.store.get_releases_by_artist(artist_id)
+
+    def iter_releases(self) -> Iterator[Release]:
+        return self.store.iter_releases()
+
+    def iter_artists(self) -> Iterator[Artist]:
+        return self.store.iter_artists()
+
+    def iter_tracks(self) -> Iterator[Track]:
+        return self.store.iter_tracks()
+
+    def iter_works(self) -> Iterator[Work]:
+        return self.store.iter_works()
+
+    def commit(self):
+        self.store.commit()
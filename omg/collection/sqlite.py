@@ -0,0 +1,421 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable, Iterator, Sequence
+from contextlib import contextmanager
+from typing import TypeVar
+
+from omg.brainz.model import ReleaseId, ArtistId, TrackId, WorkId, RecordingId
+from omg.collection.entities import Release, TrackGroup, Work, Track, Artist, TrackGroupId, ParentWork
+from omg.collection.store import CollectionStoreBase
+from omg.util.dates import PartialDate
+
+T = TypeVar('T')
+
+
+def _create_tables(conn: sqlite3.Connection):
+    conn.execute('''CREATE TABLE artists(
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        sort_name TEXT NOT NULL,
+        disambiguation TEXT
+        ) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE works(
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        disambiguation TEXT,
+        parent TEXT,
+        parent_position INTEGER
+        ) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE work_composers(
+        work TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        composer TEXT NOT NULL,
+        PRIMARY KEY (work, position)
+        ) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE tracks(
+        id TEXT PRIMARY KEY,
+        recording TEXT NOT NULL,
+        title TEXT NOT NULL,
+        medium_number INTEGER NOT NULL,
+        medium_format TEXT,
+        track_number INTEGER NOT NULL
+        ) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE track_works(
+        track TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        work TEXT NOT NULL,
+        PRIMARY KEY (track, position)
+        ) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE track_artists(
+        track TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        artist TEXT NOT NULL,
+        PRIMARY KEY (track, position)
+        ) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE track_groups(
+        first_track TEXT NOT NULL,
+        number_of_tracks INTEGER NOT NULL,
+        work TEXT NOT NULL,
+        PRIMARY KEY (first_track, number_of_tracks)
+        ) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE track_group_tracks(
+        first_track TEXT NOT NULL,
+        number_of_tracks INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        track TEXT NOT NULL,
+        PRIMARY KEY (first_track, number_of_tracks, position)
+        ) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE releases(
+        id TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        date TEXT
+        ) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE release_artists(
+        release TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        artist TEXT NOT NULL,
+        PRIMARY KEY (release, position)
+        ) WITHOUT ROWID''')
+    # number_of_tracks is NULL for a single track, otherwise the content is the track group starting at track
+    conn.execute('''CREATE TABLE release_contents(
+        release TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        track TEXT NOT NULL,
+        number_of_tracks INTEGER,
+        PRIMARY KEY (release, position)
+        ) WITHOUT ROWID''')
+
+
+def _add_browse_indexes(conn: sqlite3.Connection):
+    conn.execute('CREATE INDEX work_composers_composer ON work_composers (composer)')
+    conn.execute('CREATE INDEX works_parent ON works (parent, parent_position) WHERE parent IS NOT NULL')
+    conn.execute('CREATE INDEX track_works_work ON track_works (work)')
+    conn.execute('CREATE INDEX track_groups_work ON track_groups (work)')
+    conn.execute('CREATE INDEX track_artists_artist ON track_artists (artist)')
+    conn.execute('CREATE INDEX release_artists_artist ON release_artists (artist)')
+
+
+def _add_artist_aliases(conn: sqlite3.Connection):
+    """Only creates the table: artists added before have no aliases until `set_artist_aliases` is called for them
+    (``omg collection update-aliases`` does so for all artists)."""
+    conn.execute('''CREATE TABLE artist_aliases(
+        artist TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        alias TEXT NOT NULL,
+        PRIMARY KEY (artist, position)
+        ) WITHOUT ROWID''')
+
+
+# _MIGRATIONS[i] migrates the schema from version i to version i + 1
+_MIGRATIONS = (_create_tables, _add_browse_indexes, _add_artist_aliases)
+
+
+class SqliteCollectionStore(CollectionStoreBase):
+    """Collection store in an SQLite file.
+
+    Entities are loaded from the database when requested, and the `cache_size` most recently used
+    entities of each type are kept in memory.
+
+    Added entities are written in batched transactions, which are committed after adding a release (or, if
+    it is added in an `atomic` context like `CollectionBuilder` does, after leaving the context) once they
+    contain at least `batch_size` entities; call `commit` (or `close`) to write the rest. An `atomic` context
+    is a savepoint, which is rolled back if the context is left by an exception, so that no part of a
+    release is persisted without the release itself. The store may be used from several threads; an
+    `atomic` context holds the store's lock until it is left.
+    """
+
+    def __init__(self, db_path: os.PathLike | str, cache_size: int = 10_000, batch_size: int = 1000):
+        if batch_size < 1:
+            raise ValueError(f'batch size must be positive, got {batch_size}')
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self._connection = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.RLock()
+        self._caches: dict[str, OrderedDict[Hashable, object]] = {
+            table: OrderedDict() for table in ('releases', 'artists', 'tracks', 'works', 'track_groups')}
+        self._uncommitted = 0
+        self._atomic_additions: list[tuple[str, Hashable]] | None = None  # while in an atomic context
+
+    def init(self):
+        """Create the database schema or migrate it to the current version."""
+        conn = self._connection
+        version, = conn.execute('PRAGMA user_version').fetchone()
+        if version > len(_MIGRATIONS):
+            raise ValueError(f'database schema version {version} is newer than supported ({len(_MIGRATIONS)})')
+        for new_version, migrate in enumerate(_MIGRATIONS[version:], start=version + 1):
+            conn.execute('BEGIN')
+            try:
+                migrate(conn)
+                conn.execute(f'PRAGMA user_version = {new_version}')
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def commit(self):
+        with self._lock:
+            if self._connection.in_transaction:
+                self._connection.execute('COMMIT')
+                self._uncommitted = 0
+
+    def _commit_batch(self):
+        if self._uncommitted >= self.batch_size:
+            self.commit()
+
+    @contextmanager
+    def atomic(self) -> Iterator[None]:
+        with self._lock:
+            if self._atomic_additions is not None:
+                raise RuntimeError('atomic contexts cannot be nested')
+            if not self._connection.in_transaction:
+                self._connection.execute('BEGIN')
+            self._connection.execute('SAVEPOINT atomic')
+            self._atomic_additions = []
+            uncommitted = self._uncommitted
+            try:
+                yield
+            except BaseException:
+                self._connection.execute('ROLLBACK TO atomic')
+                self._connection.execute('RELEASE atomic')
+                for table, key in self._atomic_additions:
+                    self._caches[table].pop(key, None)
+                self._uncommitted = uncommitted
+                raise
+            else:
+                self._connection.execute('RELEASE atomic')
+            finally:
+                self._atomic_additions = None
+            self._commit_batch()
+
+    def close(self):
+        self.commit()
+        self._connection.close()
+
+    def _get(self, table: str, key: Hashable, load: Callable[[Hashable], T | None]) -> T | None:
+        with self._lock:
+            cache = self._caches[table]
+            entity = cache.get(key)
+            if entity is not None:
+                cache.move_to_end(key)
+                return entity
+            entity = load(key)
+            if entity is not None:
+                self._remember(table, key, entity)
+            return entity
+
+    def _remember(self, table: str, key: Hashable, entity: object):
+        cache = self._caches[table]
+        cache[key] = entity
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def _add(self, table: str, key: Hashable, entity: object, row: tuple, description: str,
+             sequences: Iterable[tuple[str, Iterable[tuple]]] = ()):
+        """Insert an entity's row and the rows of its sequences (table and rows, each starting with the key)."""
+        with self._lock:
+            if not self._connection.in_transaction:
+                self._connection.execute('BEGIN')
+            try:
+                self._connection.execute(f'INSERT INTO {table} VALUES ({", ".join("?" * len(row))})', row)
+            except sqlite3.IntegrityError:
+                raise ValueError(f'{description} already in store') from None
+            for sequence_table, rows in sequences:
+                rows = list(rows)
+                if len(rows) > 0:
+                    self._connection.executemany(
+                        f'INSERT INTO {sequence_table} VALUES ({", ".join("?" * len(rows[0]))})', rows)
+            self._remember(table, key, entity)
+            self._uncommitted += 1
+            if self._atomic_additions is not None:
+                self._atomic_additions.append((table, key))
+
+    def _select_sequence(self, table: str, column: str, condition: str, parameters: tuple) -> list:
+        return [value for value, in self._connection.execute(
+            f'SELECT {column} FROM {table} WHERE {condition} ORDER BY position', parameters)]
+
+    def get_release(self, release_id: ReleaseId) -> Release | None:
+        return self._get('releases', release_id, self._load_release)
+
+    def _load_release(self, release_id: ReleaseId) -> Release | None:
+        row = self._connection.execute('SELECT title, date FROM releases WHERE id = ?', (release_id.mbid,)).fetchone()
+        if row is None:
+            return None
+        title, date = row
+        artists = self._select_sequence('release_artists', 'artist', 'release = ?', (release_id.mbid,))
+        contents = self._connection.execute(
+            'SELECT track, number_of_tracks FROM release_contents WHERE release = ? ORDER BY position',
+            (release_id.mbid,))
+        return Release(release_id, title=title, date=None if date is None else PartialDate.parse(date),
+                       artists=tuple(ArtistId(artist) for artist in artists),
+                       contents=tuple(TrackId(track) if number_of_tracks is None
+                                      else TrackGroupId(TrackId(track), number_of_tracks)
+                                      for track, number_of_tracks in contents))
+
+    def add_release(self, release: Release):
+        mbid = release.id.mbid
+        contents = ((mbid, position, content.mbid, None) if isinstance(content, TrackId)
+                    else (mbid, position, content.first_track.mbid, content.number_of_tracks)
+                    for position, content in enumerate(release.contents))
+        self._add('releases', release.id, release,
+                  (mbid, release.title, None if release.date is None else str(release.date)),
+                  f'release {release.id} ({release.title})',
+                  [('release_artists', ((mbid, i, artist.mbid) for i, artist in enumerate(release.artists))),
+                   ('release_contents', contents)])
+        if self._atomic_additions is None:
+            self._commit_batch()
+
+    def get_artist(self, artist_id: ArtistId) -> Artist | None:
+        return self._get('artists', artist_id, self._load_artist)
+
+    def _load_artist(self, artist_id: ArtistId) -> Artist | None:
+        row = self._connection.execute('SELECT name, sort_name, disambiguation FROM artists WHERE id = ?',
+                                       (artist_id.mbid,)).fetchone()
+        if row is None:
+            return None
+        aliases = self._select_sequence('artist_aliases', 'alias', 'artist = ?', (artist_id.mbid,))
+        return Artist(artist_id, *row, aliases=tuple(aliases))
+
+    def add_artist(self, artist: Artist):
+        self._add('artists', artist.id, artist,
+                  (artist.id.mbid, artist.name, artist.sort_name, artist.disambiguation),
+                  f'artist {artist.id} ({artist.name})',
+                  [('artist_aliases', ((artist.id.mbid, i, alias) for i, alias in enumerate(artist.aliases)))])
+
+    def get_artist_ids(self) -> list[ArtistId]:
+        with self._lock:
+            return [ArtistId(mbid) for mbid, in self._connection.execute('SELECT id FROM artists')]
+
+    def set_artist_aliases(self, artist_id: ArtistId, aliases: Sequence[str]):
+        """Replace the aliases of an artist in the store."""
+        with self._lock:
+            if self._connection.execute('SELECT 1 FROM artists WHERE id = ?', (artist_id.mbid,)).fetchone() is None:
+                raise ValueError(f'artist {artist_id} not in store')
+            if not self._connection.in_transaction:
+                self._connection.execute('BEGIN')
+            self._connection.execute('DELETE FROM artist_aliases WHERE artist = ?', (artist_id.mbid,))
+            self._connection.executemany('INSERT INTO artist_aliases VALUES (?, ?, ?)',
+                                         [(artist_id.mbid, i, alias) for i, alias in enumerate(aliases)])
+            self._caches['artists'].pop(artist_id, None)
+            self._uncommitted += 1
+            if self._atomic_additions is None:
+                self._commit_batch()
+
+    def get_track(self, track_id: TrackId) -> Track | None:
+        return self._get('tracks', track_id, self._load_track)
+
+    def _load_track(self, track_id: TrackId) -> Track | None:
+        row = self._connection.execute(
+            'SELECT recording, title, medium_number, medium_format, track_number FROM tracks WHERE id = ?',
+            (track_id.mbid,)).fetchone()
+        if row is None:
+            return None
+        recording, title, medium_number, medium_format, track_number = row
+        works = self._select_sequence('track_works', 'work', 'track = ?', (track_id.mbid,))
+        artists = self._select_sequence('track_artists', 'artist', 'track = ?', (track_id.mbid,))
+        return Track(track_id, RecordingId(recording), title, medium_number=medium_number,
+                     medium_format=medium_format, track_number=track_number,
+                     works=tuple(WorkId(work) for work in works), artists=tuple(ArtistId(a) for a in artists))
+
+    def add_track(self, track: Track):
+        mbid = track.id.mbid
+        self._add('tracks', track.id, track,
+                  (mbid, track.recording_id.mbid, track.title, track.medium_number, track.medium_format,
+                   track.track_number),
+                  f'track {track.id} ({track.title})',
+                  [('track_works', ((mbid, i, work.mbid) for i, work in enumerate(track.works))),
+                   ('track_artists', ((mbid, i, artist.mbid) for i, artist in enumerate(track.artists)))])
+
+    def get_work(self, work_id: WorkId) -> Work | None:
+        return self._get('works', work_id, self._load_work)
+
+    def _load_work(self, work_id: WorkId) -> Work | None:
+        row = self._connection.execute('SELECT name, disambiguation, parent, parent_position FROM works WHERE id = ?',
+                                       (work_id.mbid,)).fetchone()
+        if row is None:
+            return None
+        name, disambiguation, parent, parent_position = row
+        composers = self._select_sequence('work_composers', 'composer', 'work = ?', (work_id.mbid,))
+        return Work(work_id, name, disambiguation,
+                    parent=None if parent is None else ParentWork(WorkId(parent), parent_position),
+                    composers=tuple(ArtistId(composer) for composer in composers))
+
+    def add_work(self, work: Work):
+        mbid = work.id.mbid
+        parent = (None, None) if work.parent is None else (work.parent.id.mbid, work.parent.own_position)
+        self._add('works', work.id, work, (mbid, work.name, work.disambiguation, *parent),
+                  f'work {work.id} ({work.name})',
+                  [('work_composers', ((mbid, i, composer.mbid) for i, composer in enumerate(work.composers)))])
+
+    def get_track_group(self, track_group_id: TrackGroupId) -> TrackGroup | None:
+        return self._get('track_groups', track_group_id, self._load_track_group)
+
+    def _load_track_group(self, track_group_id: TrackGroupId) -> TrackGroup | None:
+        key = (track_group_id.first_track.mbid, track_group_id.number_of_tracks)
+        row = self._connection.execute(
+            'SELECT work FROM track_groups WHERE first_track = ? AND number_of_tracks = ?', key).fetchone()
+        if row is None:
+            return None
+        tracks = self._select_sequence('track_group_tracks', 'track', 'first_track = ? AND number_of_tracks = ?',
+                                       key)
+        return TrackGroup(track_group_id, WorkId(row[0]), tuple(TrackId(track) for track in tracks))
+
+    def add_track_group(self, track_group: TrackGroup):
+        key = (track_group.id.first_track.mbid, track_group.id.number_of_tracks)
+        self._add('track_groups', track_group.id, track_group, (*key, track_group.work.mbid),
+                  f'track group {track_group}',
+                  [('track_group_tracks', ((*key, i, track.mbid) for i, track in enumerate(track_group.tracks)))])
+
+    def _find(self, query: str, parameters: tuple, get: Callable[..., T | None], create_id: Callable[..., Hashable]
+              ) -> list[T]:
+        """Get the entities whose ids (as expected by `create_id`) are the result rows of `query`."""
+        with self._lock:
+            ids = [create_id(*row) for row in self._connection.execute(query, parameters)]
+            return [get(entity_id) for entity_id in ids]
+
+    def get_works_by_composer(self, composer: ArtistId) -> Sequence[Work]:
+        return self._find('SELECT DISTINCT work FROM work_composers WHERE composer = ?', (composer.mbid,),
+                          self.get_work, WorkId)
+
+    def get_child_works(self, work_id: WorkId) -> Sequence[Work]:
+        return self._find('SELECT id FROM works WHERE parent = ? ORDER BY parent_position', (work_id.mbid,),
+                          self.get_work, WorkId)
+
+    def get_tracks_of_work(self, work_id: WorkId) -> Sequence[Track]:
+        return self._find('SELECT DISTINCT track FROM track_works WHERE work = ?', (work_id.mbid,),
+                          self.get_track, TrackId)
+
+    def get_track_groups_of_work(self, work_id: WorkId) -> Sequence[TrackGroup]:
+        return self._find('SELECT first_track, number_of_tracks FROM track_groups WHERE work = ?', (work_id.mbid,),
+                          self.get_track_group, lambda track, n: TrackGroupId(TrackId(track), n))
+
+    def get_tracks_by_artist(self, artist_id: ArtistId) -> Sequence[Track]:
+        return self._find('SELECT DISTINCT track FROM track_artists WHERE artist = ?', (artist_id.mbid,),
+                          self.get_track, TrackId)
+
+    def get_releases_by_artist(self, artist_id: ArtistId) -> Sequence[Release]:
+        return self._find('SELECT DISTINCT release FROM release_artists WHERE artist = ?', (artist_id.mbid,),
+                          self.get_release, ReleaseId)
+
+    def _iter(self, table: str, load: Callable[..., T | None], create_id: Callable[..., Hashable]) -> Iterator[T]:
+        """Load all entities of a table, bypassing (and not evicting the contents of) the cache."""
+        with self._lock:
+            ids = [create_id(mbid) for mbid, in self._connection.execute(f'SELECT id FROM {table}')]
+        for entity_id in ids:
+            with self._lock:
+                entity = load(entity_id)
+            yield entity
+
+    def iter_releases(self) -> Iterator[Release]:
+        return self._iter('releases', self._load_release, ReleaseId)
+
+    def iter_artists(self) -> Iterator[Artist]:
+        return self._iter('artists', self._load_artist, ArtistId)
+
+    def iter_tracks(self) -> Iterator[Track]:
+        return self._iter('tracks', self._load_track, TrackId)
+
+    def iter_works(self) -> Iterator[Work]:
+        return self._iter('works', self._load_work, WorkId)
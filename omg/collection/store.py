@@ -1,8 +1,126 @@
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Hashable, Iterable, Iterator, Sequence
+from contextlib import contextmanager
+
 from omg.brainz.model import ReleaseId, ArtistId, TrackId, WorkId
 from omg.collection.entities import Release, TrackGroup, Work, Track, Artist, TrackGroupId
 
 
-class CollectionStore:
+class CollectionStoreBase(ABC):
+    """Storage of the entities of a collection.
+
+    The `add_*` methods raise a `ValueError` if an entity with the same id is already stored.
+
+    Besides lookups by id, stores maintain indexes for browsing the collection, e.g. the works of a
+    composer; these queries take time proportional to the size of their result. Unless noted otherwise,
+    their results are in no particular order. The `iter_*` methods list all entities of a type; the
+    store must not be modified while iterating.
+    """
+
+    @abstractmethod
+    def get_release(self, release_id: ReleaseId) -> Release | None:
+        pass
+
+    @abstractmethod
+    def add_release(self, release: Release):
+        pass
+
+    @abstractmethod
+    def get_artist(self, artist_id: ArtistId) -> Artist | None:
+        pass
+
+    @abstractmethod
+    def add_artist(self, artist: Artist):
+        pass
+
+    @abstractmethod
+    def get_track(self, track_id: TrackId) -> Track | None:
+        pass
+
+    @abstractmethod
+    def add_track(self, track: Track):
+        pass
+
+    @abstractmethod
+    def get_work(self, work_id: WorkId) -> Work | None:
+        pass
+
+    @abstractmethod
+    def add_work(self, work: Work):
+        pass
+
+    @abstractmethod
+    def get_track_group(self, track_group_id: TrackGroupId) -> TrackGroup | None:
+        pass
+
+    @abstractmethod
+    def add_track_group(self, track_group: TrackGroup):
+        pass
+
+    @abstractmethod
+    def get_works_by_composer(self, composer: ArtistId) -> Sequence[Work]:
+        pass
+
+    @abstractmethod
+    def get_child_works(self, work_id: WorkId) -> Sequence[Work]:
+        """Get the works that are part of the given work, ordered by their position in it."""
+        pass
+
+    @abstractmethod
+    def get_tracks_of_work(self, work_id: WorkId) -> Sequence[Track]:
+        """Get the tracks recording the given work (e.g. a movement)."""
+        pass
+
+    @abstractmethod
+    def get_track_groups_of_work(self, work_id: WorkId) -> Sequence[TrackGroup]:
+        """Get the track groups recording the given work (whose tracks record its parts)."""
+        pass
+
+    @abstractmethod
+    def get_tracks_by_artist(self, artist_id: ArtistId) -> Sequence[Track]:
+        pass
+
+    @abstractmethod
+    def get_releases_by_artist(self, artist_id: ArtistId) -> Sequence[Release]:
+        pass
+
+    @abstractmethod
+    def iter_releases(self) -> Iterator[Release]:
+        pass
+
+    @abstractmethod
+    def iter_artists(self) -> Iterator[Artist]:
+        pass
+
+    @abstractmethod
+    def iter_tracks(self) -> Iterator[Track]:
+        pass
+
+    @abstractmethod
+    def iter_works(self) -> Iterator[Work]:
+        pass
+
+    def commit(self):
+        """Make sure that everything added so far is persisted (if the store is persistent at all)."""
+        pass
+
+    @contextmanager
+    def atomic(self) -> Iterator[None]:
+        """Context in which entities are added all or nothing (if the store supports it).
+
+        If an exception (including `KeyboardInterrupt`) leaves the context, all entities added in it are
+        removed again, and none of them is persisted by a later `commit`. Contexts cannot be nested.
+        """
+        yield
+
+
+class CollectionStore(CollectionStoreBase):
+    """In-memory collection store.
+
+    In an `atomic` context, every addition is recorded in an undo log, which is replayed backwards if the
+    context is left by an exception.
+    """
+
     def __init__(self):
         self.releases_by_id: dict[ReleaseId, Release] = {}
         self.artists_by_id: dict[ArtistId, Artist] = {}
@@ -10,26 +128,58 @@ class CollectionStore:
         self.track_groups_by_id: dict[TrackGroupId, TrackGroup] = {}
         self.works_by_id: dict[WorkId, Work] = {}
 
+        self.works_by_composer: dict[ArtistId, list[WorkId]] = {}
+        self.child_works: dict[WorkId, list[WorkId]] = {}
+        self.tracks_by_work: dict[WorkId, list[TrackId]] = {}
+        self.track_groups_by_work: dict[WorkId, list[TrackGroupId]] = {}
+        self.tracks_by_artist: dict[ArtistId, list[TrackId]] = {}
+        self.releases_by_artist: dict[ArtistId, list[ReleaseId]] = {}
+
+        self._undo_log: list[Callable[[], None]] | None = None  # while in an atomic context
+
+    @contextmanager
+    def atomic(self) -> Iterator[None]:
+        if self._undo_log is not None:
+            raise RuntimeError('atomic contexts cannot be nested')
+        self._undo_log = []
+        try:
+            yield
+        except BaseException:
+            for undo in reversed(self._undo_log):
+                undo()
+            raise
+        finally:
+            self._undo_log = None
+
+    def _add(self, entities: dict, entity_id: Hashable, entity: object, description: str,
+             indexes: Iterable[tuple[dict[Hashable, list], Iterable[Hashable]]] = ()):
+        """Store an entity and add its id to the given indexes (with the keys to add it under)."""
+        if entity_id in entities:
+            raise ValueError(f'{description} already in store')
+        entities[entity_id] = entity
+        indexes = [(index, tuple(dict.fromkeys(keys))) for index, keys in indexes]
+        for index, keys in indexes:
+            for key in keys:
+                index.setdefault(key, []).append(entity_id)
+        if self._undo_log is not None:
+            self._undo_log.append(lambda: _remove(entities, entity_id, indexes))
+
     def get_release(self, release_id: ReleaseId) -> Release | None:
         return self.releases_by_id.get(release_id)
 
     def add_release(self, release: Release):
-        if release.id in self.releases_by_id:
-            raise ValueError(f'release {release.id} ({release.title}) already in store')
-        self.releases_by_id[release.id] = release
+        self._add(self.releases_by_id, release.id, release, f'release {release.id} ({release.title})',
+                  [(self.releases_by_artist, release.artists)])
 
     def get_artist(self, artist_id: ArtistId) -> Artist | None:
         return self.artists_by_id.get(artist_id)
 
     def add_artist(self, artist: Artist):
-        if artist.id in self.artists_by_id:
-            raise ValueError(f'artist {artist.id} ({artist.name}) already in store')
-        self.artists_by_id[artist.id] = artist
+        self._add(self.artists_by_id, artist.id, artist, f'artist {artist.id} ({artist.name})')
 
     def add_track(self, track: Track):
-        if track.id in self.tracks_by_id:
-            raise ValueError(f'track {track.id} ({track.title}) already in store')
-        self.tracks_by_id[track.id] = track
+        self._add(self.tracks_by_id, track.id, track, f'track {track.id} ({track.title})',
+                  [(self.tracks_by_work, track.works), (self.tracks_by_artist, track.artists)])
 
     def get_track(self, track_id: TrackId) -> Track | None:
         return self.tracks_by_id.get(track_id)
@@ -37,10 +187,55 @@ class CollectionStore:
     def get_work(self, work_id: WorkId) -> Work | None:
         return self.works_by_id.get(work_id)
 
+    def add_work(self, work: Work):
+        self._add(self.works_by_id, work.id, work, f'work {work.id} ({work.name})',
+                  [(self.works_by_composer, work.composers),
+                   (self.child_works, () if work.parent is None else (work.parent.id,))])
+
     def add_track_group(self, track_group: TrackGroup):
-        if track_group.id in self.track_groups_by_id:
-            raise ValueError(f'track group {track_group} already in store')
-        self.track_groups_by_id[track_group.id] = track_group
+        self._add(self.track_groups_by_id, track_group.id, track_group, f'track group {track_group}',
+                  [(self.track_groups_by_work, (track_group.work,))])
 
     def get_track_group(self, track_group_id: TrackGroupId) -> TrackGroup | None:
         return self.track_groups_by_id.get(track_group_id)
+
+    def get_works_by_composer(self, composer: ArtistId) -> Sequence[Work]:
+        return [self.works_by_id[work] for work in self.works_by_composer.get(composer, ())]
+
+    def get_child_works(self, work_id: WorkId) -> Sequence[Work]:
+        return sorted((self.works_by_id[work] for work in self.child_works.get(work_id, ())),
+                      key=lambda work: work.parent.own_position)
+
+    def get_tracks_of_work(self, work_id: WorkId) -> Sequence[Track]:
+        return [self.tracks_by_id[track] for track in self.tracks_by_work.get(work_id, ())]
+
+    def get_track_groups_of_work(self, work_id: WorkId) -> Sequence[TrackGroup]:
+        return [self.track_groups_by_id[group] for group in self.track_groups_by_work.get(work_id, ())]
+
+    def get_tracks_by_artist(self, artist_id: ArtistId) -> Sequence[Track]:
+        return [self.tracks_by_id[track] for track in self.tracks_by_artist.get(artist_id, ())]
+
+    def get_releases_by_artist(self, artist_id: ArtistId) -> Sequence[Release]:
+        return [self.releases_by_id[release] for release in self.releases_by_artist.get(artist_id, ())]
+
+    def iter_releases(self) -> Iterator[Release]:
+        return iter(self.releases_by_id.values())
+
+    def iter_artists(self) -> Iterator[Artist]:
+        return iter(self.artists_by_id.values())
+
+    def iter_tracks(self) -> Iterator[Track]:
+        return iter(self.tracks_by_id.values())
+
+    def iter_works(self) -> Iterator[Work]:
+        return iter(self.works_by_id.values())
+
+
+def _remove(entities: dict, entity_id: Hashable, indexes: list[tuple[dict[Hashable, list], tuple[Hashable, ...]]]):
+    """Undo `CollectionStore._add` (which must be the last addition to the indexes)."""
+    del entities[entity_id]
+    for index, keys in indexes:
+        for key in keys:
+            index[key].pop()
+            if len(index[key]) == 0:
+                del index[key]
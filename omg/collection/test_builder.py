@@ -1,6 +1,11 @@
-from omg.collection.builder import CollectionBuilder
-from omg.collection.entities import TrackGroup, TrackGroupId
+
+import pytest
+
+from omg.brainz.model import ReleaseId, WorkId
+from omg.collection.builder import CollectionBuilder, ConcurrentCollectionBuilder
+from omg.collection.entities import TrackGroup, TrackGroupId, ParentWork
 from omg.collection.store import CollectionStore
+from omg.test_utils.fake_source import FakeDataSource
 from omg.test_utils.mbids import argerich_rach3_tchaik1, rach3, argerich_rach3_mvmt1, rach3_mvmt1
 
 
@@ -22,3 +27,57 @@ def test_add_release(musicbrainz_source):
     first_track = store.get_track(first_track_group.tracks[0])
     assert first_track.recording_id == argerich_rach3_mvmt1
     assert first_track.works[0] == rach3_mvmt1
+
+
+def test_works_are_stored():
+    source = FakeDataSource()
+    store = CollectionStore()
+    builder = CollectionBuilder(store, source)
+
+    release = builder.get_or_add_release(ReleaseId('release-0'))
+
+    assert len(release.contents) == 2
+    assert store.get_work(WorkId('work-0-1')).parent == ParentWork(WorkId('work-0'), 1)
+    assert store.get_work(WorkId('work-0')).name == 'Work 0'
+    # each movement and parent work is looked up once, although group_tracks needs the movements again
+    assert source.calls['get_work_data'] == 6
+
+
+def test_failed_release_can_be_added_again():
+    class FlakySource(FakeDataSource):
+        def get_recording_artists(self, recording_id):
+            if recording_id.mbid == 'recording-0-3' and self.calls['get_recording_artists'] == 3:
+                self.calls['get_recording_artists'] += 1
+                raise IOError('service unavailable')
+            return super().get_recording_artists(recording_id)
+
+    store = CollectionStore()
+    builder = CollectionBuilder(store, FlakySource())
+
+    with pytest.raises(IOError):
+        builder.get_or_add_release(ReleaseId('release-0'))
+    assert store.get_release(ReleaseId('release-0')) is None
+    assert len(store.tracks_by_id) == 0
+
+    release = builder.get_or_add_release(ReleaseId('release-0'))
+    assert len(release.contents) == 2
+    assert len(store.tracks_by_id) == 4
+
+
+def test_concurrent_builder_matches_serial_builder():
+    release_ids = [ReleaseId(f'release-{i}') for i in range(3)]
+    serial_store = CollectionStore()
+    serial_builder = CollectionBuilder(serial_store, FakeDataSource(releases=3, tracks_per_release=8))
+    serial_releases = [serial_builder.get_or_add_release(release_id) for release_id in release_ids]
+
+    source = FakeDataSource(releases=3, tracks_per_release=8, latency=0.02)
+    store = CollectionStore()
+    builder = ConcurrentCollectionBuilder(store, source, max_workers=8)
+    releases = [builder.get_or_add_release(release_id) for release_id in release_ids]
+    builder.close()
+
+    assert releases == serial_releases
+    for attribute in ('releases_by_id', 'tracks_by_id', 'track_groups_by_id', 'works_by_id', 'artists_by_id'):
+        assert list(getattr(store, attribute).items()) == list(getattr(serial_store, attribute).items())
+    assert max(source.lookups.values()) == 1
+    assert source.max_concurrent_calls > 1
@@ -0,0 +1,59 @@
+import pytest
+from click.testing import CliRunner
+
+import omg.collection.cli
+from omg.brainz.model import ReleaseId, ArtistId, ArtistData
+from omg.cli import cli
+from omg.collection.builder import CollectionBuilder
+from omg.collection.sqlite import SqliteCollectionStore
+from omg.test_utils.fake_source import FakeDataSource
+
+
+def set_aliases(source: FakeDataSource, *aliases: str):
+    composer = ArtistId('composer-1')
+    source.artists[composer] = ArtistData(composer, 'Clara Schumann', 'Schumann, Clara', None, aliases=aliases)
+
+
+@pytest.fixture
+def source():
+    return FakeDataSource(releases=2, tracks_per_release=4, composers=2)
+
+
+def build_store(store_path, source: FakeDataSource):
+    store = SqliteCollectionStore(store_path)
+    store.init()
+    builder = CollectionBuilder(store, source)
+    for release in ('release-0', 'release-1'):
+        builder.get_or_add_release(ReleaseId(release))
+    store.close()
+
+
+def search(store_path, *args: str) -> list[str]:
+    result = CliRunner().invoke(cli, ['collection', 'search', str(store_path), *args])
+    assert result.exit_code == 0, result.output
+    return result.output.splitlines()
+
+
+def test_search(tmp_path, source):
+    set_aliases(source, 'Clara Wieck')
+    build_store(tmp_path / 'collection.sqlite', source)
+
+    assert search(tmp_path / 'collection.sqlite', 'wieck', '-n', '3') == [
+        ' 3.0  Movement 1 (track-0-2)', ' 3.0  Movement 2 (track-0-3)', ' 3.0  Movement 1 (track-1-2)']
+
+
+def test_update_aliases_makes_artists_findable_by_them(tmp_path, source, monkeypatch):
+    set_aliases(source)
+    build_store(tmp_path / 'collection.sqlite', source)
+    assert search(tmp_path / 'collection.sqlite', 'wieck') == []
+
+    set_aliases(source, 'Clara Schumann', 'Clara Wieck')
+    monkeypatch.setattr(omg.collection.cli, 'create_source', lambda ctx: source)
+    result = CliRunner().invoke(cli, ['collection', 'update-aliases', str(tmp_path / 'collection.sqlite')])
+
+    assert result.exit_code == 0, result.output
+    assert len(search(tmp_path / 'collection.sqlite', 'wieck')) == 4
+    store = SqliteCollectionStore(tmp_path / 'collection.sqlite')
+    store.init()
+    assert store.get_artist(ArtistId('composer-1')).aliases == ('Clara Wieck',)  # not the name itself
+    store.close()
@@ -0,0 +1,56 @@
+import pytest
+
+from omg.brainz.model import ReleaseId, TrackId, WorkId
+from omg.collection.builder import CollectionBuilder, ConcurrentCollectionBuilder
+from omg.collection.importer import ReleaseImporter
+from omg.collection.store import CollectionStore
+from omg.test_utils.fake_source import FakeDataSource
+
+release_ids = [ReleaseId(f'release-{i}') for i in range(6)]
+
+
+def test_import_releases():
+    store = CollectionStore()
+    builder = ConcurrentCollectionBuilder(store, FakeDataSource(releases=6))
+    checkpoints = []
+    importer = ReleaseImporter(builder, checkpoint=lambda: checkpoints.append(len(store.releases_by_id)),
+                               checkpoint_interval=2)
+
+    progress = importer.run([*release_ids, ReleaseId('unknown'), release_ids[0]])
+
+    builder.close()
+    assert list(store.releases_by_id) == release_ids
+    assert checkpoints == [2, 4, 6, 6]
+    assert (progress.imported, progress.skipped, progress.failed) == (6, 0, [ReleaseId('unknown')])
+
+
+def test_resume_interrupted_import():
+    class InterruptedStore(CollectionStore):
+        interrupt = True
+
+        def add_track_group(self, track_group):
+            if self.interrupt and track_group.id.first_track == TrackId('track-3-2'):
+                raise KeyboardInterrupt()
+            super().add_track_group(track_group)
+
+    store = InterruptedStore()
+    builder = ConcurrentCollectionBuilder(store, FakeDataSource(releases=6, composers=4))
+    with pytest.raises(KeyboardInterrupt):
+        ReleaseImporter(builder, checkpoint_interval=100).run(release_ids)
+    builder.close()
+
+    expected = CollectionStore()
+    expected_builder = CollectionBuilder(expected, FakeDataSource(releases=6, composers=4))
+    for release_id in release_ids[:3]:
+        expected_builder.get_or_add_release(release_id)
+    assert vars(store) == vars(expected)
+    store.interrupt = False
+    source = FakeDataSource(releases=6, composers=4)
+    builder = ConcurrentCollectionBuilder(store, source)
+    progress = ReleaseImporter(builder).run(release_ids)
+    builder.close()
+
+    assert (progress.imported, progress.skipped, progress.failed) == (3, 3, [])
+    assert source.lookups['get_release_data', 'release-0'] == 0
+    assert list(store.releases_by_id) == release_ids
+    assert len(store.tracks_by_work[WorkId('work-1-1')]) == 6
@@ -0,0 +1,169 @@
+import pytest
+
+from omg.brainz.model import ArtistId, WorkId, TrackId, RecordingId, ReleaseId, WorkData, ArtistData, \
+    RecordingArtistRelation, RecordingArtistRelationType
+from omg.collection.builder import CollectionBuilder, ConcurrentCollectionBuilder
+from omg.collection.entities import Artist, Work, ParentWork, Track, Release, TrackGroup, TrackGroupId
+from omg.collection.search import tokenize, SearchIndexingStore, CollectionSearchIndex
+from omg.collection.sqlite import SqliteCollectionStore
+from omg.collection.store import CollectionStore
+from omg.test_utils.fake_source import FakeDataSource
+from omg.util.dates import PartialDate
+
+rachmaninoff = Artist(ArtistId('rachmaninoff'), 'Sergei Rachmaninoff', 'Rachmaninoff, Sergei', None,
+                      aliases=('Sergei Rachmaninow', 'Сергей Васильевич Рахманинов'))
+dvorak = Artist(ArtistId('dvorak'), 'Antonín Dvořák', 'Dvořák, Antonín', None)
+argerich = Artist(ArtistId('argerich'), 'Martha Argerich', 'Argerich, Martha', None)
+concerto = WorkId('concerto')
+movements = ['Allegro ma non tanto', 'Intermezzo. Adagio', 'Finale. Alla breve']
+
+
+def add_release(store, release: str, title: str, tracks: list[Track], artists=()):
+    for track in tracks:
+        store.add_track(track)
+    store.add_release(Release(ReleaseId(release), title, PartialDate(1982), tuple(artists),
+                              tuple(track.id for track in tracks)))
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def empty_store(request, tmp_path):
+    if request.param == 'memory':
+        return SearchIndexingStore(CollectionStore())
+    store = SqliteCollectionStore(tmp_path / 'collection.sqlite')
+    store.init()
+    return SearchIndexingStore(store)
+
+
+@pytest.fixture
+def store(empty_store):
+    store = empty_store
+    for artist in (rachmaninoff, dvorak, argerich):
+        store.add_artist(artist)
+    store.add_work(Work(concerto, 'Piano Concerto No. 3 in D minor, Op. 30', None, None, (rachmaninoff.id,)))
+    for i, movement in enumerate(movements, start=1):
+        store.add_work(Work(WorkId(f'concerto-{i}'), f'Piano Concerto No. 3: {movement}', None,
+                            ParentWork(concerto, i), (rachmaninoff.id,)))
+    store.add_work(Work(WorkId('humoresque'), 'Humoresque No. 7', None, None, (dvorak.id,)))
+    tracks = [Track(TrackId(f'track-{i}'), RecordingId(f'recording-{i}'), movement, 1, 'CD', i,
+                    (WorkId(f'concerto-{i}'),), ()) for i, movement in enumerate(movements, start=1)]
+    store.add_track_group(TrackGroup(TrackGroupId(tracks[0].id, 3), concerto, tuple(t.id for t in tracks)))
+    add_release(store, 'live', 'Rachmaninov 3 / Tchaikovsky 1', tracks, [argerich.id])
+    add_release(store, 'encores', 'Encores', [
+        Track(TrackId('humoresque'), RecordingId('humoresque'), 'Humoresque', 1, 'CD', 1,
+              (WorkId('humoresque'),), ()),
+        Track(TrackId('prelude'), RecordingId('prelude'), 'Rachmaninoff: Prelude', 1, 'CD', 2, (), ())])
+    return store
+
+
+def search(store, query: str) -> list[str]:
+    return [result.track.id.mbid for result in store.index.search(query)]
+
+
+def test_tokenize():
+    assert tokenize('Dvořák: Symphony No. 9 „Aus der Neuen Welt“') == [
+        'dvorak', 'symphony', 'no', '9', 'aus', 'der', 'neuen', 'welt']
+    assert tokenize('Рахманинов, Сергей') == ['рахманинов', 'сергеи']  # й is и with a breve
+    assert tokenize('STRASSE Straße ﬁnale') == ['strasse', 'strasse', 'finale']
+
+
+def test_search_by_composer_aliases(store):
+    expected = ['track-1', 'track-2', 'track-3']
+    assert search(store, 'Rachmaninow') == expected
+    assert search(store, 'РАХМАНИНОВ') == expected
+
+
+def test_search_combines_fields(store):
+    assert search(store, 'argerich intermezzo') == ['track-2']
+    assert search(store, 'dvorak humoresque') == ['humoresque']
+    assert search(store, 'dvorak argerich') == []
+    assert search(store, 'tchaikovsky finale') == ['track-3']  # release title and track title
+    assert search(store, 'unknown') == []
+    assert search(store, '') == []
+
+
+def test_search_prefixes_and_ranking(store):
+    assert search(store, 'rach inter') == ['track-2']
+    assert search(store, 'dvor') == ['humoresque']
+    # 'no' is too short to match as a prefix of 'non'
+    assert search(store, 'no allegro') == ['track-1']
+    # the composer field ranks higher than the title
+    assert search(store, 'rachmaninoff') == ['track-1', 'track-2', 'track-3', 'prelude']
+    assert [result.score for result in store.index.search('rachmaninoff')] == [3, 3, 3, 2]
+    assert [result.score for result in store.index.search('rachmaninof')] == [1.5, 1.5, 1.5, 1]
+    # equally good results in the order they were added
+    assert [result.track.id.mbid for result in store.index.search('rachmaninoff', limit=2)] == ['track-1', 'track-2']
+    assert [result.track.id.mbid for result in store.index.search('rach', limit=None)] == [
+        'track-1', 'track-2', 'track-3', 'prelude']
+
+
+def test_index_follows_additions(store):
+    assert search(store, 'vocalise') == []
+
+    store.add_work(Work(WorkId('vocalise'), 'Vocalise, Op. 34 No. 14', None, None, (rachmaninoff.id,)))
+    add_release(store, 'vocalise', 'Vocalise', [Track(TrackId('vocalise'), RecordingId('vocalise'), 'Vocalise',
+                                                      1, 'CD', 1, (WorkId('vocalise'),), (argerich.id,))])
+
+    assert search(store, 'vocalise argerich') == ['vocalise']
+    assert len(search(store, 'rachmaninow')) == 4
+
+
+def test_index_only_additions_of_successful_atomic_contexts(store):
+    vocalise = Track(TrackId('vocalise'), RecordingId('vocalise'), 'Vocalise', 1, 'CD', 1, (), (argerich.id,))
+    with pytest.raises(KeyboardInterrupt):
+        with store.atomic():
+            add_release(store, 'vocalise', 'Vocalise', [vocalise])
+            raise KeyboardInterrupt
+    assert search(store, 'vocalise') == []
+
+    with store.atomic():
+        add_release(store, 'vocalise', 'Vocalise', [vocalise])
+        assert search(store, 'vocalise') == []
+    assert search(store, 'vocalise') == ['vocalise']
+
+
+def test_parent_work_added_after_tracks(store):
+    store.add_work(Work(WorkId('vespers-1'), 'Come, Let Us Worship', None, ParentWork(WorkId('vespers'), 1),
+                        (rachmaninoff.id,)))
+    add_release(store, 'vespers', 'Vespers', [Track(TrackId('vespers-1'), RecordingId('vespers-1'),
+                                                    'Come, Let Us Worship', 1, 'CD', 1, (WorkId('vespers-1'),), ())])
+    store.add_work(Work(WorkId('vespers'), 'All-Night Vigil, Op. 37', None, None, (rachmaninoff.id,)))
+
+    assert search(store, 'rachmaninoff vigil') == ['vespers-1']
+
+
+def test_index_existing_store(store):
+    index = CollectionSearchIndex(store.store)
+    index.add_store(store.store)
+
+    for query in ('rachmaninow', 'rach inter', 'argerich', 'encores', 'concerto'):
+        # equally good results may come in a different order, as the store lists entities in its own order
+        assert {(result.track.id, result.score) for result in index.search(query)} == {
+            (result.track.id, result.score) for result in store.index.search(query)}
+
+
+def test_index_collection_while_building(empty_store):
+    builder = CollectionBuilder(empty_store, FakeDataSource(releases=2, tracks_per_release=4, composers=2))
+    for release in ('release-0', 'release-1'):
+        builder.get_or_add_release(ReleaseId(release))
+
+    # every track is found by words of its title ('Movement 1'), works, composer, performer and release
+    assert len(search(empty_store, 'movement work composer performer release')) == 8
+
+
+@pytest.mark.parametrize('builder_class', [CollectionBuilder, ConcurrentCollectionBuilder])
+def test_index_parent_works_and_performers_of_built_releases(empty_store, builder_class):
+    source = FakeDataSource(releases=1, tracks_per_release=2)
+    source.works[WorkId('work-0')] = WorkData(WorkId('work-0'), 'Sonata', None)
+    conductor = ArtistId('conductor')
+    source.artists[conductor] = ArtistData(conductor, 'Herbert von Karajan', 'Karajan, Herbert von', None)
+    recording = RecordingId('recording-0-1')
+    source.recording_artists[recording].append(RecordingArtistRelation(
+        recording=recording, artist=conductor, end_date=None, type=RecordingArtistRelationType('conductor')))
+    builder = builder_class(empty_store, source)
+    builder.get_or_add_release(ReleaseId('release-0'))
+
+    # neither the parent work nor the conductor is named in the release, the movements or the track titles
+    assert search(empty_store, 'sonata') == ['track-0-0', 'track-0-1']
+    assert search(empty_store, 'karajan') == ['track-0-1']
+    if builder_class is ConcurrentCollectionBuilder:
+        builder.close()
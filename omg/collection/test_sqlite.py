@@ -0,0 +1,124 @@
+import sqlite3
+
+import pytest
+
+from omg.brainz.model import ReleaseId, ArtistId, TrackId
+from omg.collection.builder import CollectionBuilder, ConcurrentCollectionBuilder
+from omg.collection.entities import Artist
+from omg.collection.importer import ReleaseImporter
+from omg.collection.sqlite import SqliteCollectionStore, _MIGRATIONS
+from omg.collection.store import CollectionStore
+from omg.test_utils.fake_source import FakeDataSource
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return tmp_path / 'collection.sqlite'
+
+
+def create_store(path, **kwargs) -> SqliteCollectionStore:
+    store = SqliteCollectionStore(path, **kwargs)
+    store.init()
+    return store
+
+
+def test_store_matches_in_memory_store(store_path):
+    release_ids = [ReleaseId('release-0'), ReleaseId('release-1')]
+    memory_store = CollectionStore()
+    for release_id in release_ids:
+        CollectionBuilder(memory_store, FakeDataSource()).get_or_add_release(release_id)
+    store = create_store(store_path)
+    for release_id in release_ids:
+        CollectionBuilder(store, FakeDataSource()).get_or_add_release(release_id)
+    store.close()
+
+    store = create_store(store_path, cache_size=2)
+    for entities, get in [(memory_store.releases_by_id, store.get_release),
+                          (memory_store.tracks_by_id, store.get_track),
+                          (memory_store.track_groups_by_id, store.get_track_group),
+                          (memory_store.works_by_id, store.get_work), (memory_store.artists_by_id, store.get_artist)]:
+        for entity_id, entity in entities.items():
+            assert get(entity_id) == entity
+    assert store.get_release(ReleaseId('release-2')) is None
+    store.close()
+
+
+def test_add_existing_raises(store_path):
+    store = create_store(store_path)
+    artist = Artist(ArtistId('artist'), 'Name', 'Name', None)
+    store.add_artist(artist)
+    store.commit()
+
+    with pytest.raises(ValueError):
+        store.add_artist(artist)
+    other = Artist(ArtistId('other'), 'Other', 'Other', 'disambiguation', aliases=('Andere', 'Другой'))
+    store.add_artist(other)
+    store.close()
+
+    assert create_store(store_path).get_artist(ArtistId('other')) == other
+
+
+def test_set_aliases_of_artists_stored_before_aliases(store_path):
+    connection = sqlite3.connect(store_path)
+    for migrate in _MIGRATIONS[:2]:
+        migrate(connection)
+    connection.execute("INSERT INTO artists VALUES ('artist', 'Name', 'Name', NULL)")
+    connection.execute('PRAGMA user_version = 2')
+    connection.commit()
+    connection.close()
+
+    store = create_store(store_path)
+    assert store.get_artist(ArtistId('artist')).aliases == ()
+    assert store.get_artist_ids() == [ArtistId('artist')]
+    store.set_artist_aliases(ArtistId('artist'), ('Alias', 'Псевдоним'))
+    with pytest.raises(ValueError):
+        store.set_artist_aliases(ArtistId('other'), ('Alias',))
+    assert store.get_artist(ArtistId('artist')).aliases == ('Alias', 'Псевдоним')
+    store.close()
+
+    assert create_store(store_path).get_artist(ArtistId('artist')) == Artist(ArtistId('artist'), 'Name', 'Name', None,
+                                                                             aliases=('Alias', 'Псевдоним'))
+
+
+def test_commits_in_batches_after_releases(store_path):
+    store = create_store(store_path, batch_size=5)
+    builder = CollectionBuilder(store, FakeDataSource(releases=3))
+
+    builder.get_or_add_release(ReleaseId('release-0'))  # 3 artists, 6 works, 4 tracks, 2 groups, 1 release
+    store.add_artist(Artist(ArtistId('artist'), 'Name', 'Name', None))
+
+    other = create_store(store_path)
+    assert other.get_release(ReleaseId('release-0')) is not None
+    assert other.get_artist(ArtistId('artist')) is None
+    other.close()
+    store.close()
+
+
+def test_resume_import_interrupted_in_the_middle_of_a_release(store_path):
+    class InterruptedStore(SqliteCollectionStore):
+        def add_track_group(self, track_group):
+            if track_group.id.first_track == TrackId('track-1-2'):
+                raise KeyboardInterrupt()
+            super().add_track_group(track_group)
+
+    release_ids = [ReleaseId(f'release-{i}') for i in range(3)]
+    store = InterruptedStore(store_path)
+    store.init()
+    builder = ConcurrentCollectionBuilder(store, FakeDataSource(releases=3, composers=3))
+    with pytest.raises(KeyboardInterrupt):
+        ReleaseImporter(builder, checkpoint=store.commit).run(release_ids)
+    builder.close()
+    assert store.get_track(TrackId('track-1-0')) is None
+    store.close()
+
+    store = create_store(store_path)
+    assert store.get_release(ReleaseId('release-0')) is not None
+    assert store.get_track(TrackId('track-1-0')) is None
+    builder = ConcurrentCollectionBuilder(store, FakeDataSource(releases=3, composers=3))
+    progress = ReleaseImporter(builder, checkpoint=store.commit).run(release_ids)
+    builder.close()
+
+    assert (progress.imported, progress.skipped, progress.failed) == (2, 1, [])
+    assert len(store.get_release(ReleaseId('release-1')).contents) == 2
+    assert store.get_track(TrackId('track-1-0')) is not None
+    store.close()
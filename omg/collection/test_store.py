@@ -0,0 +1,58 @@
+import pytest
+
+from omg.brainz.model import ReleaseId, ArtistId, WorkId, TrackId
+from omg.collection.builder import CollectionBuilder
+from omg.collection.entities import TrackGroupId
+from omg.collection.sqlite import SqliteCollectionStore
+from omg.collection.store import CollectionStore
+from omg.test_utils.fake_source import FakeDataSource
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        store = CollectionStore()
+    else:
+        store = SqliteCollectionStore(tmp_path / 'collection.sqlite', cache_size=3)
+        store.init()
+    builder = CollectionBuilder(store, FakeDataSource(releases=2, tracks_per_release=4, composers=2))
+    for release in ('release-0', 'release-1'):
+        builder.get_or_add_release(ReleaseId(release))
+    return store
+
+
+def ids(entities) -> set:
+    return {entity.id for entity in entities}
+
+
+def test_works_by_composer(store):
+    assert ids(store.get_works_by_composer(ArtistId('composer-1'))) == {WorkId('work-1'), WorkId('work-1-1'),
+                                                                        WorkId('work-1-2')}
+    assert store.get_works_by_composer(ArtistId('performer-0')) == []
+
+
+def test_child_works(store):
+    assert [work.id for work in store.get_child_works(WorkId('work-0'))] == [WorkId('work-0-1'), WorkId('work-0-2')]
+    assert store.get_child_works(WorkId('work-0-1')) == []
+
+
+def test_recordings_of_works(store):
+    assert ids(store.get_tracks_of_work(WorkId('work-0-2'))) == {TrackId('track-0-1'), TrackId('track-1-1')}
+    assert ids(store.get_track_groups_of_work(WorkId('work-1'))) == {TrackGroupId(TrackId('track-0-2'), 2),
+                                                                      TrackGroupId(TrackId('track-1-2'), 2)}
+
+
+def test_by_artist(store):
+    assert ids(store.get_tracks_by_artist(ArtistId('performer-1'))) == {TrackId(f'track-1-{i}') for i in range(4)}
+    assert ids(store.get_releases_by_artist(ArtistId('performer-0'))) == {ReleaseId('release-0')}
+    assert store.get_releases_by_artist(ArtistId('composer-0')) == []
+
+
+def test_iterate_all_entities(store):
+    assert ids(store.iter_releases()) == {ReleaseId('release-0'), ReleaseId('release-1')}
+    assert ids(store.iter_artists()) == {ArtistId(f'{role}-{i}') for role in ('composer', 'performer')
+                                         for i in range(2)}
+    assert ids(store.iter_works()) == {WorkId(f'work-{i}{movement}') for i in range(2)
+                                       for movement in ('', '-1', '-2')}
+    assert ids(store.iter_tracks()) == {TrackId(f'track-{r}-{t}') for r in range(2) for t in range(4)}
+    assert all(track == store.get_track(track.id) for track in store.iter_tracks())
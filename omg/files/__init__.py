@@ -6,4 +6,6 @@ from pathlib import Path
 @dataclass(frozen=True)
 class FileInfo:
     path: Path
-    mtime: datetime
\ No newline at end of file
+    mtime: datetime
+    size: int | None = None
+    inode: int | None = None
@@ -1,3 +1,4 @@
+from datetime import timedelta
 from pathlib import Path
 
 import click
@@ -6,24 +7,80 @@ from omg.cli import cli
 from omg.files.db_updater import DatabaseUpdater
 from omg.files.filesystem import FilesystemTagProvider
 from omg.files.sqlite import SqliteAudioFileDatabase
-from omg.files.walker import FilesystemAudioFileWalker
+from omg.files.tags import TagMatch
+from omg.files.walker import IncrementalAudioFileWalker
+from omg.files.watch import create_watcher, watch as watch_changes
 
 
 @cli.group('files')
 @click.option('--db')
+@click.option('--wal/--no-wal', default=True, show_default=True,
+              help='use write-ahead logging, so that the database can be read while it is updated')
 @click.pass_context
-def files(ctx, db):
+def files(ctx, db, wal):
     ctx.obj['db'] = db
+    ctx.obj['wal'] = wal
+
+
+def open_db(ctx) -> SqliteAudioFileDatabase:
+    db = SqliteAudioFileDatabase(ctx.obj['db'] or 'omg.sqlite', wal=ctx.obj['wal'])
+    db.init()
+    return db
+
+
+def create_updater(ctx, root: Path, jobs: int = 1, threads: bool = False, full: bool = False,
+                   full_scan_interval: int = 7) -> DatabaseUpdater:
+    db = open_db(ctx)
+    walker = IncrementalAudioFileWalker(root, db, force_full_scan=full,
+                                        full_scan_interval=timedelta(days=full_scan_interval) or None)
+    return DatabaseUpdater(db, FilesystemTagProvider(root), walker, jobs=jobs, use_processes=not threads)
 
 
 @files.command('update')
 @click.argument('path')
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=1, show_default=True,
+              help='number of parallel workers reading tags')
+@click.option('--threads', is_flag=True, help='use threads instead of processes for parallel tag reading')
+@click.option('--full', is_flag=True, help='check all files for modifications, not only those in changed directories')
+@click.option('--full-scan-interval', type=click.IntRange(min=0), default=7, show_default=True,
+              help='days after which a full scan is done automatically (0: never)')
 @click.pass_context
-def update(ctx, path):
-    db = SqliteAudioFileDatabase(ctx.obj['db'] or 'omg.sqlite')
-    db.init()
-    root = Path(path)
-    updater = DatabaseUpdater(db, FilesystemTagProvider(root),
-                              FilesystemAudioFileWalker(root))
+def update(ctx, path, jobs, threads, full, full_scan_interval):
+    updater = create_updater(ctx, Path(path), jobs=jobs, threads=threads, full=full,
+                             full_scan_interval=full_scan_interval)
     updater.update()
-    pass
+    updater.db.remove_unused_tag_values()
+
+
+@files.command('watch')
+@click.argument('path')
+@click.option('--debounce', type=click.FloatRange(min=0), default=2.0, show_default=True,
+              help='seconds without new events before changes are applied')
+@click.option('--poll-interval', type=click.FloatRange(min=1), default=300, show_default=True,
+              help='seconds between checks if inotify is not available')
+@click.option('--polling', is_flag=True, help='always poll instead of using inotify')
+@click.pass_context
+def watch(ctx, path, debounce, poll_interval, polling):
+    """Keep the database up to date with the files below PATH."""
+    root = Path(path)
+    updater = create_updater(ctx, root)
+    with create_watcher(root, debounce=debounce, poll_interval=poll_interval, polling=polling) as watcher:
+        updater.update()
+        try:
+            watch_changes(updater, watcher)
+        except KeyboardInterrupt:
+            pass
+
+
+@files.command('query')
+@click.argument('value')
+@click.option('-t', '--tag', help='only match values of this tag (e.g. ARTIST)')
+@click.option('--prefix', 'match', flag_value=TagMatch.PREFIX, help='match values starting with VALUE')
+@click.option('--fulltext', 'match', flag_value=TagMatch.FULLTEXT,
+              help='match values containing all words of VALUE')
+@click.pass_context
+def query(ctx, value, tag, match):
+    """List files with a tag value matching VALUE (exactly, by default)."""
+    db = open_db(ctx)
+    for file in db.query(value, tag=tag, match=match or TagMatch.EXACT):
+        click.echo(str(file.path))
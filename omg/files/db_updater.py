@@ -1,38 +1,170 @@
+import itertools
 import logging
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from enum import Enum
 from pathlib import Path
 
 from omg.files import FileInfo
 from omg.files.sqlite import TagDatabase
-from omg.files.tags import TagProvider
+from omg.files.tags import TagProvider, Tags
 from omg.files.walker import AudioFileWalker
 
 
+class FileChange(Enum):
+    NEW = 'new'
+    DELETED = 'deleted'
+    MODIFIED = 'modified'
+    UNCHANGED = 'unchanged'
+    IDENTITY_UNKNOWN = 'identity unknown'
+    """Not modified, but the database does not know the size and inode of the file yet (because it was stored
+    before they were recorded)."""
+
+
+def _sorted_by_path(files: Iterable[FileInfo], source: str) -> Iterator[tuple[str, FileInfo]]:
+    previous = None
+    for file in files:
+        key = str(file.path)
+        if previous is not None and key <= previous:
+            raise ValueError(f'files from {source} are not sorted by path: {key} after {previous}')
+        previous = key
+        yield key, file
+
+
+def _compare(db_file: FileInfo, fs_file: FileInfo) -> FileChange:
+    if fs_file.mtime > db_file.mtime:
+        return FileChange.MODIFIED
+    if db_file.size is None and db_file.inode is None:
+        unknown = fs_file.size is not None or fs_file.inode is not None
+        return FileChange.IDENTITY_UNKNOWN if unknown else FileChange.UNCHANGED
+    if (fs_file.size, fs_file.inode) != (db_file.size, db_file.inode):
+        return FileChange.MODIFIED
+    return FileChange.UNCHANGED
+
+
+def diff_files(db_files: Iterable[FileInfo], fs_files: Iterable[FileInfo]) -> Iterator[tuple[FileChange, FileInfo]]:
+    """Classify files by merge-joining the database and file system contents.
+
+    Both inputs must be sorted by their path strings. For deleted files, the database's `FileInfo` is returned,
+    otherwise the one from the file system. Runs in constant memory.
+    """
+    db_iter = _sorted_by_path(db_files, 'database')
+    fs_iter = _sorted_by_path(fs_files, 'file system')
+    db_key, db_file = next(db_iter, (None, None))
+    fs_key, fs_file = next(fs_iter, (None, None))
+    while db_key is not None or fs_key is not None:
+        if fs_key is None or (db_key is not None and db_key < fs_key):
+            yield FileChange.DELETED, db_file
+            db_key, db_file = next(db_iter, (None, None))
+        elif db_key is None or fs_key < db_key:
+            yield FileChange.NEW, fs_file
+            fs_key, fs_file = next(fs_iter, (None, None))
+        else:
+            yield _compare(db_file, fs_file), fs_file
+            db_key, db_file = next(db_iter, (None, None))
+            fs_key, fs_file = next(fs_iter, (None, None))
+
+
+def outermost_paths(paths: Iterable[Path]) -> list[Path]:
+    """Remove duplicates and paths that are below another of the given paths."""
+    unique_paths = set(paths)
+    return sorted(path for path in unique_paths if not any(parent in unique_paths for parent in path.parents))
+
+
 class DatabaseUpdater:
+    """Synchronizes a tag database with the audio files found by a walker.
+
+    The database and the walker both list files sorted by path, so that they can be compared in a
+    streaming fashion (see `diff_files`); memory use only grows with the number of deleted files,
+    which are removed after all new and modified files have been written, and of files whose size and
+    inode are not yet in the database (all files, once after upgrading from a database without them),
+    which are stored without reading their tags again.
+
+    If `detect_moves` is set, a new file with the same inode, size and modification time as a stored file
+    that no longer exists is considered to be moved: its database entry is updated to the new path, keeping
+    the tags, instead of reading the file again.
+
+    With ``jobs > 1``, tags of new and modified files are read in parallel by a pool of
+    worker processes (or threads, if ``use_processes`` is false), while all database writes
+    happen in the calling thread in the same order as in the serial case.
+    """
 
-    def __init__(self, db: TagDatabase, tag_provider: TagProvider, walker: AudioFileWalker):
+    def __init__(self, db: TagDatabase, tag_provider: TagProvider, walker: AudioFileWalker,
+                 jobs: int = 1, use_processes: bool = True, detect_moves: bool = True):
+        if jobs < 1:
+            raise ValueError(f'number of jobs must be positive, got {jobs}')
         self.db = db
         self.tag_provider = tag_provider
         self.walker = walker
+        self.jobs = jobs
+        self.use_processes = use_processes
+        self.detect_moves = detect_moves
 
-    def update(self):
-        db_files: dict[Path, FileInfo] = {file.path: file for file in self.db.get_files()}
-        fs_files: dict[Path, FileInfo] = {file.path: file for file in self.walker.get_files()}
+    def update(self, paths: Iterable[Path] | None = None):
+        """Update the whole database, or only the given files and directory trees."""
+        deleted_paths: list[Path] = []
+        moves: list[tuple[Path, FileInfo]] = []
+        moved_paths: set[Path] = set()
+        identified: list[FileInfo] = []
+        roots = [None] if paths is None else outermost_paths(paths)
+        changes = itertools.chain.from_iterable(diff_files(self.db.get_files(root), self.walker.get_files(root))
+                                                for root in roots)
 
-        db_paths = set(db_files.keys())
-        fs_paths = set(fs_files.keys())
+        def files_to_scan() -> Iterator[FileInfo]:
+            for change, info in changes:
+                match change:
+                    case FileChange.DELETED:
+                        deleted_paths.append(info.path)
+                    case FileChange.NEW:
+                        old_path = self.find_move_source(info, moved_paths) if self.detect_moves else None
+                        if old_path is not None:
+                            logging.info(f'detected move of {old_path} to {info.path}')
+                            moves.append((old_path, info))
+                            moved_paths.add(old_path)
+                        else:
+                            logging.info(f'scanning new file {info.path}')
+                            yield info
+                    case FileChange.MODIFIED:
+                        logging.info(f'scanning modified file {info.path}')
+                        yield info
+                    case FileChange.IDENTITY_UNKNOWN:
+                        identified.append(info)
 
-        for deleted_path in db_paths - fs_paths:
-            self.db.remove_file(deleted_path)
+        self.db.add_or_update_many(self.read_tags(files_to_scan()))
+        if len(moves) > 0:
+            self.db.move_files(moves)
+        if len(identified) > 0:
+            self.db.update_file_infos(identified)
+        self.db.remove_files(path for path in deleted_paths if path not in moved_paths)
+        self.walker.commit()
 
-        for new_path in fs_paths - db_paths:
-            logging.info(f'scanning new file {new_path}')
-            self.update_file_info(fs_files[new_path])
+    def find_move_source(self, file: FileInfo, excluded: set[Path]) -> Path | None:
+        """Find the previous path of a file that has been moved."""
+        for candidate in self.db.get_files_with_identity(file):
+            if candidate.path not in excluded and not self.walker.exists(candidate.path):
+                return candidate.path
+        return None
 
-        for path in db_paths & fs_paths:
-            if fs_files[path].mtime > db_files[path].mtime:
-                logging.info(f'scanning modified file {path}')
-                self.update_file_info(fs_files[path])
+    def read_tags(self, files: Iterable[FileInfo]) -> Iterator[tuple[FileInfo, Tags]]:
+        """Read the tags of the given files, yielding results in input order."""
+        if self.jobs == 1:
+            for info in files:
+                yield info, self.tag_provider.get_tags(info.path)
+            return
+        with self._create_executor() as executor:
+            # bound the number of pending futures so that memory does not grow with the library size
+            pending = deque()
+            for info in files:
+                pending.append((info, executor.submit(self.tag_provider.get_tags, info.path)))
+                if len(pending) >= 4 * self.jobs:
+                    info, future = pending.popleft()
+                    yield info, future.result()
+            while pending:
+                info, future = pending.popleft()
+                yield info, future.result()
 
-    def update_file_info(self, info: FileInfo):
-        tags = self.tag_provider.get_tags(info.path)
-        self.db.add_or_update(info, tags)
+    def _create_executor(self) -> Executor:
+        if self.use_processes:
+            return ProcessPoolExecutor(max_workers=self.jobs)
+        return ThreadPoolExecutor(max_workers=self.jobs)
@@ -1,11 +1,15 @@
+import itertools
+import operator
 import os
 import sqlite3
 from abc import ABC, abstractmethod
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator, Mapping
+from datetime import datetime
 from pathlib import Path
 
 from omg.files import FileInfo
-from omg.files.tags import Tags, TagProvider
+from omg.files.tags import Tags, TagProvider, TagMatch
+from omg.util.iterables import batched
 
 
 class TagDatabase(ABC):
@@ -14,78 +18,443 @@ class TagDatabase(ABC):
     def add_or_update(self, file: FileInfo, tags: Tags):
         raise NotImplementedError()
 
+    def add_or_update_many(self, files: Iterable[tuple[FileInfo, Tags]]):
+        for file, tags in files:
+            self.add_or_update(file, tags)
+
     @abstractmethod
-    def get_files(self) -> Iterable[FileInfo]:
+    def get_files(self, path: Path | None = None) -> Iterable[FileInfo]:
+        """Get all files, or those at or below `path`, sorted by their path strings."""
         raise NotImplementedError()
 
     @abstractmethod
     def remove_file(self, path: Path):
         raise NotImplementedError()
 
+    def remove_files(self, paths: Iterable[Path]):
+        for path in paths:
+            self.remove_file(path)
+
+    def get_files_with_identity(self, file: FileInfo) -> Iterable[FileInfo]:
+        """Get the stored files, other than `file` itself, with the same inode, size and modification time.
+
+        Used to detect files that have been moved. The default implementation does not support this.
+        """
+        return ()
+
+    def move_files(self, moves: Iterable[tuple[Path, FileInfo]]):
+        """Change the path (and file info) of stored files, keeping their tags."""
+        raise NotImplementedError()
+
+    def update_file_infos(self, files: Iterable[FileInfo]):
+        """Change the stored modification time, size and inode of files, keeping their tags."""
+        self.move_files((file.path, file) for file in files)
+
+    def remove_unused_tag_values(self):
+        """Remove stored tag values that are not used by any file anymore, if they are stored separately."""
+        pass
+
+
+class DirectoryDatabase(ABC):
+    """Stores the state of directories seen by an incremental walk.
+
+    Directory modification times are stored as integer nanoseconds (`os.stat_result.st_mtime_ns`)
+    to allow for exact comparison.
+    """
+
+    @abstractmethod
+    def get_directories(self, root: Path) -> Mapping[Path, int]:
+        """Get the stored modification times of `root` and all directories below it."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def set_directories(self, root: Path, directories: Mapping[Path, int]):
+        """Replace the stored modification times of `root` and all directories below it."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_files_in_directory(self, directory: Path) -> Iterable[FileInfo]:
+        """Get the files stored directly (not in a subdirectory) below `directory`."""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get_last_full_scan(self, root: Path) -> datetime | None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def set_last_full_scan(self, root: Path, time: datetime):
+        raise NotImplementedError()
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    """The smallest string greater than all strings starting with `prefix`."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _fulltext_query(text: str) -> str:
+    """An FTS5 query matching all words of `text`, without interpreting FTS5 syntax."""
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+def _subtree_range(directory: Path) -> tuple[str, str]:
+    """Bounds (lower inclusive, upper exclusive) of the path strings below `directory`."""
+    prefix = os.path.join(str(directory), '')
+    return prefix, _prefix_upper_bound(prefix)
+
+
+def _create_tables(conn: sqlite3.Connection):
+    # databases created before schema versioning was introduced may already contain these tables
+    conn.execute('''CREATE TABLE IF NOT EXISTS files(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        path TEXT UNIQUE NOT NULL,
+        modification_time TIMESTAMP NOT NULL
+        );''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS tags(
+        file INTEGER NOT NULL,
+        tag TEXT NOT NULL,
+        value TEXT NOT NULL,
+        FOREIGN KEY (file) REFERENCES files (id) ON DELETE CASCADE
+                 );''')
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);''')
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS tags_file ON tags (file);''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS directories(
+        path TEXT PRIMARY KEY,
+        modification_time INTEGER NOT NULL
+        );''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS full_scans(
+        root TEXT PRIMARY KEY,
+        time TIMESTAMP NOT NULL
+        );''')
+
+
+def _add_file_identity(conn: sqlite3.Connection):
+    conn.execute('ALTER TABLE files ADD COLUMN size INTEGER')
+    conn.execute('ALTER TABLE files ADD COLUMN inode INTEGER')
+    conn.execute('CREATE INDEX files_inode ON files (inode)')
+
+
+def _add_tag_search(conn: sqlite3.Connection):
+    conn.execute('DROP INDEX tags_tag')
+    conn.execute('CREATE INDEX tags_tag_value ON tags (tag, value)')
+    conn.execute('''CREATE VIRTUAL TABLE tags_fts USING fts5(
+        value, content='tags', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+        );''')
+    conn.execute('''CREATE TRIGGER tags_fts_insert AFTER INSERT ON tags BEGIN
+        INSERT INTO tags_fts(rowid, value) VALUES (new.rowid, new.value);
+        END;''')
+    conn.execute('''CREATE TRIGGER tags_fts_delete AFTER DELETE ON tags BEGIN
+        INSERT INTO tags_fts(tags_fts, rowid, value) VALUES ('delete', old.rowid, old.value);
+        END;''')
+    conn.execute("INSERT INTO tags_fts(tags_fts) VALUES ('rebuild')")
+
+
+def _intern_tags(conn: sqlite3.Connection):
+    """Replace the tags table by file_tags, which references tag names and values that are stored only once."""
+    conn.execute('''CREATE TABLE tag_names(
+        id INTEGER PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL
+        );''')
+    conn.execute('''CREATE TABLE tag_values(
+        id INTEGER PRIMARY KEY,
+        value TEXT UNIQUE NOT NULL
+        );''')
+    conn.execute('''CREATE TABLE file_tags(
+        file INTEGER NOT NULL,
+        tag INTEGER NOT NULL,
+        value INTEGER NOT NULL,
+        FOREIGN KEY (file) REFERENCES files (id) ON DELETE CASCADE,
+        FOREIGN KEY (tag) REFERENCES tag_names (id),
+        FOREIGN KEY (value) REFERENCES tag_values (id)
+        );''')
+    conn.execute('INSERT INTO tag_names(name) SELECT DISTINCT tag FROM tags ORDER BY tag')
+    conn.execute('INSERT INTO tag_values(value) SELECT DISTINCT value FROM tags ORDER BY value')
+    conn.execute('''INSERT INTO file_tags(file, tag, value)
+        SELECT tags.file, tag_names.id, tag_values.id FROM tags
+        JOIN tag_names ON tag_names.name = tags.tag
+        JOIN tag_values ON tag_values.value = tags.value
+        ORDER BY tags.rowid''')
+    conn.execute('CREATE INDEX file_tags_file ON file_tags (file)')
+    conn.execute('CREATE INDEX file_tags_tag_value ON file_tags (tag, value)')
+    conn.execute('CREATE INDEX file_tags_value ON file_tags (value)')
+    conn.execute('DROP TABLE tags_fts')
+    conn.execute('DROP TABLE tags')  # also drops its triggers and indexes
+
+    conn.execute('''CREATE VIRTUAL TABLE tag_values_fts USING fts5(
+        value, content='tag_values', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        );''')
+    conn.execute('''CREATE TRIGGER tag_values_fts_insert AFTER INSERT ON tag_values BEGIN
+        INSERT INTO tag_values_fts(rowid, value) VALUES (new.id, new.value);
+        END;''')
+    conn.execute('''CREATE TRIGGER tag_values_fts_delete AFTER DELETE ON tag_values BEGIN
+        INSERT INTO tag_values_fts(tag_values_fts, rowid, value) VALUES ('delete', old.id, old.value);
+        END;''')
+    conn.execute("INSERT INTO tag_values_fts(tag_values_fts) VALUES ('rebuild')")
+
+
+# _MIGRATIONS[i] migrates the schema from version i to version i + 1
+_MIGRATIONS = (_create_tables, _add_file_identity, _add_tag_search, _intern_tags)
+
+_TAG_ROWS = '''SELECT files.path, tag_names.name, tag_values.value FROM files
+    LEFT JOIN file_tags ON files.id = file_tags.file
+    LEFT JOIN tag_names ON tag_names.id = file_tags.tag
+    LEFT JOIN tag_values ON tag_values.id = file_tags.value'''
+
+_FILE_COLUMNS = 'path, modification_time AS "mtime [timestamp]", size, inode'
 
-class SqliteAudioFileDatabase(TagProvider, TagDatabase):
 
-    def __init__(self, db_path: os.PathLike | str):
+def _file_info(row: tuple) -> FileInfo:
+    path, mtime, size, inode = row
+    return FileInfo(Path(path), mtime, size=size, inode=inode)
+
+
+def _group_tags(rows: Iterable[tuple[str, str | None, str | None]]) -> Iterator[tuple[str, Tags]]:
+    """Group (path, tag, value) rows, sorted by path, into tags per path.
+
+    A file without tags is represented by a single row with tag `None` (from a left join).
+    """
+    for path, path_rows in itertools.groupby(rows, key=operator.itemgetter(0)):
+        tags = {}
+        for _, tag, value in path_rows:
+            if tag is not None:
+                tags.setdefault(tag, []).append(value)
+        yield path, tags
+
+
+class SqliteAudioFileDatabase(TagProvider, TagDatabase, DirectoryDatabase):
+    """Tag database in an SQLite file.
+
+    Bulk operations hand rows to SQLite in batches of `batch_size` files. `add_or_update_many` commits
+    after each batch, so that an interrupted scan keeps its progress without syncing every single file;
+    `remove_files` runs in a single transaction. With `wal=True`, the database uses write-ahead logging
+    with relaxed syncing, which is considerably faster for large updates and still safe against
+    corruption (a crash may only lose the most recent transactions).
+    """
+
+    def __init__(self, db_path: os.PathLike | str, batch_size: int = 500, wal: bool = False):
+        if batch_size < 1:
+            raise ValueError(f'batch size must be positive, got {batch_size}')
         self.db_path = db_path
-        self._connection = sqlite3.connect(db_path)
+        self.batch_size = batch_size
+        self._connection = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_COLNAMES)
+        self._configure(wal)
+
+    def _configure(self, wal: bool):
+        conn = self._connection
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA cache_size = -32000')
+        if wal:
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
 
     def init(self):
+        """Create the database schema or migrate it to the current version."""
         conn = self._connection
-        conn.execute('''CREATE TABLE IF NOT EXISTS files(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            path TEXT UNIQUE NOT NULL,
-            modification_time TIMESTAMP NOT NULL
-            );''')
-        conn.execute('''
-        CREATE TABLE IF NOT EXISTS tags(
-            file INTEGER NOT NULL,
-            tag TEXT NOT NULL,
-            value TEXT NOT NULL,
-            FOREIGN KEY (file) REFERENCES files (id) ON DELETE CASCADE
-                     );''')
-        conn.execute('''
-        CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);''')
-        conn.commit()
+        version, = conn.execute('PRAGMA user_version').fetchone()
+        if version > len(_MIGRATIONS):
+            raise ValueError(f'database schema version {version} is newer than supported ({len(_MIGRATIONS)})')
+        for new_version, migrate in enumerate(_MIGRATIONS[version:], start=version + 1):
+            conn.execute('BEGIN')
+            try:
+                migrate(conn)
+                conn.execute(f'PRAGMA user_version = {new_version}')
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
 
     def add_or_update(self, file: FileInfo, tags: Tags):
+        self.add_or_update_many([(file, tags)])
+
+    def add_or_update_many(self, files: Iterable[tuple[FileInfo, Tags]]):
+        for batch in batched(files, self.batch_size):
+            with self._connection:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch: Iterable[tuple[FileInfo, Tags]]):
         cursor = self._connection.cursor()
-        cursor.execute('SELECT id, modification_time as "mtime [timestamp]" FROM files WHERE path=?',
-                       (str(file.path),))
-        ans = cursor.fetchone()
-        if ans is None:
-            cursor.execute('INSERT INTO files(path, modification_time) VALUES (?, ?)',
-                           (str(file.path), file.mtime))
-            file_id = cursor.lastrowid
-            cursor.executemany('INSERT INTO tags(file, tag, value) VALUES(?, ?, ?)',
-                               [(file_id, tag, value) for tag, values in tags.items() for value in values])
-        else:
-            file_id, mtime = ans
-            cursor.execute('UPDATE files SET modification_time=? WHERE id=?', (mtime, file_id))
-            cursor.execute('DELETE FROM tags WHERE file=?', (file_id,))
-            cursor.executemany('INSERT INTO tags(file, tag, value) VALUES(?, ?, ?)',
-                               [(file_id, tag, value) for tag, values in tags.items() for value in values])
-        self._connection.commit()
+        tag_rows = []
+        file_ids = []
+        for file, tags in batch:
+            cursor.execute('''INSERT INTO files(path, modification_time, size, inode) VALUES (?, ?, ?, ?)
+                              ON CONFLICT (path) DO UPDATE SET modification_time=excluded.modification_time,
+                                size=excluded.size, inode=excluded.inode
+                              RETURNING id''',
+                           (str(file.path), file.mtime, file.size, file.inode))
+            file_id, = cursor.fetchone()
+            file_ids.append((file_id,))
+            tag_rows.extend((file_id, tag, value) for tag, values in tags.items() for value in values)
+        tag_ids = self._intern(cursor, 'tag_names', 'name', {tag for _, tag, _ in tag_rows})
+        value_ids = self._intern(cursor, 'tag_values', 'value', {value for _, _, value in tag_rows})
+        cursor.executemany('DELETE FROM file_tags WHERE file=?', file_ids)
+        cursor.executemany('INSERT INTO file_tags(file, tag, value) VALUES(?, ?, ?)',
+                           ((file_id, tag_ids[tag], value_ids[value]) for file_id, tag, value in tag_rows))
+
+    def _intern(self, cursor: sqlite3.Cursor, table: str, column: str, strings: set[str]) -> dict[str, int]:
+        """Add the strings to a lookup table (unless already present) and return their ids."""
+        cursor.executemany(f'INSERT OR IGNORE INTO {table}({column}) VALUES (?)', ((string,) for string in strings))
+        ids = {}
+        for batch in batched(strings, self.batch_size):
+            cursor.execute(f'SELECT {column}, id FROM {table} WHERE {column} IN ({", ".join("?" * len(batch))})',
+                           batch)
+            ids.update(cursor)
+        return ids
 
     def remove_file(self, path: Path):
+        self.remove_files([path])
+
+    def remove_files(self, paths: Iterable[Path]):
         with self._connection as c:
-            c.execute('DELETE FROM files WHERE path = ?', (str(path),))
+            c.executemany('DELETE FROM files WHERE path = ?', ((str(path),) for path in paths))
 
     def get_tags(self, path: Path) -> Tags | None:
-        tags = {}
         result = self._connection.execute(
-            'SELECT tag, value FROM files LEFT JOIN tags ON files.id = tags.file WHERE files.path = ?',
+            f'{_TAG_ROWS} WHERE files.path = ? ORDER BY file_tags.rowid',
             (str(path),))
-        db_tags = result.fetchall()
-        if db_tags is None or len(db_tags) == 0:
-            return None
-        if len(db_tags) == 1 and db_tags[0][0] is None:
-            return {}
-        for tag, value in db_tags:
-            if tag not in tags:
-                tags[tag] = []
-            tags[tag].append(value)
-        return tags
-
-    def get_files(self) -> Iterable[FileInfo]:
-        result = self._connection.execute('SELECT path, modification_time AS "mtime [timestamp]" FROM files;')
-        return (FileInfo(path, mtime) for path, mtime in result.fetchall())
+        for _, tags in _group_tags(result):
+            return tags
+        return None
+
+    def get_tags_many(self, paths: Iterable[Path]) -> Iterator[tuple[Path, Tags | None]]:
+        """Get the tags of several files, in the order of `paths`, with one query per batch of paths.
+
+        Like for `get_tags`, the tags are `None` for files not in the database.
+        """
+        for batch in batched(paths, self.batch_size):
+            result = self._connection.execute(
+                f'''{_TAG_ROWS} WHERE files.path IN ({', '.join('?' * len(batch))})
+                    ORDER BY files.path, file_tags.rowid''',
+                [str(path) for path in batch])
+            tags_by_path = dict(_group_tags(result))
+            for path in batch:
+                yield path, tags_by_path.get(str(path))
+
+    def iter_all_tags(self) -> Iterator[tuple[Path, Tags]]:
+        """Iterate over all files and their tags, sorted by path, in a single query.
+
+        The database must not be modified while iterating.
+        """
+        result = self._connection.execute(
+            f'{_TAG_ROWS} ORDER BY files.path, file_tags.rowid')
+        for path, tags in _group_tags(result):
+            yield Path(path), tags
+
+    def get_files(self, path: Path | None = None) -> Iterable[FileInfo]:
+        if path is None:
+            condition, parameters = '1', ()
+        else:
+            lower, upper = _subtree_range(path)
+            condition, parameters = '(path = ? OR (path >= ? AND path < ?))', (str(path), lower, upper)
+        # page through the files instead of keeping a cursor open, so that the table can be modified during
+        # iteration; rows before the current position do not affect the result
+        last_path = ''
+        while True:
+            rows = self._connection.execute(
+                f'''SELECT {_FILE_COLUMNS} FROM files
+                    WHERE path > ? AND {condition} ORDER BY path LIMIT ?''',
+                (last_path, *parameters, self.batch_size)).fetchall()
+            if len(rows) == 0:
+                return
+            for row in rows:
+                yield _file_info(row)
+            last_path = rows[-1][0]
+
+    def get_files_in_directory(self, directory: Path) -> Iterable[FileInfo]:
+        lower, upper = _subtree_range(directory)
+        result = self._connection.execute(
+            f'''SELECT {_FILE_COLUMNS} FROM files
+                WHERE path >= ? AND path < ? AND instr(substr(path, ?), ?) = 0''',
+            (lower, upper, len(lower) + 1, os.sep))
+        return [_file_info(row) for row in result]
+
+    def get_directories(self, root: Path) -> Mapping[Path, int]:
+        lower, upper = _subtree_range(root)
+        result = self._connection.execute(
+            'SELECT path, modification_time FROM directories WHERE path = ? OR (path >= ? AND path < ?)',
+            (str(root), lower, upper))
+        return {Path(path): mtime for path, mtime in result}
+
+    def set_directories(self, root: Path, directories: Mapping[Path, int]):
+        lower, upper = _subtree_range(root)
+        with self._connection as c:
+            c.execute('DELETE FROM directories WHERE path = ? OR (path >= ? AND path < ?)',
+                      (str(root), lower, upper))
+            c.executemany('INSERT INTO directories(path, modification_time) VALUES (?, ?)',
+                          ((str(path), mtime) for path, mtime in directories.items()))
+
+    def get_last_full_scan(self, root: Path) -> datetime | None:
+        result = self._connection.execute('SELECT time AS "time [timestamp]" FROM full_scans WHERE root = ?',
+                                          (str(root),)).fetchone()
+        return None if result is None else result[0]
+
+    def set_last_full_scan(self, root: Path, time: datetime):
+        with self._connection as c:
+            c.execute('INSERT OR REPLACE INTO full_scans(root, time) VALUES (?, ?)', (str(root), time))
+
+    def get_files_with_identity(self, file: FileInfo) -> Iterable[FileInfo]:
+        if file.inode is None or file.size is None:
+            return []
+        result = self._connection.execute(
+            f'''SELECT {_FILE_COLUMNS} FROM files
+                WHERE inode = ? AND size = ? AND modification_time = ? AND path != ?''',
+            (file.inode, file.size, file.mtime, str(file.path)))
+        return [_file_info(row) for row in result]
+
+    def move_files(self, moves: Iterable[tuple[Path, FileInfo]]):
+        with self._connection as c:
+            c.executemany('''UPDATE files SET path = ?, modification_time = ?, size = ?, inode = ?
+                             WHERE path = ?''',
+                          ((str(file.path), file.mtime, file.size, file.inode, str(old_path))
+                           for old_path, file in moves))
+
+    def query(self, value: str, tag: str | None = None, match: TagMatch = TagMatch.EXACT) -> Iterator[FileInfo]:
+        """Find files with a tag value matching `value`, optionally restricted to the given tag.
+
+        Results are sorted by path.
+        """
+        match match:
+            case TagMatch.EXACT:
+                values, parameters = 'SELECT id FROM tag_values WHERE value = ?', (value,)
+            case TagMatch.PREFIX:
+                if value == '':
+                    values, parameters = 'SELECT id FROM tag_values', ()
+                else:
+                    values = 'SELECT id FROM tag_values WHERE value >= ? AND value < ?'
+                    parameters = (value, _prefix_upper_bound(value))
+            case TagMatch.FULLTEXT:
+                if len(value.split()) == 0:
+                    raise ValueError('full-text query must contain at least one word')
+                values = 'SELECT rowid FROM tag_values_fts WHERE tag_values_fts MATCH ?'
+                parameters = (_fulltext_query(value),)
+            case _:
+                raise ValueError(f'unsupported match type {match}')
+        condition = f'value IN ({values})'
+        if tag is not None:
+            condition = f'tag = (SELECT id FROM tag_names WHERE name = ?) AND {condition}'
+            parameters = (tag, *parameters)
+        result = self._connection.execute(
+            f'''SELECT {_FILE_COLUMNS} FROM files WHERE id IN (SELECT file FROM file_tags WHERE {condition})
+                ORDER BY path''',
+            parameters)
+        for row in result:
+            yield _file_info(row)
+
+    def get_tag_values(self, tag: str) -> list[str]:
+        """All distinct values of the given tag (e.g. MUSICBRAINZ_ALBUMID) in the database, sorted."""
+        result = self._connection.execute(
+            '''SELECT value FROM tag_values WHERE id IN (
+                SELECT value FROM file_tags WHERE tag = (SELECT id FROM tag_names WHERE name = ?))
+               ORDER BY value''',
+            (tag,))
+        return [value for value, in result]
+
+    def remove_unused_tag_values(self):
+        """Remove tag values that are not used by any file anymore.
+
+        Values are not removed together with the files using them, so that re-adding a file is cheap.
+        """
+        with self._connection as c:
+            c.execute('DELETE FROM tag_values WHERE id NOT IN (SELECT value FROM file_tags)')
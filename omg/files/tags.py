@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from enum import Enum
 from pathlib import Path
 from typing import Mapping, Sequence
 
@@ -10,3 +11,11 @@ class TagProvider(ABC):
     @abstractmethod
     def get_tags(self, path: Path) -> Tags:
         raise NotImplementedError()
+
+
+class TagMatch(Enum):
+    """How a query matches tag values."""
+    EXACT = 'exact'
+    PREFIX = 'prefix'
+    FULLTEXT = 'fulltext'
+    """All words of the query occur in the value (case and diacritics insensitive)."""
@@ -0,0 +1,32 @@
+import shutil
+import sqlite3
+
+import pytest
+from click.testing import CliRunner
+
+import omg.files.cli  # noqa: F401 (registers the files commands)
+from omg.cli import cli
+
+
+def journal_mode(db_path) -> str:
+    connection = sqlite3.connect(db_path)
+    try:
+        mode, = connection.execute('PRAGMA journal_mode').fetchone()
+        return mode
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize('options, expected_mode', [([], 'wal'), (['--no-wal'], 'delete')])
+def test_update_uses_write_ahead_logging_by_default(tmp_path, testdata, options, expected_mode):
+    library = tmp_path / 'library'
+    library.mkdir()
+    shutil.copy(testdata / 'r2.mp3', library / 'a.mp3')
+    db_path = tmp_path / 'omg.sqlite'
+
+    result = CliRunner().invoke(cli, ['files', '--db', str(db_path), *options, 'update', str(library)])
+
+    assert result.exit_code == 0, result.output
+    assert journal_mode(db_path) == expected_mode
+    result = CliRunner().invoke(cli, ['files', '--db', str(db_path), 'query', '--prefix', ''])
+    assert result.output.splitlines() == [str(library / 'a.mp3')]
@@ -0,0 +1,166 @@
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+import taglib
+
+from omg.files import FileInfo
+from omg.files.db_updater import DatabaseUpdater, diff_files, FileChange
+from omg.files.filesystem import FilesystemTagProvider
+from omg.files.sqlite import SqliteAudioFileDatabase, _MIGRATIONS
+from omg.files.walker import FilesystemAudioFileWalker
+
+
+@pytest.fixture
+def library(testdata, tmp_path):
+    for i in range(12):
+        directory = tmp_path / f'album{i % 3}'
+        directory.mkdir(exist_ok=True)
+        target = directory / f'track{i}.mp3'
+        shutil.copy(testdata / 'r2.mp3', target)
+        with taglib.File(target, save_on_exit=True) as file:
+            file.tags['TITLE'] = [f'title {i}']
+    return tmp_path
+
+
+def db_contents(db: SqliteAudioFileDatabase):
+    return {file.path: db.get_tags(file.path) for file in db.get_files()}
+
+
+def run_update(root, **kwargs):
+    db = SqliteAudioFileDatabase(':memory:')
+    db.init()
+    DatabaseUpdater(db, FilesystemTagProvider(root), FilesystemAudioFileWalker(root), **kwargs).update()
+    return db
+
+
+def test_update_adds_all_files(library):
+    db = run_update(library)
+    contents = db_contents(db)
+    assert len(contents) == 12
+    assert contents[library / 'album1' / 'track4.mp3']['TITLE'] == ['title 4']
+
+
+@pytest.mark.parametrize('use_processes', [True, False])
+def test_parallel_update_equals_serial(library, use_processes):
+    serial = run_update(library)
+    parallel = run_update(library, jobs=3, use_processes=use_processes)
+    assert db_contents(parallel) == db_contents(serial)
+
+
+def test_invalid_number_of_jobs(library):
+    with pytest.raises(ValueError):
+        run_update(library, jobs=0)
+
+
+def file_info(path: str, day: int = 1):
+    return FileInfo(Path(path), datetime(2023, 1, day))
+
+
+def test_diff_files():
+    db_files = [file_info('/a.mp3'), file_info('/b.mp3'), file_info('/c.mp3'), file_info('/e.mp3')]
+    fs_files = [file_info('/b.mp3', day=2), file_info('/c.mp3'), file_info('/d.mp3')]
+
+    changes = list(diff_files(db_files, fs_files))
+
+    assert changes == [(FileChange.DELETED, db_files[0]), (FileChange.MODIFIED, fs_files[0]),
+                       (FileChange.UNCHANGED, fs_files[1]), (FileChange.NEW, fs_files[2]),
+                       (FileChange.DELETED, db_files[3])]
+
+
+def test_diff_files_requires_sorted_input():
+    with pytest.raises(ValueError):
+        list(diff_files([], [file_info('/b.mp3'), file_info('/a.mp3')]))
+
+
+def test_walker_and_database_use_same_order(tmp_path):
+    for name in ('a b/1.mp3', 'a/1.mp3', 'a-b.mp3', 'a/b/1.mp3', 'a/c.mp3', 'B.mp3', 'ä.mp3'):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).touch()
+    walker = FilesystemAudioFileWalker(tmp_path)
+    db = SqliteAudioFileDatabase(':memory:', batch_size=2)
+    db.init()
+    walked = list(walker.get_files())
+
+    db.add_or_update_many((file, {}) for file in reversed(walked))
+
+    assert [str(file.path) for file in walked] == sorted(str(file.path) for file in walked)
+    assert list(db.get_files()) == walked
+
+
+def test_update_in_small_batches(library):
+    db = run_update(library)
+    db.batch_size = 2
+    for path in (library / 'album0').iterdir():
+        path.unlink()
+    shutil.copy(library / 'album1' / 'track1.mp3', library / 'album1' / 'new.mp3')
+
+    DatabaseUpdater(db, FilesystemTagProvider(library), FilesystemAudioFileWalker(library)).update()
+
+    assert db_contents(db) == db_contents(run_update(library))
+
+
+class CountingTagProvider(FilesystemTagProvider):
+    def __init__(self, root):
+        super().__init__(root)
+        self.scanned = []
+
+    def get_tags(self, path):
+        self.scanned.append(path)
+        return super().get_tags(path)
+
+
+def test_moved_files_keep_tags(library):
+    db = run_update(library)
+    original = db_contents(db)
+    (library / 'album1').rename(library / 'renamed')
+    (library / 'album2' / 'track2.mp3').rename(library / 'album0' / 'moved.mp3')
+
+    tag_provider = CountingTagProvider(library)
+    DatabaseUpdater(db, tag_provider, FilesystemAudioFileWalker(library)).update()
+
+    assert tag_provider.scanned == []
+    contents = db_contents(db)
+    assert len(contents) == 12
+    assert contents[library / 'renamed' / 'track4.mp3'] == original[library / 'album1' / 'track4.mp3']
+    assert contents[library / 'album0' / 'moved.mp3'] == original[library / 'album2' / 'track2.mp3']
+
+
+def test_copied_file_is_scanned(library):
+    db = run_update(library)
+    copy = library / 'album0' / 'copy.mp3'
+    os.link(library / 'album0' / 'track0.mp3', copy)
+
+    tag_provider = CountingTagProvider(library)
+    DatabaseUpdater(db, tag_provider, FilesystemAudioFileWalker(library)).update()
+
+    assert tag_provider.scanned == [copy]
+    assert len(db_contents(db)) == 13
+
+
+def test_update_after_migration_stores_identity_without_scanning(library, tmp_path):
+    db_path = tmp_path / 'v1.sqlite'
+    conn = sqlite3.connect(db_path)
+    _MIGRATIONS[0](conn)
+    conn.execute('PRAGMA user_version = 1')
+    for i, path in enumerate(sorted(library.rglob('*.mp3')), start=1):
+        conn.execute('INSERT INTO files(id, path, modification_time) VALUES (?, ?, ?)',
+                     (i, str(path), datetime.fromtimestamp(path.stat().st_mtime)))
+        conn.execute("INSERT INTO tags(file, tag, value) VALUES (?, 'TITLE', 'old title')", (i,))
+    conn.commit()
+    conn.close()
+    db = SqliteAudioFileDatabase(db_path)
+    db.init()
+
+    tag_provider = CountingTagProvider(library)
+    DatabaseUpdater(db, tag_provider, FilesystemAudioFileWalker(library)).update()
+
+    assert tag_provider.scanned == []
+    assert all(file.size is not None and file.inode is not None for file in db.get_files())
+    assert all(tags == {'TITLE': ['old title']} for tags in db_contents(db).values())
+    (library / 'album0' / 'track0.mp3').rename(library / 'album1' / 'moved.mp3')
+    DatabaseUpdater(db, tag_provider, FilesystemAudioFileWalker(library)).update()
+    assert tag_provider.scanned == []
@@ -1,10 +1,12 @@
+import sqlite3
 from datetime import datetime
 
 import pytest
 from taglib import Path
 
 from omg.files import FileInfo
-from omg.files.sqlite import SqliteAudioFileDatabase
+from omg.files.sqlite import SqliteAudioFileDatabase, _MIGRATIONS
+from omg.files.tags import TagMatch
 
 
 @pytest.fixture
@@ -62,3 +64,180 @@ def test_remove(memory_db):
     assert memory_db.get_tags(info_1.path) is None
     assert memory_db.get_tags(info_2.path) == tags_2
     assert len(list(memory_db.get_files())) == 1
+
+
+def test_update_changes_modification_time(memory_db):
+    info = FileInfo(path=Path('/a/test.mp3'), mtime=datetime(2023, 9, 25, 16, 19))
+    memory_db.add_or_update(info, {})
+    updated = FileInfo(path=info.path, mtime=datetime(2023, 10, 1, 12, 0))
+    memory_db.add_or_update(updated, {})
+    assert list(memory_db.get_files()) == [updated]
+
+
+@pytest.mark.parametrize('batch_size', [1, 3, 500])
+def test_add_or_update_many(batch_size):
+    db = SqliteAudioFileDatabase(':memory:', batch_size=batch_size)
+    db.init()
+    files = [(FileInfo(Path(f'/{i}.flac'), datetime(2023, 1, 1 + i)), {'title': [f'title {i}']}) for i in range(10)]
+    db.add_or_update_many(files)
+    db.add_or_update_many([(files[2][0], {'title': ['new title'], 'album': ['album']})])
+
+    assert len(list(db.get_files())) == 10
+    assert db.get_tags(Path('/1.flac')) == {'title': ['title 1']}
+    assert db.get_tags(Path('/2.flac')) == {'title': ['new title'], 'album': ['album']}
+
+
+def test_add_or_update_many_rolls_back_incomplete_batch_on_error(memory_db):
+    memory_db.batch_size = 2
+    infos = [FileInfo(Path(f'/{i}.flac'), datetime(2023, 1, 1)) for i in range(3)]
+
+    def files():
+        for info in infos:
+            yield info, {'title': ['title']}
+        raise RuntimeError()
+
+    with pytest.raises(RuntimeError):
+        memory_db.add_or_update_many(files())
+    assert list(memory_db.get_files()) == infos[:2]
+    assert not memory_db._connection.in_transaction
+
+
+def test_remove_files_deletes_tags(memory_db):
+    infos = [FileInfo(Path(f'/{i}.flac'), datetime(2023, 1, 1)) for i in range(3)]
+    memory_db.add_or_update_many((info, {'artist': ['Bob Dylan']}) for info in infos)
+
+    memory_db.remove_files(info.path for info in infos[:2])
+
+    assert list(memory_db.get_files()) == infos[2:]
+    remaining_tag_rows = memory_db._connection.execute('SELECT COUNT(*) FROM file_tags').fetchone()[0]
+    assert remaining_tag_rows == 1
+
+
+def test_migrate_unversioned_database(tmp_path):
+    db_path = tmp_path / 'old.sqlite'
+    conn = sqlite3.connect(db_path)
+    conn.execute('CREATE TABLE files(id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT UNIQUE NOT NULL, '
+                 'modification_time TIMESTAMP NOT NULL)')
+    conn.execute('CREATE TABLE tags(file INTEGER NOT NULL, tag TEXT NOT NULL, value TEXT NOT NULL, '
+                 'FOREIGN KEY (file) REFERENCES files (id) ON DELETE CASCADE)')
+    conn.execute("INSERT INTO files(path, modification_time) VALUES ('/a.mp3', '2023-09-25 16:19:00')")
+    conn.execute("INSERT INTO tags(file, tag, value) VALUES (1, 'title', 'a title')")
+    conn.commit()
+    conn.close()
+
+    db = SqliteAudioFileDatabase(db_path)
+    db.init()
+    db.init()
+
+    assert list(db.get_files()) == [FileInfo(Path('/a.mp3'), datetime(2023, 9, 25, 16, 19))]
+    assert db.get_tags(Path('/a.mp3')) == {'title': ['a title']}
+    info = FileInfo(Path('/a.mp3'), datetime(2023, 9, 25, 16, 19), size=100, inode=1234)
+    db.add_or_update(info, {})
+    assert list(db.get_files()) == [info]
+
+
+def test_migrate_to_interned_tags(tmp_path):
+    db_path = tmp_path / 'v3.sqlite'
+    conn = sqlite3.connect(db_path)
+    for migrate in _MIGRATIONS[:3]:
+        migrate(conn)
+    conn.execute('PRAGMA user_version = 3')
+    conn.execute("INSERT INTO files(path, modification_time) VALUES ('/a.mp3', '2023-09-25 16:19:00')")
+    conn.execute("INSERT INTO files(path, modification_time) VALUES ('/b.mp3', '2023-09-25 16:19:00')")
+    conn.executemany('INSERT INTO tags(file, tag, value) VALUES (?, ?, ?)',
+                     [(1, 'ARTIST', 'Yes'), (1, 'TITLE', 'Roundabout'), (1, 'ARTIST', 'Anderson'),
+                      (2, 'ARTIST', 'Yes')])
+    conn.commit()
+    conn.close()
+
+    db = SqliteAudioFileDatabase(db_path)
+    db.init()
+
+    assert db.get_tags(Path('/a.mp3')) == {'ARTIST': ['Yes', 'Anderson'], 'TITLE': ['Roundabout']}
+    assert db.get_tags(Path('/b.mp3')) == {'ARTIST': ['Yes']}
+    assert db._connection.execute('SELECT COUNT(*) FROM tag_values').fetchone()[0] == 3
+    assert [str(file.path) for file in db.query('roundabout', match=TagMatch.FULLTEXT)] == ['/a.mp3']
+
+
+def test_remove_unused_tag_values(memory_db):
+    memory_db.add_or_update(FileInfo(Path('/a.mp3'), datetime(2023, 1, 1)),
+                            {'ARTIST': ['Yes'], 'TITLE': ['Siberian Khatru']})
+    memory_db.add_or_update(FileInfo(Path('/a.mp3'), datetime(2023, 1, 2)), {'ARTIST': ['Yes']})
+
+    memory_db.remove_unused_tag_values()
+
+    assert [value for value, in memory_db._connection.execute('SELECT value FROM tag_values')] == ['Yes']
+    assert list(memory_db.query('khatru', match=TagMatch.FULLTEXT)) == []
+
+
+@pytest.fixture
+def query_db(memory_db):
+    memory_db.add_or_update_many([
+        (FileInfo(Path('/1.flac'), datetime(2023, 1, 1)), {'ARTIST': ['Martha Argerich'], 'TITLE': ['Piano Concerto']}),
+        (FileInfo(Path('/2.flac'), datetime(2023, 1, 1)), {'ARTIST': ['Argerich'], 'ALBUM': ['Dvořák']}),
+        (FileInfo(Path('/3.flac'), datetime(2023, 1, 1)), {'ARTIST': ['Arrau'], 'TITLE': ['Argerich']}),
+    ])
+    return memory_db
+
+
+def query_paths(db, value, **kwargs):
+    return [str(file.path) for file in db.query(value, **kwargs)]
+
+
+def test_query_exact(query_db):
+    assert query_paths(query_db, 'Argerich', tag='ARTIST') == ['/2.flac']
+    assert query_paths(query_db, 'Argerich') == ['/2.flac', '/3.flac']
+
+
+def test_query_prefix(query_db):
+    assert query_paths(query_db, 'Ar', tag='ARTIST', match=TagMatch.PREFIX) == ['/2.flac', '/3.flac']
+    assert query_paths(query_db, 'Piano', match=TagMatch.PREFIX) == ['/1.flac']
+
+
+def test_query_fulltext(query_db):
+    assert query_paths(query_db, 'argerich', tag='ARTIST', match=TagMatch.FULLTEXT) == ['/1.flac', '/2.flac']
+    assert query_paths(query_db, 'concerto PIANO', match=TagMatch.FULLTEXT) == ['/1.flac']
+    assert query_paths(query_db, 'dvorak', match=TagMatch.FULLTEXT) == ['/2.flac']
+    assert query_paths(query_db, '"quoted" OR', match=TagMatch.FULLTEXT) == []
+
+
+def test_query_fulltext_follows_updates(query_db):
+    query_db.add_or_update(FileInfo(Path('/1.flac'), datetime(2023, 1, 2)), {'ARTIST': ['Daniel Barenboim']})
+    query_db.remove_file(Path('/2.flac'))
+
+    assert query_paths(query_db, 'argerich', match=TagMatch.FULLTEXT) == ['/3.flac']
+    assert query_paths(query_db, 'barenboim', match=TagMatch.FULLTEXT) == ['/1.flac']
+
+
+def test_get_tags_many(query_db):
+    query_db.add_or_update(FileInfo(Path('/4.flac'), datetime(2023, 1, 1)), {})
+    paths = [Path('/3.flac'), Path('/missing.flac'), Path('/4.flac'), Path('/1.flac')]
+
+    result = list(query_db.get_tags_many(paths))
+
+    assert result == [(path, query_db.get_tags(path)) for path in paths]
+    assert result[1] == (Path('/missing.flac'), None)
+    assert result[2] == (Path('/4.flac'), {})
+
+
+def test_get_tags_many_in_batches(query_db):
+    query_db.batch_size = 2
+    paths = [Path(f'/{i}.flac') for i in (3, 2, 1)]
+    assert list(query_db.get_tags_many(paths)) == [(path, query_db.get_tags(path)) for path in paths]
+
+
+def test_iter_all_tags(query_db):
+    query_db.add_or_update(FileInfo(Path('/0.flac'), datetime(2023, 1, 1)), {})
+
+    result = list(query_db.iter_all_tags())
+
+    assert [path for path, _ in result] == [Path(f'/{i}.flac') for i in range(4)]
+    assert result[0][1] == {}
+    assert result == [(file.path, query_db.get_tags(file.path)) for file in query_db.get_files()]
+
+
+def test_get_tag_values(query_db):
+    query_db.add_or_update(FileInfo(Path('/4.flac'), datetime(2023, 1, 1)), {'ARTIST': ['Arrau', 'Argerich']})
+
+    assert query_db.get_tag_values('ARTIST') == ['Argerich', 'Arrau', 'Martha Argerich']
+    assert query_db.get_tag_values('MUSICBRAINZ_ALBUMID') == []
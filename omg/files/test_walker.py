@@ -1,8 +1,13 @@
+import os
+from datetime import datetime, timedelta
 from pathlib import Path
 
 import pytest
 
-from omg.files.walker import FilesystemAudioFileWalker
+from omg.files.db_updater import DatabaseUpdater
+from omg.files.sqlite import SqliteAudioFileDatabase
+from omg.files.tags import TagProvider, Tags
+from omg.files.walker import FilesystemAudioFileWalker, IncrementalAudioFileWalker
 
 
 @pytest.mark.parametrize('ext', ['.mp3', '.mp4', '.flac', '.ogg'])
@@ -15,3 +20,108 @@ def test_is_audio_file(ext):
 def test_is_no_audio_file(ext):
     test_path = Path(f'file{ext}')
     assert not FilesystemAudioFileWalker.is_audio_file(test_path)
+
+
+class EmptyTagProvider(TagProvider):
+    def get_tags(self, path: Path) -> Tags:
+        return {}
+
+
+@pytest.fixture
+def library(tmp_path):
+    for album in ('a', 'b', 'c/d'):
+        (tmp_path / album).mkdir(parents=True)
+        for track in range(3):
+            (tmp_path / album / f'{track}.mp3').touch()
+    (tmp_path / 'b' / 'cover.jpg').touch()
+    return tmp_path
+
+
+@pytest.fixture
+def memory_db():
+    db = SqliteAudioFileDatabase(':memory:')
+    db.init()
+    return db
+
+
+class CountingWalker(IncrementalAudioFileWalker):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.scanned_directories = []
+
+    def _list_directory(self, directory):
+        self.scanned_directories.append(directory)
+        return super()._list_directory(directory)
+
+
+def update(root, db, **kwargs) -> CountingWalker:
+    walker = CountingWalker(root, db, **kwargs)
+    DatabaseUpdater(db, EmptyTagProvider(), walker).update()
+    return walker
+
+
+def paths(db):
+    return {file.path for file in db.get_files()}
+
+
+def test_walker_finds_audio_files(library):
+    files = list(FilesystemAudioFileWalker(library).get_files())
+    assert len(files) == 9
+    assert library / 'c' / 'd' / '2.mp3' in {file.path for file in files}
+
+
+def test_incremental_walk_skips_unchanged_directories(library, memory_db):
+    first = update(library, memory_db)
+    assert len(first.scanned_directories) == 5
+    assert len(paths(memory_db)) == 9
+
+    second = update(library, memory_db)
+    assert second.scanned_directories == []
+    assert len(paths(memory_db)) == 9
+
+
+def test_incremental_walk_detects_new_and_deleted_files(library, memory_db):
+    update(library, memory_db)
+    (library / 'c' / 'd' / 'new.flac').touch()
+    (library / 'a' / '0.mp3').unlink()
+
+    walker = update(library, memory_db)
+
+    assert set(walker.scanned_directories) == {library / 'a', library / 'c' / 'd'}
+    assert library / 'c' / 'd' / 'new.flac' in paths(memory_db)
+    assert library / 'a' / '0.mp3' not in paths(memory_db)
+    assert len(paths(memory_db)) == 9
+
+
+def test_incremental_walk_detects_deleted_directory(library, memory_db):
+    update(library, memory_db)
+    for file in (library / 'c' / 'd').iterdir():
+        file.unlink()
+    (library / 'c' / 'd').rmdir()
+
+    update(library, memory_db)
+
+    assert len(paths(memory_db)) == 6
+
+
+def test_in_place_modification_requires_full_scan(library, memory_db):
+    update(library, memory_db)
+    modified = library / 'b' / '1.mp3'
+    mtime = datetime(2030, 1, 1)
+    os.utime(modified, (mtime.timestamp(), mtime.timestamp()))
+
+    update(library, memory_db)
+    assert {file.path: file.mtime for file in memory_db.get_files()}[modified] < mtime
+
+    full = update(library, memory_db, force_full_scan=True)
+    assert len(full.scanned_directories) == 5
+    assert {file.path: file.mtime for file in memory_db.get_files()}[modified] == mtime
+
+
+def test_full_scan_after_interval(library, memory_db):
+    update(library, memory_db)
+    memory_db.set_last_full_scan(library, datetime.now() - timedelta(days=2))
+
+    assert update(library, memory_db, full_scan_interval=timedelta(days=3)).scanned_directories == []
+    assert len(update(library, memory_db, full_scan_interval=timedelta(days=1)).scanned_directories) == 5
+    assert update(library, memory_db, full_scan_interval=None).scanned_directories == []
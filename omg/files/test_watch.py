@@ -0,0 +1,117 @@
+import shutil
+import threading
+
+import pytest
+import taglib
+
+from omg.files.db_updater import DatabaseUpdater, outermost_paths
+from omg.files.filesystem import FilesystemTagProvider
+from omg.files.sqlite import SqliteAudioFileDatabase
+from omg.files.walker import IncrementalAudioFileWalker
+from omg.files.watch import InotifyWatcher, FileWatcher, _load_libc, watch
+
+requires_inotify = pytest.mark.skipif(_load_libc() is None, reason='inotify not available')
+
+
+@pytest.fixture
+def library(tmp_path):
+    (tmp_path / 'album').mkdir()
+    (tmp_path / 'album' / 'a.mp3').touch()
+    return tmp_path
+
+
+@pytest.fixture
+def updater(library, testdata):
+    db = SqliteAudioFileDatabase(':memory:')
+    db.init()
+    shutil.copy(testdata / 'r2.mp3', library / 'album' / 'a.mp3')
+    updater = DatabaseUpdater(db, FilesystemTagProvider(library), IncrementalAudioFileWalker(library, db))
+    updater.update()
+    return updater
+
+
+def test_outermost_paths(tmp_path):
+    paths = [tmp_path / 'a' / 'b', tmp_path / 'a', tmp_path / 'c' / 'd.mp3', tmp_path / 'ab', tmp_path / 'a']
+    assert outermost_paths(paths) == [tmp_path / 'a', tmp_path / 'ab', tmp_path / 'c' / 'd.mp3']
+
+
+def test_update_paths(library, updater, testdata):
+    (library / 'other').mkdir()
+    shutil.copy(testdata / 'r2.mp3', library / 'other' / 'b.mp3')
+    shutil.copy(testdata / 'r2.mp3', library / 'other' / 'c.mp3')
+    shutil.copy(testdata / 'r2.mp3', library / 'album' / 'd.mp3')
+    (library / 'album' / 'a.mp3').unlink()
+
+    updater.update([library / 'other' / 'b.mp3', library / 'album' / 'a.mp3'])
+
+    assert [file.path for file in updater.db.get_files()] == [library / 'other' / 'b.mp3']
+
+    updater.update([library / 'album', library / 'other'])
+
+    assert [file.path for file in updater.db.get_files()] == [
+        library / 'album' / 'd.mp3', library / 'other' / 'b.mp3', library / 'other' / 'c.mp3']
+
+
+class ListWatcher(FileWatcher):
+    def __init__(self, *changes):
+        self._changes = changes
+
+    def changes(self):
+        yield from self._changes
+
+
+def test_watch_removes_unused_tag_values(library, updater):
+    path = library / 'album' / 'a.mp3'
+    with taglib.File(path, save_on_exit=True) as file:
+        file.tags['TITLE'] = ['old title']
+    watch(updater, ListWatcher({path}))
+    with taglib.File(path, save_on_exit=True) as file:
+        file.tags['TITLE'] = ['new title']
+
+    watch(updater, ListWatcher({path}))
+
+    assert updater.db.get_tag_values('TITLE') == ['new title']
+    values = [value for value, in updater.db._connection.execute('SELECT value FROM tag_values')]
+    assert 'old title' not in values
+
+
+@requires_inotify
+def test_inotify_watcher_collects_changes(library):
+    with InotifyWatcher(library, debounce=0.1) as watcher:
+        (library / 'album' / 'b.mp3').touch()
+        (library / 'album' / 'cover.jpg').touch()
+        (library / 'album' / 'a.mp3').rename(library / 'album' / 'c.mp3')
+        (library / 'new').mkdir()
+
+        assert next(watcher.changes()) == {library / 'album' / 'a.mp3', library / 'album' / 'b.mp3',
+                                           library / 'album' / 'c.mp3', library / 'new'}
+
+        # new directories are watched as well
+        (library / 'new' / 'd.flac').touch()
+        assert next(watcher.changes()) == {library / 'new' / 'd.flac'}
+
+
+@requires_inotify
+def test_inotify_watcher_follows_moved_directories(library):
+    (library / 'inner').mkdir()
+    with InotifyWatcher(library, debounce=0.1) as watcher:
+        (library / 'inner').rename(library / 'album' / 'inner')
+        assert next(watcher.changes()) == {library / 'inner', library / 'album' / 'inner'}
+
+        (library / 'album' / 'inner' / 'e.ogg').touch()
+        assert next(watcher.changes()) == {library / 'album' / 'inner' / 'e.ogg'}
+
+
+@requires_inotify
+def test_inotify_watcher_blocks_while_idle(library):
+    with InotifyWatcher(library, debounce=0.1) as watcher:
+        changes = watcher.changes()
+        result = []
+        thread = threading.Thread(target=lambda: result.append(next(changes)), daemon=True)
+        thread.start()
+        thread.join(0.3)
+        assert thread.is_alive()
+
+        (library / 'album' / 'b.mp3').touch()
+        thread.join(2)
+        assert result == [{library / 'album' / 'b.mp3'}]
@@ -1,16 +1,31 @@
+import logging
+import os
 from abc import ABC, abstractmethod
-from datetime import datetime
+from collections import defaultdict
+from collections.abc import Mapping
+from datetime import datetime, timedelta
 from pathlib import Path, PurePath
 from typing import Iterable
 
 from omg.files import FileInfo
+from omg.files.sqlite import DirectoryDatabase
+
+logger = logging.getLogger(__name__)
 
 
 class AudioFileWalker(ABC):
     @abstractmethod
-    def get_files(self) -> Iterable[FileInfo]:
+    def get_files(self, path: Path | None = None) -> Iterable[FileInfo]:
+        """Get all audio files, or those at or below `path`, sorted by their path strings."""
         raise NotImplementedError()
 
+    def commit(self):
+        """Called after the files returned by `get_files` have been fully processed."""
+        pass
+
+    def exists(self, path: Path) -> bool:
+        return path.exists()
+
 
 class FilesystemAudioFileWalker(AudioFileWalker):
 
@@ -25,7 +40,124 @@ class FilesystemAudioFileWalker(AudioFileWalker):
             raise ValueError(f'root path {root} must be a directory')
         self.root = root.resolve()
 
-    def get_files(self) -> Iterable[FileInfo]:
-        for path in self.root.glob('**/*'):
-            if self.is_audio_file(path):
-                yield FileInfo(path, datetime.fromtimestamp(path.stat().st_mtime))
+    def get_files(self, path: Path | None = None) -> Iterable[FileInfo]:
+        if path is None:
+            yield from self._walk(self.root)
+        elif path.is_dir():
+            yield from self._walk(path)
+        elif path.is_file() and self.is_audio_file(path):
+            stat = path.stat()
+            yield FileInfo(path, datetime.fromtimestamp(stat.st_mtime), size=stat.st_size, inode=stat.st_ino)
+
+    def _walk(self, directory: Path) -> Iterable[FileInfo]:
+        for path, file in self._list_directory(directory):
+            if file is None:
+                yield from self._walk(path)
+            else:
+                yield file
+
+    def _list_directory(self, directory: Path) -> list[tuple[Path, FileInfo | None]]:
+        """List the audio files (with FileInfo) and subdirectories (without) in `directory`."""
+        with os.scandir(directory) as entries:
+            result = []
+            for entry in entries:
+                path = Path(entry.path)
+                if entry.is_dir():
+                    result.append((path, None))
+                elif self.is_audio_file(path):
+                    stat = entry.stat()
+                    result.append((path, FileInfo(path, datetime.fromtimestamp(stat.st_mtime),
+                                                  size=stat.st_size, inode=stat.st_ino)))
+        return sort_entries(result)
+
+
+def sort_entries(entries: list[tuple[Path, FileInfo | None]]) -> list[tuple[Path, FileInfo | None]]:
+    """Sort directory entries such that a depth-first walk yields files sorted by their path strings.
+
+    Subdirectories are sorted by their name plus a trailing separator, which is how their contents compare
+    to the files next to them.
+    """
+    return sorted(entries, key=lambda entry: entry[0].name if entry[1] is not None else entry[0].name + os.sep)
+
+
+class IncrementalAudioFileWalker(FilesystemAudioFileWalker):
+    """Walker that only lists directories that changed since the previous walk.
+
+    The modification time of a directory changes whenever an entry is added to, removed from or
+    renamed within it. For directories with unchanged modification time, the known files are taken
+    from the database instead of the file system, so only a single `stat` per directory is needed.
+
+    In-place modifications of files do not change the directory's modification time and hence are only
+    picked up by a full scan. A full scan happens if `force_full_scan` is set, on the first walk, or if
+    the last full scan is longer than `full_scan_interval` ago (`None` disables periodic full scans).
+
+    The directory state is stored in the database on `commit()`. When only a part of the tree is walked
+    (`path` is given), that part is listed completely and the directory state is not updated.
+    """
+
+    def __init__(self, root: Path, db: DirectoryDatabase, full_scan_interval: timedelta | None = timedelta(days=7),
+                 force_full_scan: bool = False):
+        super().__init__(root)
+        self.db = db
+        self.full_scan_interval = full_scan_interval
+        self.force_full_scan = force_full_scan
+        self._known_directories: Mapping[Path, int] = {}
+        self._known_subdirectories: dict[Path, list[Path]] = {}
+        self._seen_directories: dict[Path, int] | None = None
+        self._full_scan_time: datetime | None = None
+
+    def _is_full_scan_due(self, now: datetime) -> bool:
+        if self.force_full_scan:
+            return True
+        last_full_scan = self.db.get_last_full_scan(self.root)
+        if last_full_scan is None:
+            return True
+        return self.full_scan_interval is not None and now - last_full_scan >= self.full_scan_interval
+
+    def get_files(self, path: Path | None = None) -> Iterable[FileInfo]:
+        if path is not None:
+            self._seen_directories = None
+            yield from super().get_files(path)
+            return
+        now = datetime.now()
+        if self._is_full_scan_due(now):
+            logger.info(f'performing full scan of {self.root}')
+            self._set_known_directories({})
+            self._full_scan_time = now
+        else:
+            self._set_known_directories(self.db.get_directories(self.root))
+            self._full_scan_time = None
+        self._seen_directories = {}
+        yield from self._walk(self.root)
+
+    def _walk(self, directory: Path) -> Iterable[FileInfo]:
+        if self._seen_directories is None:
+            yield from super()._walk(directory)
+            return
+        # stat before listing, such that changes during the walk are detected next time
+        mtime = os.stat(directory).st_mtime_ns
+        self._seen_directories[directory] = mtime
+        if self._known_directories.get(directory) == mtime:
+            entries = sort_entries([(file.path, file) for file in self.db.get_files_in_directory(directory)]
+                                   + [(subdirectory, None) for subdirectory in self._known_subdirectories[directory]])
+        else:
+            entries = self._list_directory(directory)
+        for path, file in entries:
+            if file is None:
+                yield from self._walk(path)
+            else:
+                yield file
+
+    def _set_known_directories(self, directories: Mapping[Path, int]):
+        self._known_directories = directories
+        self._known_subdirectories = defaultdict(list)
+        for directory in directories:
+            if directory != self.root:
+                self._known_subdirectories[directory.parent].append(directory)
+
+    def commit(self):
+        if self._seen_directories is None:
+            return
+        self.db.set_directories(self.root, self._seen_directories)
+        if self._full_scan_time is not None:
+            self.db.set_last_full_scan(self.root, self._full_scan_time)
@@ -0,0 +1,200 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterator, Set
+from pathlib import Path
+
+from omg.files.db_updater import DatabaseUpdater
+from omg.files.walker import FilesystemAudioFileWalker
+
+logger = logging.getLogger(__name__)
+
+
+class FileWatcher(ABC):
+    """Watches a directory tree for changes."""
+
+    @abstractmethod
+    def changes(self) -> Iterator[Set[Path] | None]:
+        """Wait for changes and yield the affected paths, or `None` if the whole tree needs to be checked."""
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PollingWatcher(FileWatcher):
+    """Fallback watcher that requests a check of the whole tree in fixed intervals."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+
+    def changes(self) -> Iterator[Set[Path] | None]:
+        while True:
+            time.sleep(self.interval)
+            yield None
+
+
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+               | IN_ONLYDIR)
+_DIRECTORY_STRUCTURE_EVENTS = IN_CREATE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1  # noqa: check that the symbol exists
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class InotifyWatcher(FileWatcher):
+    """Watcher using the Linux inotify API.
+
+    Every directory below `root` is watched (inotify watches are not recursive). Events are collected until
+    no new event arrives for `debounce` seconds (but at most `max_delay` seconds), and then yielded as a
+    single set of paths. Only events for audio files and directories are considered.
+    """
+
+    def __init__(self, root: Path, debounce: float = 1.0, max_delay: float = 30.0):
+        self._libc = _load_libc()
+        if self._libc is None:
+            raise OSError('inotify is not available on this system')
+        self.root = root.resolve()
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._watches: dict[int, Path] = {}
+        try:
+            self._watch_tree(self.root)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(self, directory: Path):
+        self._watch(directory)
+        for parent, directories, _ in os.walk(directory):
+            for name in directories:
+                self._watch(Path(parent) / name)
+
+    def _watch(self, directory: Path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):  # removed or replaced in the meantime
+                return
+            raise OSError(error, f'cannot watch {directory}: {os.strerror(error)}')
+        self._watches[wd] = directory
+
+    def _unwatch_tree(self, directory: Path):
+        for wd, path in list(self._watches.items()):
+            if path == directory or directory in path.parents:
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def changes(self) -> Iterator[Set[Path] | None]:
+        while True:
+            select.select([self._fd], [], [])
+            changed: set[Path] = set()
+            needs_full_check = False
+            deadline = time.monotonic() + self.max_delay
+            while True:
+                needs_full_check |= self._read_events(changed)
+                timeout = min(self.debounce, deadline - time.monotonic())
+                if timeout <= 0 or not select.select([self._fd], [], [], timeout)[0]:
+                    break
+            if needs_full_check:
+                yield None
+            elif len(changed) > 0:
+                yield changed
+
+    def _read_events(self, changed: set[Path]) -> bool:
+        """Read pending events, add affected paths to `changed`, and return whether events have been lost."""
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        overflow = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                logger.warning('inotify event queue overflow')
+                overflow = True
+                continue
+            directory = self._watches.get(wd)
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if directory is None:
+                continue
+            path = directory / name if name else directory
+            if mask & IN_ISDIR or not name:
+                if mask & IN_MOVED_FROM:
+                    self._unwatch_tree(path)
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(path)
+                if mask & _DIRECTORY_STRUCTURE_EVENTS:
+                    changed.add(path)
+            elif FilesystemAudioFileWalker.is_audio_file(path):
+                changed.add(path)
+        return overflow
+
+
+def create_watcher(root: Path, debounce: float, poll_interval: float, polling: bool = False) -> FileWatcher:
+    """Create an inotify watcher if possible, otherwise (or if `polling` is set) a polling one."""
+    if not polling:
+        try:
+            return InotifyWatcher(root, debounce=debounce)
+        except OSError as e:
+            logger.warning(f'cannot use inotify ({e}), falling back to polling every {poll_interval} seconds')
+    return PollingWatcher(poll_interval)
+
+
+def watch(updater: DatabaseUpdater, watcher: FileWatcher):
+    """Apply the changes reported by `watcher` to the database, forever."""
+    for paths in watcher.changes():
+        if paths is None:
+            logger.info('checking all files')
+        else:
+            logger.info(f'updating {len(paths)} changed paths')
+        updater.update(paths)
+        updater.db.remove_unused_tag_values()
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import Counter
+from collections.abc import Sequence
+from datetime import timedelta
+
+from omg.brainz.model import RecordingId, WorkId, WorkRecording, ParentWork, ArtistId, ArtistData, ReleaseId, \
+    ReleaseData, RecordingData, RecordingArtistRelation, WorkData, MediumData, TrackData, TrackId, \
+    RecordingArtistRelationType
+from omg.brainz.source import MusicbrainzDataSourceBase
+from omg.util.dates import PartialDate
+
+
+class FakeDataSource(MusicbrainzDataSourceBase):
+    """In-memory data source with a synthetic catalogue, counting how often each method is called.
+
+    There are `releases` releases with `tracks_per_release` tracks each. Every two consecutive tracks
+    are recordings of the movements of a work (so they form a track group), composed by one of
+    `composers` composers and performed by one of two performers. Each call sleeps `latency` seconds.
+
+    `calls` counts the calls per method, `lookups` per method and MBID. `max_concurrent_calls` is the
+    highest number of calls that were running at the same time.
+    """
+
+    def __init__(self, releases: int = 2, tracks_per_release: int = 4, composers: int = 3, latency: float = 0):
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.lookups: Counter[tuple[str, str]] = Counter()
+        self.max_concurrent_calls = 0
+        self._concurrent_calls = 0
+        self._lock = threading.Lock()
+        self.releases: dict[ReleaseId, ReleaseData] = {}
+        self.recordings: dict[RecordingId, RecordingData] = {}
+        self.recorded_works: dict[RecordingId, list[WorkRecording]] = {}
+        self.recording_artists: dict[RecordingId, list[RecordingArtistRelation]] = {}
+        self.works: dict[WorkId, WorkData] = {}
+        self.parent_works: dict[WorkId, list[ParentWork]] = {}
+        self.composers: dict[WorkId, list[ArtistId]] = {}
+        self.artists: dict[ArtistId, ArtistData] = {}
+
+        performers = [self._add_artist(f'performer-{i}', f'Performer {i}') for i in range(2)]
+        composer_ids = [self._add_artist(f'composer-{i}', f'Composer {i}') for i in range(composers)]
+        for r in range(releases):
+            tracks = []
+            for t in range(tracks_per_release):
+                recording = RecordingId(f'recording-{r}-{t}')
+                self.recordings[recording] = RecordingData(recording, f'Movement {t % 2 + 1}', timedelta(minutes=5),
+                                                           None)
+                # the same works are recorded on all releases
+                parent = WorkId(f'work-{t // 2}')
+                movement = WorkId(f'work-{t // 2}-{t % 2 + 1}')
+                self._add_work(parent, f'Work {t // 2}', composer_ids[t // 2 % composers], None)
+                self._add_work(movement, f'Work {t // 2}: Movement {t % 2 + 1}', composer_ids[t // 2 % composers],
+                               ParentWork(parent, movement, t % 2 + 1))
+                self.recorded_works[recording] = [WorkRecording(recording, movement)]
+                self.recording_artists[recording] = [
+                    RecordingArtistRelation(recording, performers[r % 2], None,
+                                            RecordingArtistRelationType('instrument', ('piano',)))]
+                tracks.append(TrackData(t + 1, recording, TrackId(f'track-{r}-{t}')))
+            release = ReleaseId(f'release-{r}')
+            self.releases[release] = ReleaseData(release, f'Release {r}', (performers[r % 2],), PartialDate(2000 + r),
+                                                 (MediumData(1, 'CD', tuple(tracks)),))
+
+    def _add_artist(self, mbid: str, name: str) -> ArtistId:
+        artist = ArtistId(mbid)
+        self.artists[artist] = ArtistData(artist, name, name, None)
+        return artist
+
+    def _add_work(self, work: WorkId, name: str, composer: ArtistId, parent: ParentWork | None):
+        self.works[work] = WorkData(work, name, None)
+        self.composers[work] = [composer]
+        self.parent_works[work] = [parent] if parent is not None else []
+
+    def _count(self, method: str, mbid: str):
+        with self._lock:
+            self.calls[method] += 1
+            self.lookups[method, mbid] += 1
+            self._concurrent_calls += 1
+            self.max_concurrent_calls = max(self.max_concurrent_calls, self._concurrent_calls)
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self._lock:
+            self._concurrent_calls -= 1
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def get_recorded_work(self, recording_id: RecordingId) -> Sequence[WorkRecording]:
+        self._count('get_recorded_work', recording_id.mbid)
+        return self.recorded_works[recording_id]
+
+    def get_parent_works(self, work: WorkId) -> Sequence[ParentWork]:
+        self._count('get_parent_works', work.mbid)
+        return self.parent_works[work]
+
+    def get_composers(self, work: WorkId) -> Sequence[ArtistId]:
+        self._count('get_composers', work.mbid)
+        return self.composers[work]
+
+    def get_work_data(self, work_id: WorkId) -> WorkData:
+        self._count('get_work_data', work_id.mbid)
+        return self.works[work_id]
+
+    def get_artist_data(self, artist_id: ArtistId) -> ArtistData:
+        self._count('get_artist_data', artist_id.mbid)
+        return self.artists[artist_id]
+
+    def get_recording_data(self, recording_id: RecordingId) -> RecordingData:
+        self._count('get_recording_data', recording_id.mbid)
+        return self.recordings[recording_id]
+
+    def get_recording_artists(self, recording_id: RecordingId) -> Sequence[RecordingArtistRelation]:
+        self._count('get_recording_artists', recording_id.mbid)
+        return self.recording_artists[recording_id]
+
+    def get_release_data(self, release_id: ReleaseId) -> ReleaseData:
+        self._count('get_release_data', release_id.mbid)
+        return self.releases[release_id]
@@ -0,0 +1,36 @@
+import shutil
+from collections.abc import Iterator
+from pathlib import Path
+
+import taglib
+
+
+def synthetic_tags(i: int, tracks_per_album: int = 10, albums_per_artist: int = 5) -> dict[str, list[str]]:
+    album = i // tracks_per_album
+    artist = album // albums_per_artist
+    return {'ARTIST': [f'Artist {artist}'], 'ALBUMARTIST': [f'Artist {artist}'], 'ALBUM': [f'Album {album}'],
+            'TITLE': [f'Track {i}'], 'TRACKNUMBER': [str(i % tracks_per_album + 1)], 'GENRE': ['Classical']}
+
+
+def synthetic_path(root: Path, i: int, tracks_per_album: int = 10, albums_per_artist: int = 5) -> Path:
+    album = i // tracks_per_album
+    artist = album // albums_per_artist
+    return root / f'artist{artist:05d}' / f'album{album:06d}' / f'track{i:08d}.mp3'
+
+
+def create_library(root: Path, template: Path, n: int, tracks_per_album: int = 10,
+                   albums_per_artist: int = 5) -> Iterator[Path]:
+    """Create a synthetic library of `n` audio files below `root`, yielding the paths of the created files.
+
+    Every file is a copy of the `template` audio file with tags (artist, album, title, ...) rewritten
+    according to its position in the library, `tracks_per_album` tracks per album directory and
+    `albums_per_artist` albums per artist directory.
+    """
+    for i in range(n):
+        path = synthetic_path(root, i, tracks_per_album, albums_per_artist)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(template, path)
+        with taglib.File(path, save_on_exit=True) as file:
+            file.tags.clear()
+            file.tags.update(synthetic_tags(i, tracks_per_album, albums_per_artist))
+        yield path
@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from omg.brainz.api import MusicbrainzConfiguration
+
+Response = tuple[int, dict, dict[str, str]]
+"""Status code, JSON body and additional headers of a stub response."""
+
+
+class StubMusicbrainzServer:
+    """Local HTTP server imitating the Musicbrainz web service, for tests and benchmarks.
+
+    Requests to ``/ws/2/<entity>/<mbid>`` are answered by `handler(entity, mbid, query)`, which returns
+    a `Response` (by default an empty object with status 200) after waiting `latency` seconds. The
+    request paths (with query) and their arrival times are recorded in `requests`, the highest number of
+    requests handled at the same time in `max_concurrent_requests`.
+
+    Use as a context manager; `config` points a `MusicbrainzConfiguration` to the server.
+    """
+
+    def __init__(self, handler: Callable[[str, str, dict[str, list[str]]], Response] | None = None,
+                 latency: float = 0):
+        self.handler = handler or (lambda entity, mbid, query: (200, {'id': mbid}, {}))
+        self.latency = latency
+        self.requests: list[tuple[float, str]] = []
+        self.max_concurrent_requests = 0
+        self._concurrent_requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._create_handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def _create_handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests.append((time.monotonic(), self.path))
+                    stub._concurrent_requests += 1
+                    stub.max_concurrent_requests = max(stub.max_concurrent_requests, stub._concurrent_requests)
+                try:
+                    url = urlsplit(self.path)
+                    entity, _, mbid = url.path.removeprefix('/ws/2/').partition('/')
+                    time.sleep(stub.latency)
+                    status, body, headers = stub.handler(entity, mbid, parse_qs(url.query))
+                finally:
+                    with stub._lock:
+                        stub._concurrent_requests -= 1
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    @property
+    def config(self) -> MusicbrainzConfiguration:
+        host, port = self._server.server_address[:2]
+        return MusicbrainzConfiguration(hostname=f'{host}:{port}', use_https=False)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,13 @@
+from omg.files.filesystem import FilesystemTagProvider
+from omg.files.walker import FilesystemAudioFileWalker
+from omg.test_utils.library import create_library, synthetic_tags
+
+
+def test_create_library(testdata, tmp_path):
+    paths = list(create_library(tmp_path, testdata / 'r2.mp3', 12, tracks_per_album=4, albums_per_artist=2))
+
+    assert [file.path for file in FilesystemAudioFileWalker(tmp_path).get_files()] == paths
+    assert len({path.parent for path in paths}) == 3
+    assert len({path.parent.parent for path in paths}) == 2
+    tags = FilesystemTagProvider(tmp_path).get_tags(paths[5])
+    assert tags == synthetic_tags(5, tracks_per_album=4, albums_per_artist=2)
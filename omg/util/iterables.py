@@ -0,0 +1,14 @@
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from typing import TypeVar
+
+T = TypeVar('T')
+
+
+def batched(iterable: Iterable[T], n: int) -> Iterator[tuple[T, ...]]:
+    """Split an iterable into tuples of length n (the last one may be shorter)."""
+    if n < 1:
+        raise ValueError(f'batch size must be positive, got {n}')
+    iterator = iter(iterable)
+    while batch := tuple(islice(iterator, n)):
+        yield batch